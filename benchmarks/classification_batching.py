@@ -0,0 +1,43 @@
+"""Compare the direct classification path with the micro-batching one.
+
+Many concurrent clients send 1-2 images each. The direct path runs one model call per request,
+serialized like in a sync worker; the micro-batcher groups concurrent requests.
+
+Usage: python -m benchmarks.classification_batching
+"""
+import threading
+from typing import Dict, List
+
+import numpy as np
+
+from benchmarks.models import SyntheticClassificationModel
+from benchmarks.utils import print_table, run_concurrent
+from telesto.classification.batching import MicroBatcher
+
+
+def run(requests: int = 400) -> List[Dict]:
+    model = SyntheticClassificationModel()
+    inputs = [[np.zeros((224, 224, 3), dtype=np.uint8)] * (1 + i % 2) for i in range(requests)]
+
+    lock = threading.Lock()
+
+    def direct(i: int):
+        with lock:
+            model(inputs[i])
+
+    rows = []
+    for concurrency in [1, 4, 16, 32]:
+        rows.append({"path": "direct", "concurrency": concurrency,
+                     **run_concurrent(direct, requests, concurrency)})
+        batcher = MicroBatcher(model, max_batch_size=32, max_wait=0.005)
+        rows.append({"path": "batching", "concurrency": concurrency,
+                     **run_concurrent(lambda i: batcher(inputs[i]), requests, concurrency)})
+    return rows
+
+
+def main():
+    print_table(run())
+
+
+if __name__ == "__main__":
+    main()
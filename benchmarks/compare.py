@@ -0,0 +1,90 @@
+"""Compare two result files of benchmarks.suite and report regressions.
+
+Rows are matched by their parameters (benchmark, transport, sizes, ...). Throughput and
+speedup are better when higher, times and memory when lower. The exit code is 1 if any
+metric got worse by more than the threshold.
+
+Usage: python -m benchmarks.compare baseline.json results.json --threshold 0.1
+"""
+import argparse
+import json
+import sys
+from typing import Dict, List, Optional, Tuple
+
+from benchmarks.utils import print_table
+
+HIGHER_IS_BETTER = ("_rps", "speedup")
+LOWER_IS_BETTER = ("_ms", "_us", "_mb", "us")
+
+
+def is_metric(name: str) -> bool:
+    return name.endswith(HIGHER_IS_BETTER + LOWER_IS_BETTER)
+
+
+def row_key(row: Dict) -> Tuple:
+    return tuple(sorted((k, str(v)) for k, v in row.items() if not is_metric(k)))
+
+
+def change(name: str, old: float, new: float) -> Optional[float]:
+    """Relative change where a positive value is an improvement."""
+
+    if not old:
+        return None
+    relative = (new - old) / abs(old)
+    return relative if name.endswith(HIGHER_IS_BETTER) else -relative
+
+
+def compare(baseline: List[Dict], results: List[Dict], threshold: float) -> List[Dict]:
+    baseline_rows = {row_key(row): row for row in baseline}
+    rows = []
+    for row in results:
+        old_row = baseline_rows.get(row_key(row))
+        if old_row is None:
+            continue
+        for name, new in row.items():
+            old = old_row.get(name)
+            if not is_metric(name) or not isinstance(new, (int, float)):
+                continue
+            if not isinstance(old, (int, float)):
+                continue
+            relative = change(name, old, new)
+            if relative is None:
+                continue
+            params = ", ".join(f"{k}={v}" for k, v in row.items() if not is_metric(k))
+            rows.append(
+                {
+                    "scenario": params,
+                    "metric": name,
+                    "baseline": old,
+                    "result": new,
+                    "change": f"{relative:+.1%}",
+                    "status": "REGRESSION" if relative < -threshold else "ok",
+                }
+            )
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("baseline")
+    parser.add_argument("results")
+    parser.add_argument("--threshold", type=float, default=0.1, help="allowed relative change")
+    parser.add_argument("--all", action="store_true", help="also show unchanged metrics")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)["results"]
+    with open(args.results) as f:
+        results = json.load(f)["results"]
+
+    rows = compare(baseline, results, args.threshold)
+    regressions = [row for row in rows if row["status"] == "REGRESSION"]
+    shown = rows if args.all else regressions
+    if shown:
+        print_table(shown)
+    print(f"{len(rows)} metrics compared, {len(regressions)} regressions")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Compare sequential and parallel decoding of a batch of JPEG images, and full-size
+decoding with decoding at a model input size.
+
+Usage: python -m benchmarks.image_decoding
+"""
+import io
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import PIL.Image
+
+from benchmarks.utils import print_table
+from telesto.images import ImageDecoder
+
+
+def make_jpegs(n: int, size: int, seed: int = 0, aspect: float = 1) -> List[bytes]:
+    rng = np.random.RandomState(seed)
+    # Smooth random images compress like photos, unlike pure noise
+    h = int(size / aspect)
+    small = rng.randint(0, 256, size=(n, h // 16, size // 16, 3), dtype=np.uint8)
+    images = []
+    for array in small:
+        fp = io.BytesIO()
+        PIL.Image.fromarray(array).resize((size, h), PIL.Image.BILINEAR).save(
+            fp, format="JPEG", quality=90
+        )
+        images.append(fp.getvalue())
+    return images
+
+
+def timeit(decoder: ImageDecoder, images: List[bytes], repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        files = [io.BytesIO(image) for image in images]
+        start = time.perf_counter()
+        decoder(files)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def decoded_mb(image: bytes, size: Optional[Tuple[int, int]], mode: Optional[str]) -> float:
+    """Size of the largest image held in memory while decoding."""
+
+    image = PIL.Image.open(io.BytesIO(image))
+    if size is not None:
+        image.draft(mode, size)
+    return image.size[0] * image.size[1] * len(mode or image.mode) / 2 ** 20
+
+
+def run_input_size() -> List[Dict]:
+    images = make_jpegs(8, 4000, aspect=4 / 3)
+    rows = []
+    for size, mode in [(None, None), ((224, 224), "RGB"), ((224, 224), "L"), ((512, 512), "RGB")]:
+        elapsed_ms = timeit(ImageDecoder(size=size, mode=mode), images, repeat=3)
+        rows.append(
+            {
+                "images": len(images),
+                "original": "4000x3000",
+                "input_size": "original" if size is None else "x".join(map(str, size)),
+                "mode": mode or "original",
+                "decode_ms": round(elapsed_ms, 1),
+                "per_image_mb": round(decoded_mb(images[0], size, mode), 1),
+            }
+        )
+    return rows
+
+
+def run_workers() -> List[Dict]:
+    rows = []
+    for size in [512, 2048]:
+        images = make_jpegs(32, size)
+        baseline = None
+        for workers in [1, 2, 4, 8]:
+            for stack in [False, True]:
+                elapsed_ms = timeit(ImageDecoder(workers=workers, stack=stack), images)
+                baseline = baseline or elapsed_ms
+                rows.append(
+                    {
+                        "images": len(images),
+                        "size": size,
+                        "workers": workers,
+                        "stack": stack,
+                        "decode_ms": round(elapsed_ms, 1),
+                        "speedup": round(baseline / elapsed_ms, 2),
+                    }
+                )
+    return rows
+
+
+def main():
+    print(f"CPUs: {os.cpu_count()}")
+    print_table(run_workers())
+    print()
+    print_table(run_input_size())
+
+
+if __name__ == "__main__":
+    main()
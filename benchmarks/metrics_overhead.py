@@ -0,0 +1,66 @@
+"""Measure the cost of request metrics on a minimal request.
+
+Usage: python -m benchmarks.metrics_overhead
+"""
+import time
+from typing import Dict, List
+
+import falcon
+from falcon import testing
+
+from benchmarks.utils import print_table
+from telesto.metrics import REQUEST_SECONDS, MetricsMiddleware, stage
+
+
+class StatusResource:
+    def on_get(self, req: falcon.Request, resp: falcon.Response):
+        resp.data = b'{"status": "ok"}'
+
+
+class StagedStatusResource:
+    def on_get(self, req: falcon.Request, resp: falcon.Response):
+        with stage("decode"), stage("predict"), stage("serialize"):
+            resp.data = b'{"status": "ok"}'
+
+
+def per_call_us(func, n: int, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(n):
+            func()
+        best = min(best, time.perf_counter() - start)
+    return best / n * 1e6
+
+
+def call_wsgi(api: falcon.API, environ: dict):
+    api(dict(environ), lambda status, headers: None)
+
+
+def run() -> List[Dict]:
+    n = 20000
+    environ = testing.create_environ("/")
+    rows = [
+        {
+            "operation": "Histogram.observe()",
+            "us": round(per_call_us(lambda: REQUEST_SECONDS.observe(0.01, "GET", "/"), n), 2),
+        }
+    ]
+    for name, middleware, resource in [
+        ("request without metrics", [], StatusResource()),
+        ("request with metrics", [MetricsMiddleware()], StatusResource()),
+        ("request with metrics and 3 stages", [MetricsMiddleware()], StagedStatusResource()),
+    ]:
+        api = falcon.API(middleware=middleware)
+        api.add_route("/", resource)
+        elapsed_us = per_call_us(lambda: call_wsgi(api, environ), n)
+        rows.append({"operation": name, "us": round(elapsed_us, 2)})
+    return rows
+
+
+def main():
+    print_table(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Models with a configurable cost, used instead of real networks in benchmarks."""
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from telesto.classification.model import ClassificationModelBase
+from telesto.instance_segmentation import DataStorage, DetectionObject
+from telesto.instance_segmentation.model import SegmentationModelBase
+from telesto.weights import shared_arrays
+
+COST_MODES = ("sleep", "spin")
+
+
+def spend(seconds: float, mode: str = "sleep"):
+    """Wait like a model call: "sleep" releases the GIL like native backends (e.g. a GPU or
+    a BLAS call), "spin" keeps a CPU core busy while holding the GIL."""
+
+    if mode == "sleep":
+        time.sleep(seconds)
+    elif mode == "spin":
+        end = time.perf_counter() + seconds
+        while time.perf_counter() < end:
+            pass
+    else:
+        raise ValueError(f"Wrong cost mode: {mode}. Expected one of {COST_MODES}")
+
+
+class SyntheticClassificationModel(ClassificationModelBase):
+    """Model with a fixed per-call cost plus a per-image cost, like a typical CNN backend.
+
+    With `weights_mb` the model holds float32 weights of that size which every call reads,
+    in private memory or, with `weights_path`, memory-mapped with telesto.weights.
+    """
+
+    def __init__(
+        self,
+        call_cost: float = 0.005,
+        image_cost: float = 0.0005,
+        mode: str = "sleep",
+        weights_mb: int = 0,
+        weights_path: Optional[str] = None,
+    ):
+        self.weights_mb = weights_mb
+        self.weights_path = weights_path
+        super().__init__(classes=["cat", "dog"], model_path="")
+        self.call_cost = call_cost
+        self.image_cost = image_cost
+        self.mode = mode
+
+    def _load_model(self, model_path: str) -> Dict[str, np.ndarray]:
+        if self.weights_path is not None:
+            return shared_arrays(self.weights_path, self._create_weights)
+        return self._create_weights()
+
+    def _create_weights(self) -> Dict[str, np.ndarray]:
+        layer_size = 2 ** 20  # 4 MB of float32
+        return {
+            f"layer{i}": np.arange(i, i + layer_size, dtype=np.float32)
+            for i in range(self.weights_mb // 4)
+        }
+
+    def predict(self, input_list: List[np.ndarray]) -> np.ndarray:
+        # Touches all weights, like a forward pass
+        for weights in self.model.values():
+            weights.max()
+        spend(self.call_cost + self.image_cost * len(input_list), self.mode)
+        return np.full((len(input_list), 2), 0.5)
+
+
+class SyntheticSegmentationModel(SegmentationModelBase):
+    """Model with a fixed per-image cost which finds `n_objects` disks in every image."""
+
+    def __init__(
+        self,
+        storage: DataStorage,
+        image_cost: float = 0.02,
+        n_objects: int = 10,
+        mode: str = "sleep",
+    ):
+        super().__init__(classes=["fg", "bg"], model_path="", storage=storage)
+        self.image_cost = image_cost
+        self.n_objects = n_objects
+        self.mode = mode
+
+    def _load_model(self, model_path: str):
+        pass
+
+    def predict(self, input: np.ndarray) -> List[DetectionObject]:
+        spend(self.image_cost, self.mode)
+
+        h, w = input.shape[:2]
+        radius = max(1, min(h, w) // 20)
+        ys, xs = np.ogrid[-radius:radius + 1, -radius:radius + 1]
+        disk = xs ** 2 + ys ** 2 <= radius ** 2
+        rng = np.random.RandomState(h * w)
+        objects = []
+        for x, y in zip(
+            rng.randint(0, max(1, w - disk.shape[1]), self.n_objects),
+            rng.randint(0, max(1, h - disk.shape[0]), self.n_objects),
+        ):
+            objects.append(DetectionObject.from_mask(disk, offset=(int(x), int(y))))
+        return objects
@@ -0,0 +1,81 @@
+"""Compare the legacy full-image RLE encoder with the bounding box one.
+
+Usage: python -m benchmarks.rle_encode
+"""
+import time
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from benchmarks.utils import print_table
+from telesto.instance_segmentation import DetectionObject, rle_encode, rle_encode_objects
+
+
+def legacy_rle_encode(coords: List[Tuple[int, int]], image_size: Tuple[int, int]) -> str:
+    w, h = image_size
+    image = np.zeros((h, w))
+    xs, ys = zip(*coords)
+    image[ys, xs] = 1
+    image = image.flatten()
+    image = np.insert(image, [0, len(image)], [0, 0])
+
+    starts = ((image[:-1] == 0) & (image[1:] == 1)).nonzero()[0]
+    ends = ((image[:-1] == 1) & (image[1:] == 0)).nonzero()[0]
+    lengths = ends - starts
+
+    return " ".join(f"{st} {l}" for st, l in zip(starts, lengths))
+
+
+def make_objects(
+    image_size: int, n: int, radius: int = 20, seed: int = 0
+) -> List[DetectionObject]:
+    rng = np.random.RandomState(seed)
+    ys, xs = np.mgrid[-radius:radius + 1, -radius:radius + 1]
+    disk = xs ** 2 + ys ** 2 <= radius ** 2
+    dys, dxs = disk.nonzero()
+
+    objects = []
+    for cx, cy in rng.randint(0, image_size - 2 * radius, size=(n, 2)):
+        objects.append(DetectionObject(coords=list(zip((dxs + cx).tolist(), (dys + cy).tolist()))))
+    return objects
+
+
+def timeit(func, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def run() -> List[Dict]:
+    rows = []
+    for image_size, n in [(512, 10), (512, 100), (2048, 10), (2048, 100), (5120, 10), (5120, 50)]:
+        objects = make_objects(image_size, n)
+        size = (image_size, image_size)
+
+        def encode_legacy(objects_: List[DetectionObject]):
+            return [legacy_rle_encode(obj.coords, size) for obj in objects_]
+
+        row = {"image": image_size, "objects": n}
+        if image_size * n <= 2048 * 100:
+            row["legacy_ms"] = round(timeit(lambda: encode_legacy(objects), repeat=1), 2)
+        else:
+            # Too slow, extrapolated from 5 objects
+            legacy_ms = timeit(lambda: encode_legacy(objects[:5]), repeat=1) * n / 5
+            row["legacy_ms"] = f"~{round(legacy_ms)}"
+        row["per_object_ms"] = round(
+            timeit(lambda: [rle_encode(obj.coords, size) for obj in objects]), 2
+        )
+        row["batch_ms"] = round(timeit(lambda: rle_encode_objects(objects, size)), 2)
+        rows.append(row)
+    return rows
+
+
+def main():
+    print_table(run())
+
+
+if __name__ == "__main__":
+    main()
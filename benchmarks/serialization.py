@@ -0,0 +1,88 @@
+"""Compare response serialization with the legacy code and the installed JSON libraries.
+
+Usage: python -m benchmarks.serialization
+"""
+import json
+import time
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from benchmarks.rle_encode import make_objects
+from benchmarks.utils import print_table
+from telesto.classification.app import postprocess
+from telesto.instance_segmentation.app import DOCS_BODY, api_docs
+from telesto.instance_segmentation.app import postprocess as segmentation_postprocess
+from telesto.serialization import available_serializers
+
+
+def legacy_postprocess(pred_array: np.ndarray, classes: List[str]) -> dict:
+    predictions = []
+    for pred in pred_array:
+        class_probs = {classes[i]: round(float(prob), 5) for i, prob in enumerate(pred)}
+        class_prediction = classes[pred.argmax()]
+        predictions.append({"probs": class_probs, "prediction": class_prediction})
+    return {"predictions": predictions}
+
+
+def timeit(func: Callable[[], object], repeat: int = 20) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1e6
+
+
+def run() -> List[Dict]:
+    rng = np.random.RandomState(0)
+    pred_array = rng.dirichlet(np.ones(1000), size=32).astype(np.float32)
+    classes = [f"class_{i}" for i in range(1000)]
+
+    rows = [
+        {
+            "response": "classification 32x1000",
+            "serializer": "legacy json",
+            "us": round(timeit(lambda: json.dumps(legacy_postprocess(pred_array, classes))), 1),
+        }
+    ]
+    for name, dumps in available_serializers().items():
+        rows.append(
+            {
+                "response": "classification 32x1000",
+                "serializer": name,
+                "us": round(timeit(lambda: dumps(postprocess(pred_array, classes))), 1),
+            }
+        )
+
+    size = (2048, 2048)
+    segmentation_doc = segmentation_postprocess(make_objects(2048, 100), size)
+    for name, dumps in available_serializers().items():
+        rows.append(
+            {
+                "response": "segmentation 100 objects",
+                "serializer": name,
+                "us": round(timeit(lambda: dumps(segmentation_doc)), 1),
+            }
+        )
+
+    docs = api_docs()
+    rows.append(
+        {
+            "response": "docs",
+            "serializer": "legacy json",
+            "us": round(timeit(lambda: json.dumps(docs, ensure_ascii=False)), 1),
+        }
+    )
+    rows.append(
+        {"response": "docs", "serializer": "pre-encoded", "us": round(timeit(DOCS_BODY), 1)}
+    )
+    return rows
+
+
+def main():
+    print_table(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Run the model API with a benchmark model, in-process or as a gunicorn server.
+
+Usage: python -m benchmarks.server --model-type segmentation --model synthetic --port 9877
+
+With --asgi the ASGI app (telesto.asgi) is served by uvicorn workers. With --preload the app is
+created in the gunicorn master before the workers are forked, like with PRELOAD=1 ./start-api.sh.
+"""
+import argparse
+import os
+import sys
+import types
+
+from benchmarks.models import (
+    COST_MODES,
+    SyntheticClassificationModel,
+    SyntheticSegmentationModel,
+)
+from telesto.config import config
+from telesto.models import ModelType
+
+MODEL_TYPES = {
+    "classification": ModelType.CLASSIFICATION,
+    "segmentation": ModelType.INSTANCE_SEGMENTATION,
+}
+MODELS = ("fallback", "synthetic")
+
+
+def configure(
+    model_type: str,
+    model: str = "fallback",
+    cost_ms: float = 5,
+    cost_mode: str = "sleep",
+    workdir: str = ".",
+    weights_mb: int = 0,
+    mmap_weights: bool = False,
+):
+    """Configure the API for a benchmark, must be called before telesto.app.get_app().
+
+    "fallback" uses RandomClassificationModel or DummySegmentationModel, "synthetic" uses
+    the models from benchmarks.models with `cost_ms` per image. The synthetic classification
+    model holds `weights_mb` of weights, memory-mapped from `workdir` with `mmap_weights`.
+    The job storage and metrics are kept in `workdir`.
+    """
+    workdir = os.path.abspath(workdir)
+    config["common"]["model_type"] = MODEL_TYPES[model_type].value
+    config["common"]["api_key"] = ""
+    config["metrics"]["dir"] = os.path.join(workdir, "metrics")
+    os.environ["USE_FALLBACK_MODEL"] = "1"
+
+    if model == "synthetic":
+        cost = cost_ms / 1000
+        weights_path = os.path.join(workdir, "weights") if mmap_weights else None
+        # The API loads the model from a module named "model", like a submission
+        module = types.ModuleType("model")
+        module.ClassificationModel = lambda: SyntheticClassificationModel(
+            call_cost=cost,
+            image_cost=cost / 10,
+            mode=cost_mode,
+            weights_mb=weights_mb,
+            weights_path=weights_path,
+        )
+        module.SegmentationModel = lambda storage: SyntheticSegmentationModel(
+            storage, image_cost=cost, mode=cost_mode
+        )
+        sys.modules["model"] = module
+    elif model != "fallback":
+        raise ValueError(f"Wrong model: {model}. Expected one of {MODELS}")
+
+    # The job storage is created with a path relative to the working directory
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--model-type", choices=list(MODEL_TYPES), required=True)
+    parser.add_argument("--model", choices=MODELS, default="fallback")
+    parser.add_argument("--cost-ms", type=float, default=5)
+    parser.add_argument("--cost-mode", choices=COST_MODES, default="sleep")
+    parser.add_argument("--workdir", default=".")
+    parser.add_argument("--port", type=int, default=9877)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=1)
+    parser.add_argument("--asgi", action="store_true", help="serve telesto.asgi with uvicorn")
+    parser.add_argument("--preload", action="store_true", help="create the app in the master")
+    parser.add_argument("--weights-mb", type=int, default=0, help="synthetic model weights size")
+    parser.add_argument("--mmap-weights", action="store_true", help="memory-map the weights")
+    args = parser.parse_args()
+
+    configure(
+        args.model_type,
+        args.model,
+        args.cost_ms,
+        args.cost_mode,
+        args.workdir,
+        weights_mb=args.weights_mb,
+        mmap_weights=args.mmap_weights,
+    )
+    if args.preload:
+        os.environ["PRELOAD"] = "1"
+
+    from gunicorn.app.base import BaseApplication
+
+    if args.asgi:
+        from telesto.asgi import get_asgi_app as get_app
+    else:
+        from telesto.app import get_app
+
+    class Server(BaseApplication):
+        def load_config(self):
+            self.cfg.set("bind", f"127.0.0.1:{args.port}")
+            self.cfg.set("workers", args.workers)
+            self.cfg.set("threads", args.threads)
+            self.cfg.set("timeout", 120)
+            self.cfg.set("preload_app", args.preload)
+            if args.asgi:
+                self.cfg.set("worker_class", "uvicorn.workers.UvicornWorker")
+
+        def load(self):
+            return get_app()
+
+    Server().run()
+
+
+if __name__ == "__main__":
+    main()
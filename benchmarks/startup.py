@@ -0,0 +1,127 @@
+"""Measure the cold start of the API for each model type, in fresh Python processes:
+
+    import_ms - import telesto.app
+    get_app_ms - telesto.app.get_app() with the fallback model
+    first_response_ms - the first GET / after get_app()
+    ready_ms - from the start of the import until GET /ready returns 200, i.e. until the model
+        is loaded and warmed up
+    process_ms - the whole process, including the interpreter startup and exit
+
+Every process starts with the same config (default.ini with the fallback model) and an empty
+working directory. One discarded run per model type compiles the .pyc files, the table shows
+the median of `--repeat` runs.
+
+Usage: python -m benchmarks.startup --repeat 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+# The child process measures imports, so this module imports nothing heavy at the top level
+MODEL_TYPES = {
+    "classification": "CLASSIFICATION",
+    "segmentation": "INSTANCE_SEGMENTATION",
+}
+TIMINGS = ["import_ms", "get_app_ms", "first_response_ms", "ready_ms"]
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def child(model_type: str, workdir: str, timeout: float = 60):
+    """Start the API in this process and print its timings as JSON."""
+
+    start = time.perf_counter()
+    import telesto.app
+    from telesto.config import config
+
+    imported = time.perf_counter()
+
+    config["common"]["model_type"] = MODEL_TYPES[model_type]
+    config["common"]["api_key"] = ""
+    config["metrics"]["dir"] = os.path.join(workdir, "metrics")
+    os.environ["USE_FALLBACK_MODEL"] = "1"
+    # The job storage is created with a path relative to the working directory
+    os.chdir(workdir)
+
+    app_start = time.perf_counter()
+    app = telesto.app.get_app()
+    app_created = time.perf_counter()
+
+    from falcon import testing
+
+    client = testing.TestClient(app)
+    response_start = time.perf_counter()
+    assert client.simulate_get("/").status_code == 200
+    responded = time.perf_counter()
+
+    while client.simulate_get("/ready").status_code != 200:
+        if time.perf_counter() - start > timeout:
+            raise TimeoutError("The model didn't get ready")
+        time.sleep(0.001)
+    ready = time.perf_counter()
+
+    timings = {
+        "import_ms": (imported - start) * 1000,
+        "get_app_ms": (app_created - app_start) * 1000,
+        "first_response_ms": (responded - response_start) * 1000,
+        "ready_ms": (ready - start) * 1000,
+    }
+    print(json.dumps(timings), flush=True)
+    # Don't wait for the background threads of the app
+    os._exit(0)
+
+
+def measure(model_type: str) -> Dict[str, float]:
+    with tempfile.TemporaryDirectory() as workdir:
+        command = [
+            sys.executable, "-m", "benchmarks.startup",
+            "--child", model_type,
+            "--workdir", workdir,
+        ]
+        start = time.perf_counter()
+        output = subprocess.run(
+            command, cwd=ROOT, check=True, capture_output=True, text=True
+        ).stdout
+        elapsed = time.perf_counter() - start
+    timings = json.loads(output.splitlines()[-1])
+    timings["process_ms"] = elapsed * 1000
+    return timings
+
+
+def run(repeat: int = 5) -> List[Dict]:
+    rows = []
+    for model_type in MODEL_TYPES:
+        measure(model_type)
+        runs = [measure(model_type) for _ in range(repeat)]
+        row = {"model_type": model_type}
+        for key in TIMINGS + ["process_ms"]:
+            row[key] = round(statistics.median(run[key] for run in runs), 1)
+        rows.append(row)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--child", choices=list(MODEL_TYPES), help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.workdir)
+        return
+
+    from benchmarks.utils import print_table
+
+    print_table(run(args.repeat))
+
+
+if __name__ == "__main__":
+    main()
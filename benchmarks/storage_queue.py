@@ -0,0 +1,65 @@
+"""Measure DataStorage and job queue operations.
+
+Usage: python -m benchmarks.storage_queue
+"""
+import io
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+import numpy as np
+import PIL.Image
+
+from benchmarks.rle_encode import make_objects
+from benchmarks.utils import print_table
+from telesto.instance_segmentation import DataStorage
+from telesto.instance_segmentation.jobs import JobQueue, SpoolJobQueue
+
+
+def per_op_us(func: Callable[[int], object], n: int) -> float:
+    start = time.perf_counter()
+    for i in range(n):
+        func(i)
+    return (time.perf_counter() - start) / n * 1e6
+
+
+def run(n: int = 200) -> List[Dict]:
+    fp = io.BytesIO()
+    PIL.Image.fromarray(np.zeros((1024, 1024, 3), dtype=np.uint8)).save(fp, format="PNG")
+    image_bytes = fp.getvalue()
+    objects = make_objects(1024, 50)
+
+    rows = []
+    with tempfile.TemporaryDirectory() as path:
+        storage = DataStorage(path)
+        for operation, func in [
+            ("storage save_encoded", lambda i: storage.save_encoded(f"j{i}", image_bytes)),
+            ("storage input_size", lambda i: storage.input_size(f"j{i}")),
+            ("storage load input", lambda i: storage.load(f"j{i}", output=False)),
+            ("storage save 50 objects", lambda i: storage.save(f"j{i}", objects, output=True)),
+            ("storage load 50 objects", lambda i: storage.load(f"j{i}", output=True)),
+            ("storage usage", lambda i: storage.usage()),
+            ("storage delete", lambda i: storage.delete(f"j{i}")),
+        ]:
+            rows.append({"operation": operation, "us": round(per_op_us(func, n), 1)})
+
+        for name, queue in [
+            ("memory queue", JobQueue()),
+            ("spool queue", SpoolJobQueue(f"{path}/queue")),
+        ]:
+            def get_done(_):
+                queue.task_done(queue.get(timeout=0))
+
+            put_us = per_op_us(lambda i: queue.put(f"j{i}"), n)
+            rows.append({"operation": f"{name} put", "us": round(put_us, 1)})
+            get_us = per_op_us(get_done, n)
+            rows.append({"operation": f"{name} get + task_done", "us": round(get_us, 1)})
+    return rows
+
+
+def main():
+    print_table(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,444 @@
+"""Benchmark suite of the model API, writes machine-readable results.
+
+Load scenarios drive telesto.app.get_app() in-process with falcon's TestClient and over a real
+socket with a gunicorn server (benchmarks.server), across image sizes, images per request and
+concurrency levels. The "asgi" transport runs the same scenarios against telesto.asgi served by
+uvicorn workers. During every scenario the status endpoint is probed, to show how long health
+checks wait behind model calls. Micro-benchmarks of preprocessing, RLE encoding, serialization,
+storage and the job queue run in-process, the startup benchmark runs fresh processes.
+
+Usage:
+    python -m benchmarks.suite --quick --output results.json
+    python -m benchmarks.compare baseline.json results.json
+"""
+import argparse
+import base64
+import http.client
+import importlib.util
+import io
+import json
+import logging
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import PIL.Image
+
+from benchmarks import (
+    image_decoding,
+    metrics_overhead,
+    rle_encode,
+    serialization,
+    startup,
+    storage_queue,
+    upload_parsing,
+)
+from benchmarks.models import COST_MODES
+from benchmarks.server import MODELS, configure
+from benchmarks.utils import print_table, run_concurrent
+import telesto
+from telesto.logger import logger
+
+MICRO_BENCHMARKS: Dict[str, Callable[[], List[Dict]]] = {
+    "rle_encode": rle_encode.run,
+    "serialization": serialization.run,
+    "upload_parsing": upload_parsing.run,
+    "image_decoding": image_decoding.run_input_size,
+    "storage_queue": storage_queue.run,
+    "metrics_overhead": metrics_overhead.run,
+    "startup": startup.run,
+}
+
+Response = Tuple[int, bytes]
+
+
+class InProcessClient:
+    def __init__(self, app):
+        from falcon import testing
+
+        self._client = testing.TestClient(app)
+
+    def request(
+        self, method: str, path: str, body: bytes = b"", content_type: str = ""
+    ) -> Response:
+        headers = {"Content-Type": content_type} if content_type else {}
+        resp = self._client.simulate_request(method, path, body=body, headers=headers)
+        return resp.status_code, resp.content
+
+
+class SocketClient:
+    def __init__(self, port: int, host: str = "127.0.0.1"):
+        self.host = host
+        self.port = port
+
+    def request(
+        self, method: str, path: str, body: bytes = b"", content_type: str = ""
+    ) -> Response:
+        # A new connection per request, like independent clients of a sync worker
+        connection = http.client.HTTPConnection(self.host, self.port, timeout=120)
+        try:
+            headers = {"Content-Type": content_type} if content_type else {}
+            connection.request(method, path, body=body or None, headers=headers)
+            resp = connection.getresponse()
+            return resp.status, resp.read()
+        finally:
+            connection.close()
+
+
+class MemorySampler:
+    """Samples the summed resident memory of a process tree in a background thread."""
+
+    def __init__(self, pid: int, interval: float = 0.02):
+        self.pid = pid
+        self.interval = interval
+        self.peak_bytes = 0
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    @staticmethod
+    def _children(pid: int) -> List[int]:
+        children = []
+        for task in Path(f"/proc/{pid}/task").glob("*"):
+            try:
+                children += [int(child) for child in (task / "children").read_text().split()]
+            except OSError:
+                continue
+        descendants = [pid for child in children for pid in MemorySampler._children(child)]
+        return children + descendants
+
+    @staticmethod
+    def _rss(pid: int) -> int:
+        try:
+            for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+        except OSError:
+            pass
+        return 0
+
+    def sample(self) -> int:
+        return sum(self._rss(pid) for pid in [self.pid] + self._children(self.pid))
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self.peak_bytes = max(self.peak_bytes, self.sample())
+            self._stopped.wait(self.interval)
+
+    def __enter__(self) -> "MemorySampler":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stopped.set()
+        self._thread.join()
+
+
+def make_image(size: int, seed: int = 0) -> bytes:
+    # Smooth random images compress like photos, unlike pure noise
+    rng = np.random.RandomState(seed)
+    small = rng.randint(0, 256, size=(max(1, size // 16), max(1, size // 16), 3), dtype=np.uint8)
+    fp = io.BytesIO()
+    PIL.Image.fromarray(small).resize((size, size), PIL.Image.BILINEAR).save(fp, format="JPEG")
+    return fp.getvalue()
+
+
+class StatusProbe:
+    """Measures the latency of GET / in a background thread while the API is under load."""
+
+    def __init__(self, client, interval: float = 0.05):
+        self.client = client
+        self.interval = interval
+        self.latencies: List[float] = []
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            start = time.perf_counter()
+            status, content = self.client.request("GET", "/")
+            assert status == 200, content
+            self.latencies.append(time.perf_counter() - start)
+            self._stopped.wait(self.interval)
+
+    def stats(self) -> Dict[str, float]:
+        if not self.latencies:
+            return {"status_p50_ms": None, "status_max_ms": None}
+        return {
+            "status_p50_ms": round(float(np.percentile(self.latencies, 50)) * 1000, 2),
+            "status_max_ms": round(max(self.latencies) * 1000, 2),
+        }
+
+    def __enter__(self) -> "StatusProbe":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stopped.set()
+        self._thread.join()
+
+
+def classification_request(client, images: int, size: int) -> Callable[[int], None]:
+    content = base64.b64encode(make_image(size)).decode()
+    body = json.dumps({"images": [{"content": content}] * images}).encode()
+
+    def request(_: int):
+        status, content = client.request("POST", "/", body, "application/json")
+        assert status == 200, content
+
+    return request
+
+
+def segmentation_request(
+    client, size: int, poll_interval: float = 0.005
+) -> Callable[[int], None]:
+    content = base64.b64encode(make_image(size)).decode()
+    body = json.dumps({"image": content}).encode()
+
+    def request(_: int):
+        status, content = client.request("POST", "/jobs", body, "application/json")
+        assert status == 201, content
+        job_id = json.loads(content)["job_id"]
+        while True:
+            status, content = client.request("GET", f"/jobs/{job_id}")
+            if status == 200:
+                return
+            assert status == 202, content
+            time.sleep(poll_interval)
+
+    return request
+
+
+def load_matrix(model_type: str, quick: bool) -> List[Dict]:
+    concurrency = [1, 8] if quick else [1, 8, 32]
+    if model_type == "classification":
+        sizes = [64, 512] if quick else [64, 512, 1024]
+        images = [1, 8] if quick else [1, 8, 32]
+        return [
+            {"image_size": s, "images": n, "concurrency": c}
+            for s in sizes
+            for n in images
+            for c in concurrency
+        ]
+
+    sizes = [256, 1024] if quick else [256, 1024, 2048]
+    return [{"image_size": s, "images": 1, "concurrency": c} for s in sizes for c in concurrency]
+
+
+def run_load(model_type: str, client, pid: int, args: argparse.Namespace, transport: str):
+    rows = []
+    for params in load_matrix(model_type, args.quick):
+        if model_type == "classification":
+            request = classification_request(client, params["images"], params["image_size"])
+        else:
+            request = segmentation_request(client, params["image_size"])
+        # Warm up connections, threads and caches
+        request(0)
+
+        requests = max(args.requests, params["concurrency"] * 4)
+        with MemorySampler(pid) as sampler, StatusProbe(client) as probe:
+            stats = run_concurrent(request, requests, params["concurrency"])
+        row = {
+            "benchmark": model_type,
+            "transport": transport,
+            "model": args.model,
+            **params,
+            **stats,
+            **probe.stats(),
+            "peak_rss_mb": round(sampler.peak_bytes / 2 ** 20, 1),
+        }
+        rows.append(row)
+    print_table(rows)
+    return rows
+
+
+def wait_for_port(port: int, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise TimeoutError(f"Server did not start on port {port}")
+
+
+def wait_until_ready(client, workers: int = 1, timeout: float = 60):
+    """Wait until GET /ready reports that the model is loaded and warmed up in `workers`
+    different server workers."""
+
+    deadline = time.monotonic() + timeout
+    ready_pids = set()
+    while len(ready_pids) < workers:
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"{len(ready_pids)} of {workers} workers got ready")
+        status, content = client.request("GET", "/ready")
+        if status == 200:
+            ready_pids.add(json.loads(content)["worker.pid"])
+        else:
+            time.sleep(0.01)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def run_socket(
+    model_type: str, workdir: str, args: argparse.Namespace, asgi: bool = False
+) -> List[Dict]:
+    transport = "asgi" if asgi else "socket"
+    port = free_port()
+    command = [
+        sys.executable, "-m", "benchmarks.server",
+        "--model-type", model_type,
+        "--model", args.model,
+        "--cost-ms", str(args.cost_ms),
+        "--cost-mode", args.cost_mode,
+        "--workdir", os.path.join(workdir, f"{transport}-{model_type}"),
+        "--port", str(port),
+        "--workers", str(args.server_workers),
+        "--threads", str(args.server_threads),
+    ] + (["--asgi"] if asgi else [])
+    server = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_port(port)
+        client = SocketClient(port)
+        wait_until_ready(client, args.server_workers)
+        return run_load(model_type, client, server.pid, args, transport)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def asgi_available() -> bool:
+    if importlib.util.find_spec("falcon.asgi") and importlib.util.find_spec("uvicorn"):
+        return True
+    print("Skipping the asgi transport: falcon>=3.0 and uvicorn are required")
+    return False
+
+
+def run_in_process(model_type: str, workdir: str, args: argparse.Namespace) -> List[Dict]:
+    # Runs in a child process, because the API configuration is global
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        code = 0
+        try:
+            # Job logs would drown the results
+            logger.setLevel(logging.WARNING)
+            configure(
+                model_type, args.model, args.cost_ms, args.cost_mode,
+                os.path.join(workdir, f"inprocess-{model_type}"),
+            )
+            from telesto.app import get_app
+
+            client = InProcessClient(get_app())
+            wait_until_ready(client)
+            rows = run_load(model_type, client, os.getpid(), args, "inprocess")
+            with os.fdopen(write_fd, "w") as f:
+                json.dump(rows, f)
+        except BaseException:
+            import traceback
+
+            traceback.print_exc()
+            code = 1
+        finally:
+            sys.stdout.flush()
+            os._exit(code)
+
+    os.close(write_fd)
+    with os.fdopen(read_fd) as f:
+        output = f.read()
+    _, status = os.waitpid(pid, 0)
+    if status != 0:
+        raise RuntimeError(f"In-process {model_type} benchmark failed")
+    return json.loads(output)
+
+
+def run_micro(quick: bool) -> List[Dict]:
+    rows = []
+    for name, run in MICRO_BENCHMARKS.items():
+        if quick and name == "image_decoding":
+            continue
+        print(f"Running {name}")
+        rows += [{"benchmark": name, **row} for row in run()]
+    return rows
+
+
+def metadata() -> Dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "telesto_version": telesto.__version__,
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "time": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--quick", action="store_true", help="smaller matrix, fewer requests")
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument(
+        "--only", nargs="+", choices=["classification", "segmentation", "micro"],
+        default=["classification", "segmentation", "micro"],
+    )
+    parser.add_argument(
+        "--transport", choices=["inprocess", "socket", "asgi", "all"], default="all",
+        help="asgi requires falcon>=3.0 and uvicorn, \"all\" skips it if they are missing",
+    )
+    parser.add_argument("--model", choices=MODELS, default="synthetic")
+    parser.add_argument("--cost-ms", type=float, default=5, help="synthetic model cost per image")
+    parser.add_argument("--cost-mode", choices=COST_MODES, default="sleep")
+    parser.add_argument("--requests", type=int, default=None, help="requests per scenario")
+    parser.add_argument("--server-workers", type=int, default=2)
+    parser.add_argument("--server-threads", type=int, default=4)
+    args = parser.parse_args(argv)
+    if args.requests is None:
+        args.requests = 20 if args.quick else 100
+
+    if args.transport == "all":
+        transports = ["inprocess", "socket"] + (["asgi"] if asgi_available() else [])
+    else:
+        transports = [args.transport]
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for model_type in ["classification", "segmentation"]:
+            if model_type not in args.only:
+                continue
+            if "inprocess" in transports:
+                results += run_in_process(model_type, workdir, args)
+            if "socket" in transports:
+                results += run_socket(model_type, workdir, args)
+            if "asgi" in transports:
+                results += run_socket(model_type, workdir, args, asgi=True)
+    if "micro" in args.only:
+        results += run_micro(args.quick)
+
+    doc = {"metadata": metadata(), "config": vars(args), "results": results}
+    Path(args.output).write_text(json.dumps(doc, indent=2))
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Compare parsing a batch of images sent as base64 JSON and as multipart/form-data.
+
+Usage: python -m benchmarks.upload_parsing
+"""
+import base64
+import io
+import json
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+import numpy as np
+import PIL.Image
+
+from benchmarks.utils import print_table
+from telesto.uploads import read_image_uploads
+
+BOUNDARY = "benchmarkBOUNDARY"
+
+
+def make_images(n: int, size: int, seed: int = 0) -> List[bytes]:
+    rng = np.random.RandomState(seed)
+    images = []
+    for _ in range(n):
+        fp = io.BytesIO()
+        array = rng.randint(0, 256, size=(size, size, 3), dtype=np.uint8)
+        PIL.Image.fromarray(array).save(fp, format="PNG")
+        images.append(fp.getvalue())
+    return images
+
+
+def make_json_body(images: List[bytes]) -> bytes:
+    doc = {"images": [{"content": base64.b64encode(image).decode()} for image in images]}
+    return json.dumps(doc).encode()
+
+
+def make_multipart_body(images: List[bytes]) -> bytes:
+    parts = []
+    for i, image in enumerate(images):
+        header = (
+            f"--{BOUNDARY}\r\n"
+            f'Content-Disposition: form-data; name="images"; filename="{i}.png"\r\n'
+            "Content-Type: image/png\r\n\r\n"
+        )
+        parts.append(header.encode() + image + b"\r\n")
+    return b"".join(parts) + f"--{BOUNDARY}--\r\n".encode()
+
+
+def parse_json(body: bytes) -> List[io.BytesIO]:
+    doc = json.load(io.BytesIO(body))
+    return [io.BytesIO(base64.b64decode(image_doc["content"])) for image_doc in doc["images"]]
+
+
+def parse_multipart(body: bytes) -> List[io.BytesIO]:
+    content_type = f"multipart/form-data; boundary={BOUNDARY}"
+    return read_image_uploads(content_type, io.BytesIO(body), "images")
+
+
+def measure(parse: Callable[[bytes], List[io.BytesIO]], body: bytes, repeat: int = 3) -> dict:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parse(body)
+        best = min(best, time.perf_counter() - start)
+
+    # The request body itself is excluded, only memory allocated while parsing is counted
+    tracemalloc.start()
+    parse(body)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "body_mb": round(len(body) / 2 ** 20, 1),
+        "parse_ms": round(best * 1000, 1),
+        "peak_mb": round(peak / 2 ** 20, 1),
+    }
+
+
+def run() -> List[Dict]:
+    rows = []
+    for n, size in [(32, 224), (32, 512)]:
+        images = make_images(n, size)
+        payload_mb = round(sum(map(len, images)) / 2 ** 20, 1)
+        for encoding, make_body, parse in [
+            ("json", make_json_body, parse_json),
+            ("multipart", make_multipart_body, parse_multipart),
+        ]:
+            row = {"images": n, "size": size, "payload_mb": payload_mb, "encoding": encoding}
+            row.update(measure(parse, make_body(images)))
+            rows.append(row)
+    return rows
+
+
+def main():
+    print_table(run())
+
+
+if __name__ == "__main__":
+    main()
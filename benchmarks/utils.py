@@ -0,0 +1,40 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+import numpy as np
+
+
+def latency_stats(latencies: List[float], elapsed: float) -> Dict[str, float]:
+    """Summarize request latencies (in seconds) measured over `elapsed` seconds."""
+
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+    return {
+        "requests": len(latencies),
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(p50, 2),
+        "p95_ms": round(p95, 2),
+        "p99_ms": round(p99, 2),
+    }
+
+
+def run_concurrent(func: Callable[[int], None], requests: int, concurrency: int) -> Dict:
+    """Call `func(i)` for every request index from `concurrency` threads."""
+
+    def timed_call(i: int) -> float:
+        start = time.perf_counter()
+        func(i)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = list(executor.map(timed_call, range(requests)))
+    return latency_stats(latencies, time.perf_counter() - start)
+
+
+def print_table(rows: List[Dict]):
+    columns = list(rows[0])
+    widths = [max(len(str(col)), *(len(str(row[col])) for row in rows)) for col in columns]
+    print("  ".join(str(col).ljust(w) for col, w in zip(columns, widths)))
+    for row in rows:
+        print("  ".join(str(row[col]).ljust(w) for col, w in zip(columns, widths)))
@@ -0,0 +1,105 @@
+"""Measure the memory of the gunicorn master and every API worker holding a classification model
+with large weights, in three modes:
+
+    private - every worker loads its own copy of the weights
+    preload - the master loads the weights before forking the workers (PRELOAD=1)
+    mmap - every worker maps the same weight files (telesto.weights.shared_arrays)
+
+RSS counts pages shared by several processes in each of them, PSS splits them between the
+processes, so the total PSS is the memory the server really uses.
+
+Usage: python -m benchmarks.worker_memory --workers 4 --weights-mb 256
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, List
+
+from benchmarks.suite import (
+    MemorySampler,
+    SocketClient,
+    classification_request,
+    free_port,
+    wait_for_port,
+    wait_until_ready,
+)
+from benchmarks.utils import print_table, run_concurrent
+
+MODES = {"private": [], "preload": ["--preload"], "mmap": ["--mmap-weights"]}
+
+
+def memory_mb(pid: int) -> Dict[str, float]:
+    """Return RSS, PSS, shared and private memory of a process in MB."""
+
+    fields = {}
+    for line in Path(f"/proc/{pid}/smaps_rollup").read_text().splitlines()[1:]:
+        name, value = line.split()[:2]
+        fields[name.rstrip(":")] = int(value) / 1024
+    return {
+        "rss_mb": round(fields["Rss"], 1),
+        "pss_mb": round(fields["Pss"], 1),
+        "shared_mb": round(fields["Shared_Clean"] + fields["Shared_Dirty"], 1),
+        "private_mb": round(fields["Private_Clean"] + fields["Private_Dirty"], 1),
+    }
+
+
+def measure(mode: str, workers: int, weights_mb: int, workdir: str) -> List[Dict]:
+    port = free_port()
+    command = [
+        sys.executable, "-m", "benchmarks.server",
+        "--model-type", "classification",
+        "--model", "synthetic",
+        "--cost-ms", "1",
+        "--workdir", os.path.join(workdir, mode),
+        "--port", str(port),
+        "--workers", str(workers),
+        "--weights-mb", str(weights_mb),
+    ] + MODES[mode]
+    server = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_port(port, timeout=120)
+        client = SocketClient(port)
+        wait_until_ready(client, workers)
+        # Enough requests for every worker to read the weights
+        request = classification_request(client, images=1, size=64)
+        run_concurrent(request, requests=workers * 10, concurrency=workers)
+
+        processes = [("master", server.pid)] + [
+            (f"worker{i + 1}", pid)
+            for i, pid in enumerate(sorted(MemorySampler._children(server.pid)))
+        ]
+        rows = [{"mode": mode, "process": name, **memory_mb(pid)} for name, pid in processes]
+    finally:
+        server.terminate()
+        server.wait()
+
+    totals = {
+        key: round(sum(row[key] for row in rows), 1)
+        for key in ["rss_mb", "pss_mb", "shared_mb", "private_mb"]
+    }
+    return rows + [{"mode": mode, "process": "total", **totals}]
+
+
+def run(workers: int = 4, weights_mb: int = 256) -> List[Dict]:
+    rows = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for mode in MODES:
+            rows += measure(mode, workers, weights_mb, workdir)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--weights-mb", type=int, default=256)
+    args = parser.parse_args()
+    print_table(run(args.workers, args.weights_mb))
+
+
+if __name__ == "__main__":
+    main()
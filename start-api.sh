@@ -1,4 +1,25 @@
 #!/usr/bin/env bash
 
-exec gunicorn --log-level INFO --access-logfile - --workers 2 \
-    --worker-class sync --timeout 60 --bind 0.0.0.0:9876 "telesto.app:get_app()"
+python -c "from telesto.metrics import clear_metrics_dir; clear_metrics_dir()"
+
+# PRELOAD=1 creates the app and loads the model once in the gunicorn master, the workers are
+# forked from it and share the memory of the model
+PRELOAD_ARGS=""
+if [ "${PRELOAD:-0}" = "1" ]; then
+    PRELOAD_ARGS="--preload"
+fi
+
+# Segmentation long polls and event streams end before the worker timeout
+export WORKER_TIMEOUT="${WORKER_TIMEOUT:-60}"
+export THREADS="${THREADS:-1}"
+
+# ASGI=1 serves telesto.asgi with uvicorn workers, requires falcon>=3.0 and uvicorn
+if [ "${ASGI:-0}" = "1" ]; then
+    exec gunicorn --log-level INFO --access-logfile - --workers 2 ${PRELOAD_ARGS} \
+        --worker-class uvicorn.workers.UvicornWorker --timeout "${WORKER_TIMEOUT}" \
+        --bind 0.0.0.0:9876 "telesto.asgi:get_asgi_app()"
+fi
+
+exec gunicorn --log-level INFO --access-logfile - --workers 2 --threads "${THREADS}" \
+    ${PRELOAD_ARGS} --worker-class sync --timeout "${WORKER_TIMEOUT}" --bind 0.0.0.0:9876 \
+    "telesto.app:get_app()"
@@ -3,7 +3,11 @@ from falcon.http_status import HTTPStatus
 
 from telesto.logger import logger
 from telesto.config import config
+from telesto.health import LiveResource, ReadyResource
+from telesto.metrics import MetricsMiddleware, MetricsResource, setup_metrics
 from telesto.models import ModelType
+from telesto.preload import freeze
+from telesto.profiling import Profiler, end_trace, profiler_from_config, start_trace
 
 
 class HandleCORS(object):
@@ -15,6 +19,9 @@ class HandleCORS(object):
         if req.method == "OPTIONS":
             raise HTTPStatus(falcon.HTTP_200, body="\n")
 
+    async def process_request_async(self, req, resp):
+        self.process_request(req, resp)
+
 
 class AuthMiddleware(object):
 
@@ -43,23 +50,79 @@ class AuthMiddleware(object):
             )
             raise falcon.HTTPUnauthorized("Authentication required", description, challenges)
 
+    async def process_request_async(self, req, resp):
+        self.process_request(req, resp)
 
-def get_app():
+
+class ProfilingMiddleware(object):
+    """Returns stage timings in the Server-Timing header, logs slow requests and saves
+    profiles of sampled slow requests, see telesto.profiling.Profiler."""
+
+    def __init__(self, profiler: Profiler):
+        self._profiler = profiler
+
+    def process_request(self, req, resp):
+        req.context.trace, req.context.trace_token = start_trace()
+        req.context.profile = self._profiler.start()
+
+    async def process_request_async(self, req, resp):
+        # cProfile only sees the thread it is started in, while an event loop interleaves
+        # requests and offloads their work to other threads, so ASGI requests are only traced
+        req.context.trace, req.context.trace_token = start_trace()
+        req.context.profile = None
+
+    def process_response(self, req, resp, resource, req_succeeded):
+        trace = getattr(req.context, "trace", None)
+        if trace is None:
+            return
+
+        elapsed = trace.elapsed()
+        end_trace(req.context.trace_token)
+        route = f"{req.method} {req.uri_template or req.path}"
+        self._profiler.finish(req.context.profile, elapsed, route)
+
+        resp.set_header("Server-Timing", trace.server_timing(elapsed))
+        if elapsed >= self._profiler.slow_seconds:
+            logger.warning(f"Slow request {route}: {elapsed * 1000:.1f} ms, {trace}")
+
+    async def process_response_async(self, req, resp, resource, req_succeeded):
+        self.process_response(req, resp, resource, req_succeeded)
+
+
+def get_middleware(metrics_enabled: bool) -> list:
     middleware = [HandleCORS()]
+    profiler = profiler_from_config()
+    if profiler is not None:
+        middleware.insert(0, ProfilingMiddleware(profiler))
+    if metrics_enabled:
+        middleware.insert(0, MetricsMiddleware())
     if config.get("common", "api_key"):
         middleware.append(AuthMiddleware())
-    api = falcon.API(middleware=middleware)
-    api.req_options.strip_url_path_trailing_slash = True
+    return middleware
+
 
+def add_routes(api, metrics_enabled: bool):
     model_type = config.get("common", "model_type")
     if model_type == ModelType.INSTANCE_SEGMENTATION:
-        from telesto.instance_segmentation.app import add_routes
+        from telesto.instance_segmentation.app import add_routes as add_model_routes
     elif model_type == ModelType.CLASSIFICATION:
-        from telesto.classification.app import add_routes
+        from telesto.classification.app import add_routes as add_model_routes
     else:
         raise Exception(f"Wrong model type: {model_type}")
 
-    add_routes(api)
+    readiness = add_model_routes(api)
+    api.add_route("/live", LiveResource())
+    api.add_route("/ready", ReadyResource(readiness))
+    if metrics_enabled:
+        api.add_route("/metrics", MetricsResource())
+
+
+def get_app():
+    metrics_enabled = setup_metrics()
+    api = falcon.API(middleware=get_middleware(metrics_enabled))
+    api.req_options.strip_url_path_trailing_slash = True
+    add_routes(api, metrics_enabled)
+    freeze()
     return api
 
 
@@ -0,0 +1,155 @@
+"""ASGI entry point of the model API, requires falcon>=3.0 and an ASGI server, e.g. uvicorn:
+
+    uvicorn --factory telesto.asgi:get_asgi_app --port 9876
+
+The routes and middleware are the ones of the WSGI app (telesto.app.get_app). Their responders
+run in a thread pool, so decoding images and model calls don't block the event loop, which keeps
+answering status, docs and job polls. Resources can name cheap responders in `async_inline`
+to run them on the event loop, and responders calling the model in `async_limited` to cap the
+number of them in flight.
+
+A resource can also define an async variant of a responder, e.g. `on_get_async(req, resp,
+offload, **params)`, which is served instead of `on_get`. It waits on the event loop, e.g. for
+a job to finish, rather than holding a pool thread, and runs blocking work in the pool with
+`await offload(func, *args)`.
+"""
+import asyncio
+import contextvars
+import functools
+import io
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Iterator, List, Optional, Tuple
+
+from telesto.app import add_routes, get_middleware
+from telesto.config import config
+from telesto.metrics import setup_metrics
+from telesto.preload import freeze
+
+
+class ConcurrencyLimit:
+    """Async context manager letting at most `limit` callers in at once, 0 - no limit."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        # Created in the running event loop, older asyncio binds semaphores to a loop
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    async def __aenter__(self):
+        if self.limit > 0:
+            if self._semaphore is None:
+                self._semaphore = asyncio.Semaphore(self.limit)
+            await self._semaphore.acquire()
+
+    async def __aexit__(self, *exc_info):
+        if self._semaphore is not None:
+            self._semaphore.release()
+
+
+class BufferedRequest:
+    """ASGI request with the body read in advance, as the WSGI resources read it synchronously."""
+
+    def __init__(self, req, body: bytes):
+        self._req = req
+        self.stream = self.bounded_stream = io.BytesIO(body)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._req, name)
+
+
+class AsyncResource:
+    """Serves the responders of a WSGI resource from an ASGI app."""
+
+    def __init__(self, resource, executor: Executor, limit: ConcurrencyLimit):
+        self.resource = resource
+        self._executor = executor
+        self._limit = limit
+
+        inline = getattr(resource, "async_inline", ())
+        limited = getattr(resource, "async_limited", ())
+        for name in dir(resource):
+            responder = getattr(resource, name)
+            if not (name.startswith("on_") and callable(responder)) or name.endswith("_async"):
+                continue
+            async_responder = getattr(resource, f"{name}_async", None)
+            if async_responder is not None:
+                setattr(self, name, self._wrap_async(async_responder))
+            else:
+                setattr(self, name, self._wrap(responder, name in inline, name in limited))
+
+    async def offload(self, func: Callable, *args, **kwargs) -> Any:
+        """Run `func(*args, **kwargs)` in the thread pool."""
+
+        # The context carries the trace of the request, see telesto.profiling
+        call = functools.partial(contextvars.copy_context().run, func, *args, **kwargs)
+        return await asyncio.get_running_loop().run_in_executor(self._executor, call)
+
+    def _wrap(self, responder: Callable, inline: bool, limited: bool) -> Callable:
+        async def run_inline(req, resp, **params):
+            body = await req.stream.read()
+            responder(BufferedRequest(req, body), resp, **params)
+            self._wrap_stream(resp)
+
+        async def run_offloaded(req, resp, **params):
+            body = await req.stream.read()
+            if limited:
+                async with self._limit:
+                    await self.offload(responder, BufferedRequest(req, body), resp, **params)
+            else:
+                await self.offload(responder, BufferedRequest(req, body), resp, **params)
+            self._wrap_stream(resp)
+
+        return run_inline if inline else run_offloaded
+
+    def _wrap_async(self, responder: Callable) -> Callable:
+        async def run(req, resp, **params):
+            body = await req.stream.read()
+            await responder(BufferedRequest(req, body), resp, self.offload, **params)
+            self._wrap_stream(resp)
+
+        return run
+
+    def _wrap_stream(self, resp):
+        # Falcon's ASGI response takes async iterables, e.g. for server-sent events
+        if resp.stream is not None and isinstance(resp.stream, Iterator):
+            resp.stream = self._iterate(resp.stream)
+
+    async def _iterate(self, stream: Iterator[bytes]) -> AsyncIterator[bytes]:
+        loop = asyncio.get_running_loop()
+        end = object()
+        while True:
+            # Producing a chunk may block, e.g. while waiting for a job
+            chunk = await loop.run_in_executor(self._executor, next, stream, end)
+            if chunk is end:
+                return
+            yield chunk
+
+
+class _RouteCollector:
+    def __init__(self):
+        self.routes: List[Tuple[str, Any]] = []
+
+    def add_route(self, uri_template: str, resource):
+        self.routes.append((uri_template, resource))
+
+
+def get_asgi_app():
+    try:
+        import falcon.asgi
+    except ImportError:
+        raise ImportError("The ASGI app requires falcon>=3.0: pip install 'falcon>=3.0' uvicorn")
+
+    metrics_enabled = setup_metrics()
+    app = falcon.asgi.App(middleware=get_middleware(metrics_enabled))
+    app.req_options.strip_url_path_trailing_slash = True
+
+    executor = ThreadPoolExecutor(
+        max_workers=config.getint("asgi", "threads", fallback=8), thread_name_prefix="responder"
+    )
+    limit = ConcurrencyLimit(config.getint("asgi", "max_inflight", fallback=4))
+
+    routes = _RouteCollector()
+    add_routes(routes, metrics_enabled)
+    for uri_template, resource in routes.routes:
+        app.add_route(uri_template, AsyncResource(resource, executor, limit))
+    freeze()
+    return app
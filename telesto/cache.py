@@ -0,0 +1,94 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Union
+
+
+class LRUCache:
+    """Thread-safe least recently used cache bounded by entry count and by total size.
+
+    Attributes:
+        max_entries: maximum number of entries, 0 means no limit
+        max_bytes: maximum total size of the values, 0 means no limit
+        hits: number of get() calls which found a value
+        misses: number of get() calls which did not
+    """
+
+    def __init__(
+        self, max_entries: int = 1024, max_bytes: int = 0, sizeof: Callable[[Any], int] = len
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+        self._sizeof = sizeof
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._nbytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def nbytes(self) -> int:
+        return self._nbytes
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: Hashable, value: Any):
+        size = self._sizeof(value)
+        if self.max_bytes and size > self.max_bytes:
+            return
+
+        with self._lock:
+            self._pop(key)
+            self._entries[key] = value
+            self._nbytes += size
+            while (self.max_entries and len(self._entries) > self.max_entries) or (
+                self.max_bytes and self._nbytes > self.max_bytes
+            ):
+                _, evicted = self._entries.popitem(last=False)
+                self._nbytes -= self._sizeof(evicted)
+
+    def pop(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            return self._pop(key)
+
+    def _pop(self, key: Hashable) -> Optional[Any]:
+        value = self._entries.pop(key, None)
+        if value is not None:
+            self._nbytes -= self._sizeof(value)
+        return value
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._nbytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+def model_identity(model_class: type) -> str:
+    """Identify a model by its class and `version` attribute, for keys of cached results."""
+
+    version = getattr(model_class, "version", None) or ""
+    return f"{model_class.__module__}.{model_class.__qualname__}:{version}"
+
+
+def content_key(data: Union[bytes, memoryview], model_id: str) -> str:
+    """Hash an encoded input, e.g. an uploaded image file, together with the model identity."""
+
+    digest = hashlib.blake2b(model_id.encode(), digest_size=16)
+    digest.update(data)
+    return digest.hexdigest()
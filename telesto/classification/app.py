@@ -3,68 +3,167 @@ import io
 import os
 import json
 import socket
+import threading
 from importlib import import_module
-from typing import List
+from typing import Callable, List, Optional
 
 import falcon
 import numpy as np
-import PIL.Image
 
+from telesto.cache import LRUCache, content_key, model_identity
+from telesto.health import Readiness, warmup_model
 from telesto.logger import logger
-from telesto.models import RandomClassificationModel
+from telesto.config import config
+from telesto.images import ImageDecoder
+from telesto.metrics import DEDUP_HITS, stage
+from telesto.preload import preload_enabled
+from telesto.serialization import PreEncoded, dumps
+from telesto.uploads import read_image_uploads
+from telesto.classification.batching import MicroBatcher
+from telesto.classification.model import (
+    MAX_INPUT_IMAGES,
+    ClassificationModelBase,
+    RandomClassificationModel,
+)
 
+STATUS_BODY = PreEncoded(
+    lambda: {"status": "ok", "host": socket.getfqdn(), "worker.pid": os.getpid()}
+)
 
-def preprocess(doc: dict) -> List[np.ndarray]:
-    input_list = []
-    for image_doc in doc["images"]:
-        image_bytes = base64.b64decode(image_doc["content"])
-        image = PIL.Image.open(io.BytesIO(image_bytes))
-        array = np.array(image)
-        assert array.ndim in [2, 3], f"Wrong number of dimensions: {array.ndim}"
 
-        input_list.append(array)
-    return input_list
+def preprocess(doc: dict) -> List[io.BytesIO]:
+    return [io.BytesIO(base64.b64decode(image_doc["content"])) for image_doc in doc["images"]]
 
 
 def postprocess(pred_array: np.ndarray, classes: List[str]) -> dict:
-    predictions = []
-    for pred in pred_array:
-        class_probs = {classes[i]: round(float(prob), 5) for i, prob in enumerate(pred)}
-        class_prediction = classes[pred.argmax()]
-        predictions.append({"probs": class_probs, "prediction": class_prediction})
-    return {"predictions": predictions}
+    pred_array = np.asarray(pred_array, dtype=np.float64)
+    # Rounded and converted to Python floats for the whole matrix at once
+    probs = np.round(pred_array, 5).tolist()
+    class_predictions = pred_array.argmax(axis=1).tolist()
+    return {
+        "predictions": [
+            {"probs": dict(zip(classes, row)), "prediction": classes[i]}
+            for row, i in zip(probs, class_predictions)
+        ]
+    }
 
 
 class ClassificationResource:
+    """Classifies posted images.
+
+    The model is loaded and warmed up in a background thread, requests get 503 until it is
+    ready, see `readiness`. A preloaded app (telesto.preload) loads it right away.
+    """
+
+    # Responders run on the event loop and responders whose calls are capped, see telesto.asgi
+    async_inline = ("on_get",)
+    async_limited = ("on_post",)
+
     def __init__(self):
+        self.readiness = Readiness()
+        # A missing model module fails the start, not the background thread
+        model_class = self._model_class()
+        if preload_enabled():
+            # Loaded before the workers are forked, errors fail the start
+            self._setup(model_class())
+            self.readiness.set_ready()
+        else:
+            thread = threading.Thread(
+                target=self._load, args=(model_class,), name="model-loader", daemon=True
+            )
+            thread.start()
+
+    def _load(self, model_class: Callable[[], ClassificationModelBase]):
         try:
-            self.model_wrapper = self._load_model()
+            self._setup(model_class())
+        except Exception as e:
+            logger.error(f"Failed to load the model: {e}", exc_info=True)
+            self.readiness.set_failed(str(e))
+            return
+        self.readiness.set_ready()
+        logger.info("Model is ready")
+
+    def _setup(self, model_wrapper: ClassificationModelBase):
+        self.model_wrapper = model_wrapper
+        self.image_decoder = ImageDecoder(
+            workers=config.getint("classification", "decode_workers", fallback=1),
+            stack=config.getboolean("classification", "stack_images", fallback=False),
+            size=self.model_wrapper.input_size,
+            mode=self.model_wrapper.input_mode,
+        )
+        # The warmup input is decoded like posted images, e.g. stacked
+        warmup_model(self.model_wrapper, decoder=self.image_decoder)
+
+        # Predictions of already seen image files, keyed by the file content and the model
+        self.model_id = model_identity(type(self.model_wrapper))
+        dedup_entries = config.getint("classification", "dedup_cache_entries", fallback=0)
+        self.result_cache: Optional[LRUCache] = None
+        if dedup_entries > 0:
+            self.result_cache = LRUCache(max_entries=dedup_entries, sizeof=lambda row: row.nbytes)
+
+        if config.getboolean("classification", "batching", fallback=False):
+            self.model_wrapper = MicroBatcher(
+                self.model_wrapper,
+                max_batch_size=config.getint("classification", "batch_size", fallback=32),
+                max_wait=config.getfloat("classification", "batch_wait_ms", fallback=5) / 1000,
+            )
+
+    @staticmethod
+    def _model_class() -> Callable[[], ClassificationModelBase]:
+        try:
+            module = import_module("model")
+            return getattr(module, "ClassificationModel")
         except ModuleNotFoundError as e:
             if int(os.environ.get("USE_FALLBACK_MODEL", 0)):
                 logger.warning(
                     "No model module found. Using fallback model 'RandomClassificationModel'"
                 )
-                self.model_wrapper = RandomClassificationModel()
+                return RandomClassificationModel
             else:
                 raise e
 
-    @staticmethod
-    def _load_model():
-        module = import_module("model")
-        model_class = getattr(module, "ClassificationModel")
-        return model_class()
-
     def on_get(self, req: falcon.Request, resp: falcon.Response):
-        doc = {"status": "ok", "host": socket.getfqdn(), "worker.pid": os.getpid()}
-        resp.body = json.dumps(doc, ensure_ascii=False)
+        resp.data = STATUS_BODY()
+
+    def _predict(self, image_files: List[io.BytesIO]) -> np.ndarray:
+        with stage("decode"):
+            input_list = self.image_decoder(image_files)
+        with stage("predict"):
+            return self.model_wrapper(input_list)
+
+    def _predict_cached(self, image_files: List[io.BytesIO]) -> np.ndarray:
+        if not (0 < len(image_files) <= MAX_INPUT_IMAGES):
+            raise ValueError(f"Wrong number of images: {len(image_files)}")
+
+        keys = [content_key(fp.getbuffer(), self.model_id) for fp in image_files]
+        rows = [self.result_cache.get(key) for key in keys]
+        missing = [i for i, row in enumerate(rows) if row is None]
+        DEDUP_HITS.inc("classification", amount=len(rows) - len(missing))
+        if missing:
+            pred_array = self._predict([image_files[i] for i in missing])
+            for i, row in zip(missing, pred_array):
+                rows[i] = np.array(row)
+                self.result_cache.put(keys[i], rows[i])
+        return np.stack(rows)
 
     def on_post(self, req: falcon.Request, resp: falcon.Response):
+        if not self.readiness.ready:
+            raise falcon.HTTPServiceUnavailable(
+                description=f"The model is not ready: {self.readiness.reason}", retry_after=1
+            )
         try:
-            req_doc = json.load(req.bounded_stream)
-            input_list = preprocess(req_doc)
-            pred_array = self.model_wrapper(input_list)
-            resp_doc = postprocess(pred_array, self.model_wrapper.classes)
-            resp.body = json.dumps(resp_doc)
+            with stage("upload"):
+                image_files = read_image_uploads(req.content_type, req.bounded_stream, "images")
+                if image_files is None:
+                    req_doc = json.load(req.bounded_stream)
+                    image_files = preprocess(req_doc)
+            if self.result_cache is None:
+                pred_array = self._predict(image_files)
+            else:
+                pred_array = self._predict_cached(image_files)
+            with stage("serialize"):
+                resp_doc = postprocess(pred_array, self.model_wrapper.classes)
+                resp.data = dumps(resp_doc)
         except ValueError as e:
             raise falcon.HTTPError(falcon.HTTP_400, description=str(e))
         except Exception as e:
@@ -72,5 +171,7 @@ class ClassificationResource:
             raise falcon.HTTPError(falcon.HTTP_500)
 
 
-def add_routes(api: falcon.API):
-    api.add_route("/", ClassificationResource())
+def add_routes(api: falcon.API) -> Readiness:
+    resource = ClassificationResource()
+    api.add_route("/", resource)
+    return resource.readiness
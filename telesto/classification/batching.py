@@ -0,0 +1,134 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Deque, List, Tuple
+
+import numpy as np
+
+from telesto.images import ImageBatch
+from telesto.logger import logger
+from telesto.preload import start_in_workers
+from telesto.classification.model import ClassificationModelBase, MAX_INPUT_IMAGES
+
+
+class MicroBatcher:
+    """Groups images from concurrent requests into shared model calls.
+
+    Callers block in __call__ while a background thread collects pending requests until
+    `max_batch_size` images are gathered or the oldest request has waited `max_wait` seconds.
+    The model is then called once and every caller receives its own rows of the result. If the
+    call fails, the requests are passed to the model one by one, so only the requests which
+    fail on their own get the error.
+
+    Attributes:
+        model_wrapper: the wrapped classification model
+        max_batch_size: maximum number of images passed to a single model call
+        max_wait: maximum time in seconds a request waits for other requests to join its batch
+    """
+
+    def __init__(
+        self,
+        model_wrapper: ClassificationModelBase,
+        max_batch_size: int = MAX_INPUT_IMAGES,
+        max_wait: float = 0.005,
+    ):
+        if not (0 < max_batch_size <= MAX_INPUT_IMAGES):
+            raise ValueError(f"Wrong batch size: {max_batch_size}")
+
+        self.model_wrapper = model_wrapper
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+
+        self._pending: Deque[Tuple[ImageBatch, Future, float]] = deque()
+        self._pending_images = 0
+        self._cond = threading.Condition()
+
+        start_in_workers(self._start)
+
+    def _start(self):
+        thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        thread.start()
+
+    @property
+    def classes(self) -> List[str]:
+        return self.model_wrapper.classes
+
+    def __call__(self, input_list: ImageBatch) -> np.ndarray:
+        if not (0 < len(input_list) <= MAX_INPUT_IMAGES):
+            raise ValueError(f"Wrong number of images: {len(input_list)}")
+
+        future = Future()
+        with self._cond:
+            self._pending.append((input_list, future, time.monotonic()))
+            self._pending_images += len(input_list)
+            self._cond.notify()
+        return future.result()
+
+    def _next_batch(self) -> List[Tuple[ImageBatch, Future, float]]:
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+
+            deadline = self._pending[0][2] + self.max_wait
+            while self._pending_images < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            # Requests are never split, so a request that does not fit waits for the next batch
+            batch = [self._pending.popleft()]
+            batch_images = len(batch[0][0])
+            while self._pending and batch_images + len(self._pending[0][0]) <= self.max_batch_size:
+                batch.append(self._pending.popleft())
+                batch_images += len(batch[-1][0])
+            self._pending_images -= batch_images
+            return batch
+
+    @staticmethod
+    def _merge_inputs(inputs: List[ImageBatch]) -> ImageBatch:
+        # Stacked requests with the same image shape stay stacked
+        if all(isinstance(batch, np.ndarray) for batch in inputs):
+            if len({(batch.shape[1:], batch.dtype) for batch in inputs}) == 1:
+                return np.concatenate(inputs)
+        return [array for batch in inputs for array in batch]
+
+    def _predict(self, input_list: ImageBatch) -> np.ndarray:
+        pred_array = self.model_wrapper(input_list)
+        if len(pred_array) != len(input_list):
+            raise ValueError(
+                f"Wrong number of predictions: {len(pred_array)}, expected: {len(input_list)}"
+            )
+        return pred_array
+
+    def _run_one_by_one(self, batch: List[Tuple[ImageBatch, Future, float]]):
+        # Only the requests whose own images fail get an error
+        for inputs, future, _ in batch:
+            try:
+                future.set_result(self._predict(inputs))
+            except Exception as e:
+                logger.error(e, exc_info=True)
+                future.set_exception(e)
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            input_list = self._merge_inputs([inputs for inputs, _, _ in batch])
+            try:
+                pred_array = self._predict(input_list)
+            except Exception as e:
+                if len(batch) == 1:
+                    logger.error(e, exc_info=True)
+                    batch[0][1].set_exception(e)
+                else:
+                    logger.warning(
+                        f"Batch of {len(batch)} requests failed, processing them one by one: {e}"
+                    )
+                    self._run_one_by_one(batch)
+                continue
+
+            start = 0
+            for inputs, future, _ in batch:
+                future.set_result(pred_array[start:start + len(inputs)])
+                start += len(inputs)
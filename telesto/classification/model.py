@@ -1,8 +1,13 @@
-from typing import List
+from typing import List, Optional, Tuple
 import random
 
 import numpy as np
 
+from telesto.images import ImageBatch, ImageDecoder, blank_upload
+from telesto.metrics import BATCH_SIZE
+
+MAX_INPUT_IMAGES = 32
+
 
 class ClassificationModelBase:
     """Base class for a classification model wrapper.
@@ -10,8 +15,18 @@ class ClassificationModelBase:
     Attributes:
         classes (list): contains the labels
         model: the object representing the model, to be loaded with _load_model()
+        input_size (tuple): (width, height) the input images are resized to before predict(),
+            None - images are passed at their original size
+        input_mode (str): PIL mode the input images are converted to, e.g. "RGB" or "L",
+            None - images are passed in their original mode
+        version (str): version of the model weights, change it when they are updated so that
+            results cached by content hash are not reused
     """
 
+    input_size: Optional[Tuple[int, int]] = None
+    input_mode: Optional[str] = None
+    version: Optional[str] = None
+
     def __init__(self, classes: List[str], model_path: str):
         self.classes: List[str] = classes
         self.model = self._load_model(model_path=model_path)
@@ -21,22 +36,38 @@ class ClassificationModelBase:
 
         raise NotImplemented
 
-    def predict(self, input_list: List[np.ndarray]) -> np.ndarray:
+    def predict(self, input_list: ImageBatch) -> np.ndarray:
         """Classify a list of input images and return an array of class probabilities.
 
         Args:
             input_list: list of input images, each image is a 3D array
-                with a number of channels
+                with a number of channels, or a single 4D array of same-shaped images
+                if "stack_images" is enabled in the config
 
         Returns:
             2D array of class probabilities, 0 dim - images, 1 dim - classes
         """
         raise NotImplemented
 
-    def __call__(self, input_list: List[np.ndarray]) -> np.ndarray:
-        if not (0 < len(input_list) <= 32):
+    def warmup(self, size: Tuple[int, int] = (512, 512), decoder: Optional[ImageDecoder] = None):
+        """Classify a blank image, so that lazy initialization, memory allocation or JIT
+        compilation of the model don't slow down the first request.
+
+        Args:
+            size: (width, height) of the image if the model has no `input_size`
+            decoder: decoder of the posted images, so that predict() gets the same input type
+                as for requests, e.g. stacked images. By default the image is converted to
+                `input_size` and `input_mode`
+        """
+        if decoder is None:
+            decoder = ImageDecoder(size=self.input_size, mode=self.input_mode)
+        self.predict(decoder([blank_upload(size)]))
+
+    def __call__(self, input_list: ImageBatch) -> np.ndarray:
+        if not (0 < len(input_list) <= MAX_INPUT_IMAGES):
             raise ValueError(f"Wrong number of images: {len(input_list)}")
 
+        BATCH_SIZE.observe(len(input_list), "classification")
         return self.predict(input_list)
 
 
@@ -47,7 +78,7 @@ class RandomClassificationModel(ClassificationModelBase):
     def _load_model(self, model_path: str):
         pass
 
-    def predict(self, input_list: List[np.ndarray]) -> np.ndarray:
+    def predict(self, input_list: ImageBatch) -> np.ndarray:
         batch_size = len(input_list)
         predictions = []
         for _ in range(batch_size):
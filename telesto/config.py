@@ -1,7 +1,78 @@
 import configparser
-from pathlib import Path
+import threading
+from typing import Sequence
 
-config = configparser.ConfigParser()
-config.read("default.ini")
-if Path("live.ini").exists():
-    config.read("live.ini")
+
+class LazyConfigParser(configparser.ConfigParser):
+    """Config parser which reads its files on first use instead of on import.
+
+    Importing telesto modules then doesn't touch the file system, and the files are read from
+    the working directory the server has when it starts using the config. Missing files are
+    skipped, later files override earlier ones.
+    """
+
+    def __init__(self, filenames: Sequence[str]):
+        super().__init__()
+        self._filenames = list(filenames)
+        self._loaded = False
+        self._loading = False
+        self._load_lock = threading.RLock()
+
+    def load(self):
+        if self._loaded:
+            return
+        with self._load_lock:
+            # Reading calls methods of the parser itself
+            if self._loaded or self._loading:
+                return
+            self._loading = True
+            try:
+                self.read(self._filenames)
+                self._loaded = True
+            finally:
+                # After an error the files are read again on the next access
+                self._loading = False
+
+    def get(self, section, option, **kwargs):
+        # Also used by getint(), getfloat() and getboolean()
+        self.load()
+        return super().get(section, option, **kwargs)
+
+    def set(self, section, option, value=None):
+        self.load()
+        super().set(section, option, value)
+
+    def items(self, *args, **kwargs):
+        self.load()
+        return super().items(*args, **kwargs)
+
+    def sections(self):
+        self.load()
+        return super().sections()
+
+    def has_section(self, section):
+        self.load()
+        return super().has_section(section)
+
+    def has_option(self, section, option):
+        self.load()
+        return super().has_option(section, option)
+
+    def options(self, section):
+        self.load()
+        return super().options(section)
+
+    def __getitem__(self, key):
+        self.load()
+        return super().__getitem__(key)
+
+    def __contains__(self, key):
+        self.load()
+        return super().__contains__(key)
+
+    def __iter__(self):
+        self.load()
+        return super().__iter__()
+
+
+config = LazyConfigParser(["default.ini", "live.ini"])
@@ -0,0 +1,92 @@
+import os
+import threading
+import time
+from typing import Tuple
+
+import falcon
+
+from telesto.config import config
+from telesto.logger import logger
+from telesto.serialization import PreEncoded, dumps
+
+LIVE_BODY = PreEncoded(lambda: {"status": "ok", "worker.pid": os.getpid()})
+READY_BODY = PreEncoded(lambda: {"status": "ready", "worker.pid": os.getpid()})
+
+
+class Readiness:
+    """Whether the model of this process is loaded and warmed up, reported by GET /ready.
+
+    Attributes:
+        reason: why the model is not ready yet, empty when it is ready
+    """
+
+    def __init__(self, reason: str = "loading model"):
+        self.reason = reason
+        self._ready = threading.Event()
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    def set_ready(self):
+        self.reason = ""
+        self._ready.set()
+
+    def set_failed(self, error: str):
+        self.reason = f"model failed to load: {error}"
+
+    def wait(self, timeout: float = None) -> bool:
+        return self._ready.wait(timeout)
+
+
+class LiveResource:
+    """Liveness check: the worker process answers requests, its model may still be loading."""
+
+    async_inline = ("on_get",)
+
+    def on_get(self, req: falcon.Request, resp: falcon.Response):
+        resp.data = LIVE_BODY()
+
+
+class ReadyResource:
+    """Readiness check: 503 until the model is loaded and warmed up, so that a load balancer
+    sends requests only to ready workers.
+
+    Attributes:
+        readiness: object with `ready` and `reason` attributes, e.g. a Readiness
+    """
+
+    async_inline = ("on_get",)
+
+    def __init__(self, readiness):
+        self.readiness = readiness
+
+    def on_get(self, req: falcon.Request, resp: falcon.Response):
+        if self.readiness.ready:
+            resp.data = READY_BODY()
+        else:
+            resp.status = falcon.HTTP_503
+            resp.data = dumps(
+                {"status": "not ready", "reason": self.readiness.reason, "worker.pid": os.getpid()}
+            )
+
+
+def warmup_size() -> Tuple[int, int]:
+    width, height = config.get("common", "warmup_size", fallback="512,512").split(",")
+    return int(width), int(height)
+
+
+def warmup_model(model_wrapper, **kwargs):
+    """Call warmup() of the model with `kwargs` if warmup is enabled in the config.
+
+    Raises an error if warmup fails, so that the model is not reported ready.
+    """
+    if not config.getboolean("common", "warmup", fallback=True):
+        return
+
+    start = time.perf_counter()
+    try:
+        model_wrapper.warmup(warmup_size(), **kwargs)
+    except Exception as e:
+        raise RuntimeError(f"warmup failed: {e}") from e
+    logger.info(f"Model warmed up in {(time.perf_counter() - start) * 1000:.0f} ms")
@@ -0,0 +1,122 @@
+import io
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Callable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import PIL.Image
+
+ImageBatch = Union[List[np.ndarray], np.ndarray]
+
+# Modes which cannot be resized smoothly and are converted first
+_INDEXED_MODES = ("1", "P")
+# 16-bit modes which reduce() doesn't support, they are resized as 32-bit "I" images
+_16_BIT_MODES = ("I;16", "I;16L", "I;16B", "I;16N")
+
+
+def prepare_image(
+    image: PIL.Image.Image, size: Optional[Tuple[int, int]] = None, mode: Optional[str] = None
+) -> PIL.Image.Image:
+    """Decode an opened image at the model input size and mode.
+
+    JPEG images are decoded at a reduced scale with draft() when they are at least twice
+    as large as `size`, other images are shrunk with reduce() before the final resize.
+
+    Args:
+        image: image opened with PIL.Image.open(), not decoded yet
+        size: (width, height) of the result, None keeps the image size
+        mode: PIL mode of the result, e.g. "RGB" or "L", None keeps the image mode
+    """
+    if size is not None or mode is not None:
+        # Only changes JPEG images which have not been decoded yet
+        image.draft(mode, size)
+
+    if mode is not None and image.mode != mode and image.mode in _INDEXED_MODES:
+        image = image.convert(mode)
+    if mode is None:
+        mode = image.mode
+    if size is not None and image.size != tuple(size):
+        if image.mode in _16_BIT_MODES:
+            image = image.convert("I")
+        image = image.resize(size, PIL.Image.BILINEAR, reducing_gap=2.0)
+    if image.mode != mode:
+        image = image.convert(mode)
+    return image
+
+
+def blank_image(size: Tuple[int, int], mode: Optional[str] = None) -> np.ndarray:
+    """Return a black image array of (width, height) `size` and PIL `mode`, RGB by default."""
+
+    return np.asarray(PIL.Image.new(mode or "RGB", tuple(size)))
+
+
+def blank_upload(size: Tuple[int, int]) -> io.BytesIO:
+    """Return a black RGB image of (width, height) `size` encoded as PNG, like a posted image."""
+
+    fp = io.BytesIO()
+    PIL.Image.new("RGB", tuple(size)).save(fp, format="PNG")
+    fp.seek(0)
+    return fp
+
+
+class ImageDecoder:
+    """Decodes encoded images into arrays, optionally in a thread pool.
+
+    PIL releases the GIL while decoding, so the images of a request are decoded in parallel
+    by up to `workers` threads. With `stack` enabled, images of the same size and mode are
+    decoded into one preallocated array of shape (N, H, W) or (N, H, W, C), instead of a list
+    of separate arrays. Images are converted to `size` and `mode` if they are set,
+    see prepare_image().
+
+    Attributes:
+        workers: number of decoding threads shared by all requests, 1 - decode in the caller
+        stack: whether to stack same-shaped images into one array
+        size: (width, height) of the decoded images, None keeps the image sizes
+        mode: PIL mode of the decoded images, None keeps the image modes
+    """
+
+    def __init__(
+        self,
+        workers: int = 1,
+        stack: bool = False,
+        size: Optional[Tuple[int, int]] = None,
+        mode: Optional[str] = None,
+    ):
+        if workers < 1:
+            raise ValueError(f"Wrong number of decoding workers: {workers}")
+
+        self.workers = workers
+        self.stack = stack
+        self.size = size
+        self.mode = mode
+        self._pool = ThreadPoolExecutor(workers, "image-decoder") if workers > 1 else None
+
+    def _map(self, func: Callable, items: Sequence) -> list:
+        if self._pool is None or len(items) < 2:
+            return [func(item) for item in items]
+        return list(self._pool.map(func, items))
+
+    def __call__(self, image_files: List[BinaryIO]) -> ImageBatch:
+        # Opening an image only reads its header
+        images = [PIL.Image.open(fp) for fp in image_files]
+
+        shapes = {(self.size or image.size, self.mode or image.mode) for image in images}
+        if self.stack and len(shapes) == 1:
+            # The first image gives the dtype and the shape of the others
+            first = self._to_array(images[0], copy=False)
+            batch = np.empty((len(images),) + first.shape, dtype=first.dtype)
+            batch[0] = first
+
+            def decode_into(i: int):
+                batch[i] = self._to_array(images[i], copy=False)
+
+            self._map(decode_into, range(1, len(images)))
+            return batch
+
+        return self._map(self._to_array, images)
+
+    def _to_array(self, image: PIL.Image.Image, copy: bool = True) -> np.ndarray:
+        image = prepare_image(image, self.size, self.mode)
+        # Without a copy the array can be a read-only view of the decoded bytes
+        array = np.array(image) if copy else np.asarray(image)
+        assert array.ndim in [2, 3], f"Wrong number of dimensions: {array.ndim}"
+        return array
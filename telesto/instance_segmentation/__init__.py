@@ -1,33 +1,368 @@
+import json
+import os
 import pickle
+import re
 import shutil
-from dataclasses import dataclass
+from dataclasses import asdict, dataclass, field
 from pathlib import Path
-from typing import List, Any, Dict, Tuple
+from typing import Any, BinaryIO, Callable, Dict, List, Mapping, Optional, Set, Tuple, Union
 
 import numpy as np
+import PIL.Image
+
+from telesto.images import prepare_image
+
+# Suffix of job inputs saved as uploaded, the image format is detected on load
+ENCODED_SUFFIX = ".img"
+
+_DATA_FILE_RE = re.compile(
+    r"^(?P<gid>.+)-(?P<type>input|output|state|access)\.(npy|npz|img|pickle|json|stamp)$"
+)
+
+# Job states, see JobState
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
 
 
 class DataStorage:
+    """Stores job inputs and outputs in a directory, one set of files per job id.
+
+    Inputs are saved either as they were uploaded (encoded images, see save_encoded())
+    or as .npy arrays, outputs as uncompressed .npz archives of packed object masks
+    (see _pack_objects()). Nothing is unpickled on load, .npy inputs are memory-mapped.
+    Files in the legacy .pickle format are still read. The final state of a processed job
+    is saved as a small JSON file (see save_state()).
+    """
 
     def __init__(self, base_path: str = "./data/storage"):
         self._base_path = Path(base_path)
         self._base_path.mkdir(parents=True, exist_ok=True)
 
+    @property
+    def path(self) -> Path:
+        return self._base_path
+
     def clean(self):
         shutil.rmtree(self._base_path, ignore_errors=True)
         self._base_path.mkdir(parents=True, exist_ok=True)
 
-    def _data_path(self, gid: str, output: bool) -> Path:
+    def _data_path(self, gid: str, output: bool, suffix: str = None) -> Path:
         type_ = "output" if output else "input"
-        return self._base_path / f"{gid}-{type_}.pickle"
+        if suffix is None:
+            suffix = ".npz" if output else ".npy"
+        return self._base_path / f"{gid}-{type_}{suffix}"
+
+    def _write(self, path: Path, write: Callable[[BinaryIO], None]):
+        # Write to a temporary file first, so readers never see a partially written one
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        with tmp_path.open("wb") as f:
+            write(f)
+        tmp_path.replace(path)
+
+    def save_encoded(self, gid: str, data: Union[bytes, memoryview]):
+        """Save a job input image as encoded bytes (PNG, JPEG, ...), it is decoded on load()."""
+
+        self._write(self._data_path(gid, False, ENCODED_SUFFIX), lambda f: f.write(data))
 
     def save(self, gid: str, obj: Any, output: bool):
-        pickle.dump(obj, self._data_path(gid, output).open("wb"))
+        """Save a job input (an image or an array) or output (a list of DetectionObject)."""
+
+        if output:
+            arrays = _pack_objects(obj)
+            self._write(self._data_path(gid, output), lambda f: np.savez(f, **arrays))
+        else:
+            array = np.asarray(obj)
+            self._write(self._data_path(gid, output), lambda f: np.save(f, array))
 
     def load(self, gid: str, output: bool) -> Any:
-        image_path = self._data_path(gid, output)
-        if image_path.exists():
-            return pickle.load(image_path.open("rb"))
+        """Load a job input as a read-only array or output as a list of DetectionObject.
+
+        Returns:
+            loaded data or None if nothing was saved for the job
+        """
+        path = self._data_path(gid, output)
+        try:
+            if output:
+                with np.load(path) as arrays:
+                    return _unpack_objects(arrays)
+            else:
+                return np.load(path, mmap_mode="r")
+        except FileNotFoundError:
+            pass
+
+        if not output:
+            try:
+                with PIL.Image.open(self._data_path(gid, output, ENCODED_SUFFIX)) as image:
+                    return np.asarray(image)
+            except FileNotFoundError:
+                pass
+        return self._load_legacy(gid, output)
+
+    def load_input(
+        self, gid: str, size: Optional[Tuple[int, int]] = None, mode: Optional[str] = None
+    ) -> Optional[np.ndarray]:
+        """Load a job input image converted to `size` and `mode`, see prepare_image().
+
+        Encoded images are decoded directly at the reduced size where the format allows it.
+        """
+        if size is None and mode is None:
+            image = self.load(gid, output=False)
+            return None if image is None else np.asarray(image)
+
+        try:
+            with PIL.Image.open(self._data_path(gid, False, ENCODED_SUFFIX)) as image:
+                return np.asarray(prepare_image(image, size, mode))
+        except FileNotFoundError:
+            pass
+
+        array = self.load(gid, output=False)
+        if array is not None:
+            return np.asarray(prepare_image(PIL.Image.fromarray(np.asarray(array)), size, mode))
+
+    def _load_legacy(self, gid: str, output: bool) -> Any:
+        path = self._data_path(gid, output, suffix=".pickle")
+        if path.exists():
+            with path.open("rb") as f:
+                obj = pickle.load(f)
+            return obj if output else np.asarray(obj)
+
+    def input_size(self, gid: str) -> Optional[Tuple[int, int]]:
+        """Return the (width, height) of a job input image without decoding the image data."""
+
+        try:
+            with PIL.Image.open(self._data_path(gid, False, ENCODED_SUFFIX)) as image:
+                return image.size
+        except FileNotFoundError:
+            pass
+
+        image = self.load(gid, output=False)
+        if image is not None:
+            return image.shape[1], image.shape[0]
+
+    def _state_path(self, gid: str) -> Path:
+        return self._base_path / f"{gid}-state.json"
+
+    def save_state(self, gid: str, state: "JobState"):
+        """Save the state of a job after it is processed."""
+
+        data = json.dumps(asdict(state)).encode()
+        self._write(self._state_path(gid), lambda f: f.write(data))
+
+    def load_state(self, gid: str) -> Optional["JobState"]:
+        """Load the state saved by save_state().
+
+        Returns:
+            job state or None if the job is not processed yet or was processed by an older version
+        """
+        try:
+            return JobState(**json.loads(self._state_path(gid).read_bytes()))
+        except FileNotFoundError:
+            return None
+
+    def copy_job(self, src_gid: str, dst_gid: str) -> bool:
+        """Copy the input and output of a finished job to a new job id, as hard links if possible.
+
+        Returns:
+            False if the source job has no output
+        """
+        copied = False
+        for output in [True, False]:
+            for suffix in [None, ENCODED_SUFFIX, ".pickle"]:
+                try:
+                    _link_or_copy(
+                        self._data_path(src_gid, output, suffix),
+                        self._data_path(dst_gid, output, suffix),
+                    )
+                except FileNotFoundError:
+                    continue
+                copied = copied or output
+        if not copied:
+            self.delete(dst_gid)
+        return copied
+
+    def _index_path(self, key: str) -> Path:
+        return self._base_path / "index" / key
+
+    def save_index(self, key: str, gid: str):
+        """Map a key, e.g. a content hash of the job input, to a job id."""
+
+        path = self._index_path(key)
+        path.parent.mkdir(exist_ok=True)
+        self._write(path, lambda f: f.write(gid.encode()))
+
+    def load_index(self, key: str) -> Optional[str]:
+        try:
+            return self._index_path(key).read_text()
+        except FileNotFoundError:
+            return None
+
+    def prune_index(self) -> int:
+        """Remove the keys of deleted jobs from the index.
+
+        Returns:
+            number of removed keys
+        """
+        jobs = self.usage()
+        removed = 0
+        for path in self._base_path.glob("index/*"):
+            if path.name.startswith("."):
+                # Being written
+                continue
+            try:
+                if path.read_text() not in jobs:
+                    path.unlink()
+                    removed += 1
+            except FileNotFoundError:
+                pass
+        return removed
+
+    def exists(self, gid: str) -> bool:
+        """Check if the job output is saved."""
+
+        return any(self._data_path(gid, True, suffix).exists() for suffix in [None, ".pickle"])
+
+    def _access_path(self, gid: str) -> Path:
+        return self._base_path / f"{gid}-access.stamp"
+
+    def touch(self, gid: str) -> bool:
+        """Record that the job result was read now, the job age is counted from then.
+
+        The time is kept in a file of the job, as the output may be hard-linked to other jobs.
+
+        Returns:
+            False if the job output is not saved
+        """
+        if not self.exists(gid):
+            return False
+        path = self._access_path(gid)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            path.touch()
+        return True
+
+    def delete(self, gid: str) -> bool:
+        """Delete the job input, output and state.
+
+        Returns:
+            False if nothing was saved for the job
+        """
+        paths = [
+            self._data_path(gid, output, suffix)
+            for output in [False, True]
+            for suffix in [None, ENCODED_SUFFIX, ".pickle"]
+        ]
+        deleted = False
+        for path in paths + [self._state_path(gid), self._access_path(gid)]:
+            try:
+                path.unlink()
+                deleted = True
+            except FileNotFoundError:
+                pass
+        return deleted
+
+    def usage(self) -> Dict[str, "JobUsage"]:
+        """Scan the storage directory and return the disk usage of every job.
+
+        A file hard-linked to several jobs, see copy_job(), adds to `nbytes` of only one of them.
+        """
+        jobs: Dict[str, JobUsage] = {}
+        counted: Set[Tuple[int, int]] = set()
+        with os.scandir(self._base_path) as entries:
+            for entry in entries:
+                match = _DATA_FILE_RE.match(entry.name)
+                if match is None or not entry.is_file():
+                    continue
+
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                usage = jobs.setdefault(match["gid"], JobUsage())
+                inode = (stat.st_dev, stat.st_ino)
+                usage.files[inode] = stat.st_size
+                if inode not in counted:
+                    counted.add(inode)
+                    usage.nbytes += stat.st_size
+                usage.mtime = max(usage.mtime, stat.st_mtime)
+                # Failed jobs have a state but no output
+                usage.finished = usage.finished or match["type"] in ("output", "state", "access")
+        return jobs
+
+    def migrate_legacy(self) -> int:
+        """Convert all jobs saved in the legacy .pickle format.
+
+        Returns:
+            number of converted files
+        """
+        converted = 0
+        for path in self._base_path.glob("*.pickle"):
+            gid, type_ = path.stem.rsplit("-", 1)
+            output = type_ == "output"
+            self.save(gid, self._load_legacy(gid, output), output)
+            path.unlink()
+            converted += 1
+        return converted
+
+
+def _link_or_copy(src_path: Path, dst_path: Path):
+    try:
+        os.link(src_path, dst_path)
+    except FileNotFoundError:
+        raise
+    except OSError:
+        # The file system does not support hard links
+        shutil.copyfile(src_path, dst_path)
+
+
+@dataclass
+class JobUsage:
+    """Disk usage of a job.
+
+    Attributes:
+        nbytes: total size of the job files, except files hard-linked to an already counted job
+        mtime: the latest modification time of the job files, i.e. when the job finished or
+            its result was last read
+        finished: True if the job is processed, successfully or not
+        files: size of every job file by (device, inode)
+    """
+
+    nbytes: int = 0
+    mtime: float = 0
+    finished: bool = False
+    files: Dict[Tuple[int, int], int] = field(default_factory=dict)
+
+
+@dataclass
+class JobState:
+    """State of a segmentation job.
+
+    Attributes:
+        state: "queued", "running", "done" or "failed"
+        created_at: time.time() when the job was posted
+        started_at: time.time() when a worker started the job
+        finished_at: time.time() when the job was processed
+        error: error message of a failed job
+        position: number of jobs ahead of a queued job
+    """
+
+    state: str
+    created_at: Optional[float] = None
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    error: Optional[str] = None
+    position: Optional[int] = None
+
+    @property
+    def duration(self) -> Optional[float]:
+        if self.started_at is None or self.finished_at is None:
+            return None
+        return self.finished_at - self.started_at
+
+    def asdict(self) -> Dict[str, Any]:
+        return {**asdict(self), "duration": self.duration}
 
 
 @dataclass
@@ -46,53 +381,281 @@ class BBox:
 class DetectionObject:
     """
     Attributes:
-        coords: list of (x, y) coordinates
         bbox: object bounding box
+        mask: boolean mask of the object cropped to the bounding box, mask[y, x] is
+            the pixel (bbox.x1 + x, bbox.y1 + y) of the image
+        coords: list of (x, y) coordinates in row-major order, created on first access
     """
 
+    __slots__ = ("bbox", "mask", "_coords")
+
     def __init__(self, coords: List[Tuple[int, int]]):
         """
         Args:
-            coords: list of (x, y) coordinates where object mask == 1
+            coords: list or (N, 2) array of (x, y) coordinates where object mask == 1
         """
-        if not coords:
+        if len(coords) == 0:
             raise ValueError("'coords' argument cannot be empty")
 
-        self.coords = coords
-        xs, ys = zip(*coords)
-        self.bbox = BBox(min(xs), min(ys), max(xs), max(ys))
+        mask, x1, y1 = _coords_mask(coords)
+        self._init(mask, x1, y1)
+
+    def _init(self, mask: np.ndarray, x1: int, y1: int):
+        self.mask = mask
+        self.bbox = BBox(x1, y1, x1 + mask.shape[1] - 1, y1 + mask.shape[0] - 1)
+        self._coords = None
+
+    @classmethod
+    def _from_cropped_mask(cls, mask: np.ndarray, x1: int, y1: int) -> "DetectionObject":
+        # `mask` must be a boolean mask whose first and last rows and columns are not empty
+        obj = cls.__new__(cls)
+        obj._init(mask, x1, y1)
+        return obj
+
+    @classmethod
+    def from_mask(cls, mask: np.ndarray, offset: Tuple[int, int] = (0, 0)) -> "DetectionObject":
+        """Create an object from a 2D mask, non-zero pixels belong to the object.
+
+        Args:
+            mask: 2D array, e.g. a mask of the full image or of a region of it
+            offset: (x, y) image coordinates of the top left mask pixel
+        """
+        rows, cols = np.any(mask, axis=1).nonzero()[0], np.any(mask, axis=0).nonzero()[0]
+        if len(rows) == 0:
+            raise ValueError("'mask' argument cannot be empty")
+
+        y1, y2, x1, x2 = rows[0], rows[-1], cols[0], cols[-1]
+        cropped = np.asarray(mask[y1:y2 + 1, x1:x2 + 1], dtype=bool).copy()
+        return cls._from_cropped_mask(cropped, int(x1) + offset[0], int(y1) + offset[1])
+
+    @classmethod
+    def from_label_image(cls, labels: np.ndarray) -> List["DetectionObject"]:
+        """Create objects from a 2D label image, pixels of object i have value i, background 0.
+
+        Returns:
+            list of objects sorted by label
+        """
+        ys, xs = labels.nonzero()
+        if len(ys) == 0:
+            return []
+
+        pixel_labels = labels[ys, xs]
+        order = np.argsort(pixel_labels, kind="stable")
+        pixel_labels, ys, xs = pixel_labels[order], ys[order], xs[order]
+        starts = np.flatnonzero(np.r_[True, pixel_labels[1:] != pixel_labels[:-1]])
+
+        x1s, x2s = np.minimum.reduceat(xs, starts), np.maximum.reduceat(xs, starts)
+        y1s, y2s = np.minimum.reduceat(ys, starts), np.maximum.reduceat(ys, starts)
+        objects = []
+        for label, x1, y1, x2, y2 in zip(pixel_labels[starts], x1s, y1s, x2s, y2s):
+            mask = labels[y1:y2 + 1, x1:x2 + 1] == label
+            objects.append(cls._from_cropped_mask(mask, int(x1), int(y1)))
+        return objects
+
+    @classmethod
+    def from_rle(cls, rle: str, image_size: Tuple[int, int]) -> "DetectionObject":
+        """Create an object from a mask encoded with rle_encode()."""
+
+        runs = np.array(rle.split(), dtype=np.int64).reshape(-1, 2)
+        if len(runs) == 0:
+            raise ValueError("'rle' argument cannot be empty")
+
+        starts, lengths = runs[:, 0], runs[:, 1]
+        # Indices of all pixels: every run start repeated for its length plus 0, 1, 2, ...
+        offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        indices = np.repeat(starts, lengths) + offsets
+
+        w, _ = image_size
+        ys, xs = np.divmod(indices, w)
+        return cls(np.stack([xs, ys], axis=1))
+
+    @property
+    def coords(self) -> List[Tuple[int, int]]:
+        if self._coords is None:
+            ys, xs = self.mask.nonzero()
+            self._coords = list(
+                zip((xs + self.bbox.x1).tolist(), (ys + self.bbox.y1).tolist())
+            )
+        return self._coords
+
+    @property
+    def area(self) -> int:
+        return int(np.count_nonzero(self.mask))
+
+    def __getstate__(self):
+        return self.bbox.x1, self.bbox.y1, self.mask
+
+    def __setstate__(self, state):
+        if isinstance(state, dict):
+            # Pickled by older versions: {"coords": ..., "bbox": ...}
+            mask, x1, y1 = _coords_mask(state["coords"])
+        else:
+            x1, y1, mask = state
+        self._init(mask, x1, y1)
 
     def __repr__(self):
-        return f"<DetectionObject: bbox={self.bbox} coord_n={len(self.coords)}>"
+        return f"<DetectionObject: bbox={self.bbox} coord_n={self.area}>"
 
     def __eq__(self, other: "DetectionObject"):
-        return other.coords == self.coords and other.bbox == self.bbox
+        return other.bbox == self.bbox and np.array_equal(other.mask, self.mask)
+
+
+def _coords_mask(coords: List[Tuple[int, int]]) -> Tuple[np.ndarray, int, int]:
+    """Rasterize (x, y) coordinates into a boolean mask cropped to their bounding box.
+
+    Returns:
+        mask, x and y of its top left corner
+    """
+    xs, ys = np.asarray(coords, dtype=np.int64).reshape(-1, 2).T
+    x1, y1 = int(xs.min()), int(ys.min())
+    mask = np.zeros((ys.max() - y1 + 1, xs.max() - x1 + 1), dtype=bool)
+    mask[ys - y1, xs - x1] = True
+    return mask, x1, y1
+
+
+def _linear_indices(mask: np.ndarray, x1: int, y1: int, image_width: int, dtype) -> np.ndarray:
+    """Return sorted indices of the mask pixels in the flattened full image."""
+
+    ys, xs = mask.nonzero()
+    # Row-major order inside the bounding box is also row-major order in the full image
+    return (ys.astype(dtype) + y1) * image_width + (xs.astype(dtype) + x1)
+
+
+def _rle_runs(indices: np.ndarray, groups: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Split sorted pixel indices into runs of consecutive pixels.
+
+    Args:
+        indices: concatenated sorted unique indices of several objects
+        groups: start positions of every object in `indices`, a run never spans two objects
+
+    Returns:
+        interleaved (start, length) pairs of all runs and the number of runs of every object
+    """
+    is_start = np.ones(len(indices), dtype=bool)
+    is_start[1:] = np.diff(indices) != 1
+    is_start[groups] = True
+
+    run_starts = is_start.nonzero()[0]
+    lengths = np.diff(np.append(run_starts, len(indices)))
+    runs = np.stack([indices[run_starts], lengths.astype(indices.dtype)], axis=1).ravel()
+    run_counts = np.diff(np.append(np.searchsorted(run_starts, groups), len(run_starts)))
+    return runs, run_counts
+
+
+def rle_encode_objects(
+    objects: List["DetectionObject"], image_size: Tuple[int, int]
+) -> List[str]:
+    """Run-length encode the masks of all objects of an image at once.
+
+    Every mask is encoded as "start length start length ..." where starts are indices of
+    the flattened full image, like rle_encode() does.
+    """
+    w, h = image_size
+    dtype = np.int32 if w * h < 2 ** 31 else np.int64
+
+    object_indices = [
+        _linear_indices(obj.mask, obj.bbox.x1, obj.bbox.y1, w, dtype) for obj in objects
+    ]
+    if not object_indices:
+        return []
+
+    sizes = np.array([len(indices) for indices in object_indices])
+    groups = np.cumsum(sizes) - sizes
+    runs, run_counts = _rle_runs(np.concatenate(object_indices), groups)
+
+    numbers = list(map(str, runs.tolist()))
+    results, start = [], 0
+    for count in run_counts.tolist():
+        results.append(" ".join(numbers[start:start + 2 * count]))
+        start += 2 * count
+    return results
 
 
 def rle_encode(coords: List[Tuple[int, int]], image_size: Tuple[int, int]) -> str:
+    """Run-length encode the mask given by (x, y) coordinates in an image of (w, h) size."""
+
     if not coords:
         return ""
 
     w, h = image_size
-    image = np.zeros((h, w))
-    xs, ys = zip(*coords)
-    image[ys, xs] = 1
-    image = image.flatten()
-    image = np.insert(image, [0, len(image)], [0, 0])
-
-    starts = ((image[:-1] == 0) & (image[1:] == 1)).nonzero()[0]
-    ends = ((image[:-1] == 1) & (image[1:] == 0)).nonzero()[0]
-    lengths = ends - starts
-
-    return " ".join(f"{st} {l}" for st, l in zip(starts, lengths))
+    dtype = np.int32 if w * h < 2 ** 31 else np.int64
+    mask, x1, y1 = _coords_mask(coords)
+    indices = _linear_indices(mask, x1, y1, w, dtype)
+    runs, _ = _rle_runs(indices, np.array([0]))
+    return " ".join(map(str, runs.tolist()))
 
 
-def segmentation_object_asdict(obj: DetectionObject, image_size: Tuple[int, int]) -> Dict:
+def segmentation_object_asdict(
+    obj: DetectionObject, image_size: Tuple[int, int], mask: Optional[str] = None
+) -> Dict:
+    """
+    Args:
+        mask: the object mask already encoded with rle_encode_objects()
+    """
     dic = {
         "x": obj.bbox.x1,
         "y": obj.bbox.y1,
         "w": obj.bbox.x2 - obj.bbox.x1 + 1,
         "h": obj.bbox.y2 - obj.bbox.y1 + 1,
-        "mask": rle_encode(obj.coords, image_size)
+        "mask": rle_encode(obj.coords, image_size) if mask is None else mask
     }
     return dic
+
+
+def scale_objects(
+    objects: List[DetectionObject], from_size: Tuple[int, int], to_size: Tuple[int, int]
+) -> List[DetectionObject]:
+    """Scale objects found in an image of `from_size` to an image of `to_size`.
+
+    Masks are resized with the nearest neighbour filter, objects which become empty
+    after downscaling are dropped.
+    """
+    if tuple(from_size) == tuple(to_size):
+        return objects
+
+    scale_x, scale_y = to_size[0] / from_size[0], to_size[1] / from_size[1]
+    scaled = []
+    for obj in objects:
+        x1, y1 = int(obj.bbox.x1 * scale_x), int(obj.bbox.y1 * scale_y)
+        x2 = max(int(np.ceil((obj.bbox.x2 + 1) * scale_x)), x1 + 1)
+        y2 = max(int(np.ceil((obj.bbox.y2 + 1) * scale_y)), y1 + 1)
+        mask = PIL.Image.fromarray(obj.mask).resize((x2 - x1, y2 - y1), PIL.Image.NEAREST)
+        mask = np.asarray(mask)
+        if mask.any():
+            scaled.append(DetectionObject.from_mask(mask, offset=(x1, y1)))
+    return scaled
+
+
+def _pack_objects(objects: List[DetectionObject]) -> Dict[str, np.ndarray]:
+    """Pack objects into flat arrays.
+
+    Returns:
+        dict with arrays:
+            bboxes - (N, 4) int32 array of (x1, y1, x2, y2) bounding boxes
+            masks - uint8 array of bit-packed object masks, cropped to their bounding boxes
+            mask_offsets - (N + 1) int64 array, masks[mask_offsets[i]:mask_offsets[i + 1]]
+                are the bytes of object i mask
+    """
+    bboxes = np.zeros((len(objects), 4), dtype=np.int32)
+    masks = []
+    for i, obj in enumerate(objects):
+        bbox = obj.bbox
+        bboxes[i] = bbox.x1, bbox.y1, bbox.x2, bbox.y2
+
+        masks.append(np.packbits(obj.mask))
+
+    mask_offsets = np.zeros(len(objects) + 1, dtype=np.int64)
+    mask_offsets[1:] = np.cumsum([len(mask) for mask in masks])
+    masks = np.concatenate(masks) if masks else np.zeros(0, dtype=np.uint8)
+    return {"bboxes": bboxes, "masks": masks, "mask_offsets": mask_offsets}
+
+
+def _unpack_objects(arrays: Mapping[str, np.ndarray]) -> List[DetectionObject]:
+    bboxes, masks, mask_offsets = arrays["bboxes"], arrays["masks"], arrays["mask_offsets"]
+
+    objects = []
+    for (x1, y1, x2, y2), start, end in zip(bboxes.tolist(), mask_offsets[:-1], mask_offsets[1:]):
+        h, w = y2 - y1 + 1, x2 - x1 + 1
+        mask = np.unpackbits(masks[start:end], count=h * w).reshape(h, w).view(bool)
+        objects.append(DetectionObject._from_cropped_mask(mask, x1, y1))
+    return objects
@@ -2,26 +2,50 @@ import base64
 import io
 import os
 import socket
-import threading
 import time
-from importlib import import_module
-from typing import Deque, List, Dict, Tuple
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Iterator,
+    List,
+    Dict,
+    Optional,
+    Tuple,
+    Union,
+)
 from uuid import uuid4
 import json
-from collections import deque
 
-import PIL
-from PIL.Image import Image
+import PIL.Image
 import falcon
 
+from telesto.cache import LRUCache, model_identity
 from telesto.logger import logger
 from telesto.config import config
+from telesto.metrics import DEDUP_HITS, REGISTRY, stage
+from telesto.preload import preload_enabled, start_in_workers
+from telesto.serialization import PreEncoded, dumps
+from telesto.uploads import read_image_uploads
 from telesto.instance_segmentation import (
+    DONE,
+    FAILED,
     DetectionObject,
     DataStorage,
+    JobState,
+    rle_encode_objects,
     segmentation_object_asdict,
 )
-from telesto.instance_segmentation.model import DummySegmentationModel, SegmentationModelBase
+from telesto.instance_segmentation.dedup import JobDeduplicator
+from telesto.instance_segmentation.executor import (
+    SegmentationExecutor,
+    WorkerReadiness,
+    load_model,
+    model_class,
+)
+from telesto.instance_segmentation.jobs import JobEvents, JobQueue, QueueFull, SpoolJobQueue
+from telesto.instance_segmentation.sweeper import StorageSweeper
 
 
 INPUT_IMAGE_FORMAT = {
@@ -31,112 +55,292 @@ INPUT_IMAGE_FORMAT = {
     "max_size": "5120",
 }
 
+# Sent by the event stream when the job is deleted
+DELETED = "deleted"
+
+# Runs a blocking call in the thread pool of the ASGI app, see telesto.asgi
+Offload = Callable[..., Awaitable[Any]]
+
+# Long polls and event streams end before this share of the gunicorn worker timeout
+WAIT_TIMEOUT_SHARE = 0.5
+
 OUTPUT_OBJECT_MASK_FORMAT = {
     "type": "json",
     "palette": "GREY8",
     "encoding": "RLE",
 }
 
-API_DOCS = {
-    "name": config.get("common", "name"),
-    "description": config.get("common", "desc"),
-    "authentication": {
-        "header": "Authorization",
-        "schema": "Bearer <API_KEY>"
-    },
-    "endpoints": [
-        {
-            "path": "/",
-            "method": "GET",
-            "name": "Status endpoint",
-            "description": "Returns status of the API",
-        },
-        {
-            "path": "/docs",
-            "method": "GET",
-            "name": "Documentation endpoint",
-            "description": "Returns this information",
+
+def api_docs() -> dict:
+    """Return the API documentation served by GET /docs."""
+
+    return {
+        "name": config.get("common", "name"),
+        "description": config.get("common", "desc"),
+        "authentication": {
+            "header": "Authorization",
+            "schema": "Bearer <API_KEY>"
         },
-        {
-            "path": "/jobs/",
-            "method": "POST",
-            "request_body": {
-                "image": "<str>",
+        "endpoints": [
+            {
+                "path": "/",
+                "method": "GET",
+                "name": "Status endpoint",
+                "description": "Returns status of the API",
             },
-            "image_format": {
-                **INPUT_IMAGE_FORMAT,
+            {
+                "path": "/docs",
+                "method": "GET",
+                "name": "Documentation endpoint",
+                "description": "Returns this information",
             },
-            "response_body": {
-                "job_id": "<UUID>"
-            }
-        },
-        {
-            "path": "/jobs/<job_id>",
-            "method": "GET",
-            "response_body": {
-                "objects": [
-                    {
-                        "class_i": "<int>",
-                        "x": "<int>",
-                        "y": "<int>",
-                        "w": "<int>",
-                        "h": "<int>",
-                        "mask": "<str>"
-                    }
+            {
+                "path": "/jobs/",
+                "method": "GET",
+                "name": "Job queue endpoint",
+                "description": "Returns the number of jobs waiting to be processed",
+                "response_body": {
+                    "queued": "<int>"
+                }
+            },
+            {
+                "path": "/jobs/",
+                "method": "POST",
+                "request_body": {
+                    "image": "<str>",
+                },
+                "alternative_request_bodies": [
+                    "Raw image with 'Content-Type: image/png'",
+                    "multipart/form-data with the image file in the 'image' field",
                 ],
+                "image_format": {
+                    **INPUT_IMAGE_FORMAT,
+                },
+                "response_body": {
+                    "job_id": "<UUID>"
+                }
             },
-            "object_mask_format": {
-                **OUTPUT_OBJECT_MASK_FORMAT,
+            {
+                "path": "/jobs/<job_id>",
+                "method": "GET",
+                "description": (
+                    "Returns the found objects of a finished job. A job which is not finished yet "
+                    "returns 202 and a failed job 422, both with the job state in the body"
+                ),
+                "query": {
+                    "wait": "<float>, seconds to wait for the job to finish",
+                },
+                "job_state_body": {
+                    "job_id": "<UUID>",
+                    "state": "queued | running | failed",
+                    "created_at": "<float>, Unix time",
+                    "started_at": "<float>",
+                    "finished_at": "<float>",
+                    "duration": "<float>, seconds",
+                    "error": "<str>, error message of a failed job",
+                    "position": "<int>, number of jobs ahead of a queued job",
+                },
+                "response_body": {
+                    "objects": [
+                        {
+                            "class_i": "<int>",
+                            "x": "<int>",
+                            "y": "<int>",
+                            "w": "<int>",
+                            "h": "<int>",
+                            "mask": "<str>"
+                        }
+                    ],
+                },
+                "object_mask_format": {
+                    **OUTPUT_OBJECT_MASK_FORMAT,
+                },
+                "classes": config.get("common", "classes").split(","),
             },
-            "classes": config.get("common", "classes").split(","),
-        }
-    ]
-}
+            {
+                "path": "/jobs/<job_id>/events",
+                "method": "GET",
+                "name": "Job events endpoint",
+                "description": (
+                    "Server-sent events with the job state: queued, running, done, failed or "
+                    "deleted. The stream ends when the job is finished or after 'wait' seconds, "
+                    "reconnect to follow a longer job"
+                ),
+                "query": {
+                    "wait": "<float>, maximum duration of the stream in seconds",
+                },
+            },
+            {
+                "path": "/jobs/<job_id>",
+                "method": "DELETE",
+                "name": "Job deletion endpoint",
+                "description": "Deletes the job input and result, a running job cannot be deleted",
+            }
+        ]
+    }
+
 
+def validate_image(image_bytes: Union[bytes, memoryview]) -> Union[bytes, memoryview]:
+    """Validate an encoded image reading only the image header.
 
-def preprocess(doc: Dict) -> Image:
+    Returns:
+        encoded image bytes, the image data is decoded only by the worker
+    """
     try:
-        image_bytes = base64.b64decode(doc["image"])
         image = PIL.Image.open(io.BytesIO(image_bytes))
         assert image.mode == "RGB", f"Wrong image mode: {image.mode}. Expected: 'RGB'"
+
+        max_size = int(INPUT_IMAGE_FORMAT["max_size"])
+        assert max(image.size) <= max_size, f"Wrong image size: {image.size}. Max: {max_size}"
+    except Exception as e:
+        raise ValueError(e)
+    return image_bytes
+
+
+def preprocess(doc: Dict) -> bytes:
+    try:
+        image_bytes = base64.b64decode(doc["image"])
     except Exception as e:
         raise ValueError(e)
-    return image
+    return validate_image(image_bytes)
 
 
 def postprocess(objects: List[DetectionObject], size: Tuple[int, int]) -> Dict:
-    return {"objects": [segmentation_object_asdict(obj, size) for obj in objects]}
+    masks = rle_encode_objects(objects, size)
+    return {
+        "objects": [
+            segmentation_object_asdict(obj, size, mask=mask) for obj, mask in zip(objects, masks)
+        ]
+    }
+
+
+def render_result(objects: List[DetectionObject], size: Tuple[int, int]) -> bytes:
+    return dumps(postprocess(objects, size))
+
+
+def job_status(storage: DataStorage, job_queue: JobQueue, job_id: str) -> Optional[JobState]:
+    """Return the state of a job, None if it is not found."""
+
+    # Checked in the order of the state changes, so that a job moving on is not missed
+    state = job_queue.find(job_id)
+    if state is None:
+        state = storage.load_state(job_id)
+    if state is None and storage.exists(job_id):
+        # Processed before job states were saved
+        state = JobState(DONE)
+    return state
+
+
+def is_finished(state: Optional[JobState]) -> bool:
+    """Check if a job is done, failed or not found."""
+
+    return state is None or state.state in (DONE, FAILED)
+
+
+def wait_param(req: falcon.Request, max_wait: float) -> float:
+    wait = req.get_param_as_float("wait", min_value=0)
+    return 0 if wait is None else min(wait, max_wait)
+
+
+def max_wait_seconds() -> float:
+    """Return the `max_wait` from the config, capped at half of the gunicorn worker timeout.
+
+    Gunicorn kills a sync worker which doesn't finish a request within the timeout, together
+    with the executor it may run. start-api.sh passes the timeout as WORKER_TIMEOUT.
+    """
+    max_wait = config.getfloat("segmentation", "max_wait", fallback=25)
+    timeout = float(os.environ.get("WORKER_TIMEOUT", 0))
+    if timeout > 0 and max_wait > timeout * WAIT_TIMEOUT_SHARE:
+        max_wait = timeout * WAIT_TIMEOUT_SHARE
+        logger.warning(f"max_wait is reduced to {max_wait:g} s, below the worker timeout")
+    return max_wait
+
+
+def _single_threaded_workers() -> bool:
+    # Set by start-api.sh, ASGI workers wait on the event loop
+    return os.environ.get("THREADS") == "1" and os.environ.get("ASGI", "0") != "1"
+
+
+STATUS_BODY = PreEncoded(
+    lambda: {"status": "ok", "host": socket.getfqdn(), "worker.pid": os.getpid()}
+)
+DOCS_BODY = PreEncoded(api_docs)
 
 
 class SegmentationBase:
+    async_inline = ("on_get",)
+
     def on_get(self, req, resp):
-        doc = {"status": "ok", "host": socket.getfqdn(), "worker.pid": os.getpid()}
-        resp.body = json.dumps(doc, ensure_ascii=False)
+        resp.data = STATUS_BODY()
 
 
 class SegmentationDocs:
+    async_inline = ("on_get",)
+
     def on_get(self, req, resp):
-        resp.body = json.dumps(API_DOCS, ensure_ascii=False)
+        resp.data = DOCS_BODY()
 
 
 class SegmentationJobs:
 
-    def __init__(self, storage: DataStorage, job_queue: Deque):
+    def __init__(
+        self,
+        storage: DataStorage,
+        job_queue: JobQueue,
+        result_cache: LRUCache,
+        dedup: Optional[JobDeduplicator] = None,
+    ):
         self._storage = storage
         self._job_queue = job_queue
+        self._result_cache = result_cache
+        self._dedup = dedup
+
+    def _queue_full_error(self) -> falcon.HTTPError:
+        return falcon.HTTPServiceUnavailable(
+            description=f"Job queue is full: {len(self._job_queue)} jobs", retry_after=1
+        )
+
+    def on_get(self, req: falcon.Request, resp: falcon.Response):
+        doc = {"queued": len(self._job_queue), "result_cache": self._result_cache.stats()}
+        resp.data = dumps(doc)
 
     def on_post(self, req: falcon.Request, resp: falcon.Response):
-        try:
-            req_doc = json.load(req.bounded_stream)
-            assert "image" in req_doc, f"'image' not found in {req_doc}"
+        if self._job_queue.full():
+            raise self._queue_full_error()
 
-            job_id = uuid4().hex
-            image = preprocess(req_doc)
-            self._storage.save(job_id, image, output=False)
-            self._job_queue.appendleft(job_id)
+        try:
+            with stage("upload"):
+                image_files = read_image_uploads(req.content_type, req.bounded_stream, "image")
+                if image_files is None:
+                    req_doc = json.load(req.bounded_stream)
+                    assert "image" in req_doc, f"'image' not found in {req_doc}"
+                    image_bytes = preprocess(req_doc)
+                else:
+                    assert len(image_files) == 1, f"Wrong number of images: {len(image_files)}"
+                    image_bytes = validate_image(image_files[0].getbuffer())
+
+                job_id = uuid4().hex
+                if self._dedup is not None:
+                    key = self._dedup.key(image_bytes)
+                    if self._dedup.reuse(key, job_id):
+                        # The job is done already
+                        DEDUP_HITS.inc("segmentation")
+                        resp.status = falcon.HTTP_CREATED
+                        resp.data = dumps({"job_id": job_id})
+                        return
+                self._storage.save_encoded(job_id, image_bytes)
+            try:
+                self._job_queue.put(job_id)
+            except QueueFull:
+                self._storage.delete(job_id)
+                raise self._queue_full_error()
+            if self._dedup is not None:
+                self._dedup.add(key, job_id)
 
             resp.status = falcon.HTTP_CREATED
-            resp.body = json.dumps({"job_id": job_id})
+            resp.data = dumps({"job_id": job_id})
+        except falcon.HTTPError:
+            raise
         except (ValueError, AssertionError) as e:
             raise falcon.HTTPError(falcon.HTTP_400, description=str(e))
         except Exception as e:
@@ -146,17 +350,71 @@ class SegmentationJobs:
 
 class SegmentationJob:
 
-    def __init__(self, storage: DataStorage):
+    def __init__(
+        self,
+        storage: DataStorage,
+        job_queue: JobQueue,
+        result_cache: LRUCache,
+        touch_on_read: bool = False,
+        events: Optional[JobEvents] = None,
+        max_wait: float = 25,
+    ):
         self._storage = storage
+        self._job_queue = job_queue
+        self._result_cache = result_cache
+        self._touch_on_read = touch_on_read
+        self._events = events or JobEvents()
+        self._max_wait = max_wait
 
     def on_get(self, req: falcon.Request, resp: falcon.Response, job_id: str):
+        wait = wait_param(req, self._max_wait)
+        if wait > 0:
+            # Returns early if the job finishes, is deleted or was never posted
+            self._events.wait_for(self._finished(job_id), wait)
+        self._get(resp, job_id)
+
+    async def on_get_async(
+        self, req: falcon.Request, resp: falcon.Response, offload: Offload, job_id: str
+    ):
+        # Served by the ASGI app, a long poll waits on the event loop, not in a pool thread
+        wait = wait_param(req, self._max_wait)
+        if wait > 0:
+            await self._events.wait_for_async(self._finished(job_id), wait)
+        await offload(self._get, resp, job_id)
+
+    def _finished(self, job_id: str) -> Callable[[], bool]:
+        return lambda: is_finished(job_status(self._storage, self._job_queue, job_id))
+
+    def _get(self, resp: falcon.Response, job_id: str):
         try:
-            image = self._storage.load(job_id, output=False)
-            objects = self._storage.load(job_id, output=True)
-            assert objects is not None, "No data found"
-
-            resp_doc = postprocess(objects, image.size)
-            resp.body = json.dumps(resp_doc)
+            body = self._result_cache.get(job_id)
+            # The job could be deleted by another API worker or the storage sweeper
+            if self._touch_on_read:
+                found = self._storage.touch(job_id)
+            else:
+                found = body is None or self._storage.exists(job_id)
+            if not found:
+                self._result_cache.pop(job_id)
+                body = None
+
+            if body is None:
+                objects = self._storage.load(job_id, output=True)
+                if objects is None:
+                    state = job_status(self._storage, self._job_queue, job_id)
+                    if state is not None and state.state == DONE:
+                        # The job finished after its output was looked up
+                        objects = self._storage.load(job_id, output=True)
+                    if objects is None:
+                        self._set_state(job_id, state, resp)
+                        return
+
+                size = self._storage.input_size(job_id)
+                # Deleted after its output was loaded
+                assert size is not None, "No data found"
+                with stage("serialize"):
+                    body = render_result(objects, size)
+                self._result_cache.put(job_id, body)
+            resp.data = body
         except AssertionError as e:
             raise falcon.HTTPError(falcon.HTTP_404, description=str(e))
         except ValueError as e:
@@ -165,51 +423,217 @@ class SegmentationJob:
             logger.error(e, exc_info=True)
             raise falcon.HTTPError(falcon.HTTP_500)
 
+    def _set_state(self, job_id: str, state: Optional[JobState], resp: falcon.Response):
+        # A done job without output was deleted meanwhile
+        assert state is not None and state.state != DONE, "No data found"
 
-def load_model(storage: DataStorage) -> SegmentationModelBase:
-    try:
-        module = import_module("model")
-        model_class = getattr(module, "SegmentationModel")
-        return model_class(storage)
-    except ModuleNotFoundError as e:
-        if int(os.environ.get("USE_FALLBACK_MODEL", 0)):
-            logger.warning(
-                "No 'model' module found. Using fallback model 'DummySegmentationModel'"
-            )
-            return DummySegmentationModel(storage)
+        if state.state == FAILED:
+            resp.status = falcon.HTTP_UNPROCESSABLE_ENTITY
         else:
-            raise e
-
+            resp.status = falcon.HTTP_ACCEPTED
+        resp.data = dumps({"job_id": job_id, **state.asdict()})
+
+    def on_delete(self, req: falcon.Request, resp: falcon.Response, job_id: str):
+        # Once the job is out of the queue no worker can claim it while it is deleted
+        removed = self._job_queue.remove(job_id)
+        if not removed and self._job_queue.is_running(job_id):
+            raise falcon.HTTPConflict(description="The job is being processed")
+
+        self._result_cache.pop(job_id)
+        deleted = self._storage.delete(job_id)
+        self._events.notify()
+        if not (deleted or removed):
+            raise falcon.HTTPNotFound(description="No data found")
+
+        resp.status = falcon.HTTP_NO_CONTENT
+
+
+class SegmentationJobEvents:
+    """Streams the state changes of a job as server-sent events.
+
+    A stream ends after `?wait=` seconds (at most `max_wait`) or, without the parameter, after
+    `default_wait`. A client following a longer job reconnects.
+    """
+
+    def __init__(
+        self,
+        storage: DataStorage,
+        job_queue: JobQueue,
+        events: JobEvents,
+        max_wait: float = 25,
+        default_wait: float = 10,
+    ):
+        self._storage = storage
+        self._job_queue = job_queue
+        self._events = events
+        self._max_wait = max_wait
+        self._default_wait = min(default_wait, max_wait)
 
-def start_worker(storage: DataStorage, job_queue: Deque):
+    def on_get(self, req: falcon.Request, resp: falcon.Response, job_id: str):
+        state = job_status(self._storage, self._job_queue, job_id)
+        if state is None:
+            raise falcon.HTTPNotFound(description="No data found")
+
+        resp.content_type = "text/event-stream"
+        resp.set_header("Cache-Control", "no-cache")
+        resp.stream = self._stream(job_id, state, self._wait(req))
+
+    async def on_get_async(
+        self, req: falcon.Request, resp: falcon.Response, offload: Offload, job_id: str
+    ):
+        # Served by the ASGI app, the stream waits on the event loop, not in a pool thread
+        state = await offload(job_status, self._storage, self._job_queue, job_id)
+        if state is None:
+            raise falcon.HTTPNotFound(description="No data found")
+
+        resp.content_type = "text/event-stream"
+        resp.set_header("Cache-Control", "no-cache")
+        resp.stream = self._stream_async(job_id, state, self._wait(req))
+
+    def _wait(self, req: falcon.Request) -> float:
+        return wait_param(req, self._max_wait) or self._default_wait
+
+    def _changed_state(self, job_id: str, state: JobState) -> Optional[JobState]:
+        new_state = job_status(self._storage, self._job_queue, job_id) or JobState(DELETED)
+        return None if new_state.state == state.state else new_state
+
+    @staticmethod
+    def _event(job_id: str, state: JobState) -> bytes:
+        data = dumps({"job_id": job_id, **state.asdict()})
+        return b"event: %s\ndata: %s\n\n" % (state.state.encode(), data)
+
+    def _stream(self, job_id: str, state: JobState, wait: float) -> Iterator[bytes]:
+        deadline = time.monotonic() + wait
+        while True:
+            yield self._event(job_id, state)
+            if state.state in (DONE, FAILED, DELETED):
+                return
 
-    def thread_function():
-        logger.info("Starting worker thread")
-        model_wrapper = load_model(storage)
-        logger.info("Worker thread started")
+            state = self._events.wait_for(
+                lambda: self._changed_state(job_id, state), deadline - time.monotonic()
+            )
+            if state is None:
+                return
 
+    async def _stream_async(
+        self, job_id: str, state: JobState, wait: float
+    ) -> AsyncIterator[bytes]:
+        deadline = time.monotonic() + wait
         while True:
-            if job_queue:
-                job_id = job_queue.pop()
-                logger.info(f"Processing task {job_id}")
-                model_wrapper(job_id)
-                logger.info(f"Finished task {job_id}")
-            else:
-                time.sleep(1)
+            yield self._event(job_id, state)
+            if state.state in (DONE, FAILED, DELETED):
+                return
 
-    thread = threading.Thread(target=thread_function, args=(), daemon=True)
-    thread.start()
+            state = await self._events.wait_for_async(
+                lambda: self._changed_state(job_id, state), deadline - time.monotonic()
+            )
+            if state is None:
+                return
 
 
-def add_routes(api: falcon.API):
+def add_routes(api: falcon.API) -> WorkerReadiness:
+    # The queue and the storage are shared by all API workers on the host
     storage = DataStorage()
-    job_queue = deque()
-    start_worker(storage, job_queue)
+    job_queue = SpoolJobQueue(
+        storage.path / "queue", maxsize=config.getint("segmentation", "queue_size", fallback=0)
+    )
+    # Serialized results of finished jobs, so that repeated polls skip the disk
+    result_cache = LRUCache(
+        max_entries=config.getint("segmentation", "result_cache_entries", fallback=1024),
+        max_bytes=config.getint("segmentation", "result_cache_mb", fallback=64) * 2 ** 20,
+    )
+
+    # Wakes up long polls and event streams of all API workers when jobs start or finish
+    events = JobEvents(
+        storage.path / "events", config.getfloat("segmentation", "events_poll", fallback=0.1)
+    )
+    start_in_workers(events.listen)
+    max_wait = max_wait_seconds()
+    if max_wait > 0 and _single_threaded_workers():
+        logger.warning(
+            f"Long polls and event streams block a worker with THREADS=1 for up to {max_wait:g} s,"
+            " use THREADS > 1 or ASGI=1, or set max_wait = 0"
+        )
+
+    def cache_result(job_id: str, objects: List[DetectionObject]):
+        size = storage.input_size(job_id)
+        # Not cached if the job was deleted meanwhile
+        if size is not None:
+            result_cache.put(job_id, render_result(objects, size))
+        events.notify()
+
+    mode = config.get("segmentation", "executor", fallback="thread")
+    # A preloaded app loads the model in the gunicorn master, so the API workers share it and a
+    # standby executor takes over without loading it. Worker processes load their own models
+    preloaded_model = load_model(storage) if preload_enabled() and mode == "thread" else None
+    executor = SegmentationExecutor(
+        storage,
+        job_queue,
+        workers=config.getint("segmentation", "executor_workers", fallback=1),
+        mode=mode,
+        on_done=cache_result,
+        on_start=lambda job_ids: events.notify(),
+        on_failed=lambda job_id, error: events.notify(),
+        model=preloaded_model,
+        events=events,
+    )
+    start_in_workers(executor.start)
+
+    ttl_from = config.get("storage", "ttl_from", fallback="completion")
+    if ttl_from not in ("completion", "access"):
+        raise ValueError(f"Wrong ttl_from: {ttl_from}. Expected 'completion' or 'access'")
+    dedup = None
+    if config.getboolean("segmentation", "dedup", fallback=False):
+        dedup = JobDeduplicator(
+            storage,
+            model_identity(model_class()),
+            max_entries=config.getint("segmentation", "dedup_cache_entries", fallback=10000),
+            persist=config.getboolean("segmentation", "dedup_persist", fallback=False),
+        )
+
+    sweeper = StorageSweeper(
+        storage,
+        ttl=config.getfloat("storage", "ttl", fallback=0),
+        max_bytes=config.getint("storage", "max_mb", fallback=0) * 2 ** 20,
+        interval=config.getfloat("storage", "sweep_interval", fallback=60),
+        on_delete=result_cache.pop,
+    )
+    start_in_workers(sweeper.start)
+
+    REGISTRY.add_gauge(
+        "telesto_queue_depth", "Number of queued segmentation jobs", lambda: len(job_queue)
+    )
+    REGISTRY.add_gauge(
+        "telesto_storage_bytes",
+        "Size of the job storage",
+        lambda: sum(usage.nbytes for usage in storage.usage().values()),
+    )
 
     api.add_route("/", SegmentationBase())
     api.add_route("/docs", SegmentationDocs())
     # Note: Falcon internally strips trailing slashes when compiling routes.
     # When "api.req_options.strip_url_path_trailing_slash = True"
     # they are also striped them from requests
-    api.add_route("/jobs", SegmentationJobs(storage, job_queue))
-    api.add_route("/jobs/{job_id}", SegmentationJob(storage))
+    api.add_route("/jobs", SegmentationJobs(storage, job_queue, result_cache, dedup))
+    api.add_route(
+        "/jobs/{job_id}",
+        SegmentationJob(
+            storage,
+            job_queue,
+            result_cache,
+            touch_on_read=ttl_from == "access",
+            events=events,
+            max_wait=max_wait,
+        ),
+    )
+    api.add_route(
+        "/jobs/{job_id}/events",
+        SegmentationJobEvents(
+            storage,
+            job_queue,
+            events,
+            max_wait=max_wait,
+            default_wait=config.getfloat("segmentation", "events_wait", fallback=10),
+        ),
+    )
+    return WorkerReadiness(storage)
@@ -0,0 +1,58 @@
+import time
+from typing import Union
+
+from telesto.cache import LRUCache, content_key
+from telesto.instance_segmentation import DONE, DataStorage, JobState
+
+
+class JobDeduplicator:
+    """Reuses the results of finished jobs for new jobs with the same input image file.
+
+    Posted jobs are indexed by a hash of the uploaded file and the model identity, in memory
+    and, with `persist`, in the storage, where the index is shared by all API workers on
+    the host and survives restarts.
+
+    Attributes:
+        model_id: identity of the model, see telesto.cache.model_identity()
+        persist: whether the index is also kept in the storage
+    """
+
+    def __init__(
+        self, storage: DataStorage, model_id: str, max_entries: int = 10000, persist: bool = False
+    ):
+        self.model_id = model_id
+        self.persist = persist
+        self._storage = storage
+        self._index = LRUCache(max_entries=max_entries)
+
+    def key(self, image_bytes: Union[bytes, memoryview]) -> str:
+        return content_key(image_bytes, self.model_id)
+
+    def reuse(self, key: str, job_id: str) -> bool:
+        """Copy the result of a finished job with the same key to the new job `job_id`.
+
+        Returns:
+            False if no finished job with the key is found
+        """
+        source_id = self._index.get(key)
+        if source_id is None and self.persist:
+            source_id = self._storage.load_index(key)
+        if source_id is None:
+            return False
+
+        state = self._storage.load_state(source_id)
+        if state is None or state.state != DONE:
+            return False
+        if not self._storage.copy_job(source_id, job_id):
+            return False
+
+        now = time.time()
+        self._storage.save_state(job_id, JobState(DONE, now, now, now))
+        return True
+
+    def add(self, key: str, job_id: str):
+        """Index a posted job, its result is reused once it is done."""
+
+        self._index.put(key, job_id)
+        if self.persist:
+            self._storage.save_index(key, job_id)
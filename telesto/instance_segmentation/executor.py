@@ -0,0 +1,477 @@
+import ctypes
+import multiprocessing
+import multiprocessing.connection
+import os
+import shutil
+import signal
+import sys
+import threading
+import time
+from importlib import import_module
+from pathlib import Path
+from typing import Callable, List, Optional, Union
+
+from telesto.health import warmup_model
+from telesto.logger import logger
+from telesto.metrics import JOB_FAILURES, JOB_SECONDS, JOB_WAIT_SECONDS, setup_metrics
+from telesto.profiling import Profiler, end_trace, profiler_from_config, start_trace
+from telesto.instance_segmentation import DONE, FAILED, DataStorage, DetectionObject, JobState
+from telesto.instance_segmentation.jobs import JobEvents, JobQueue, SpoolJobQueue
+from telesto.instance_segmentation.model import (
+    DummySegmentationModel,
+    JobInputNotFound,
+    SegmentationModelBase,
+)
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows
+    fcntl = None
+
+
+EXECUTOR_MODES = ("thread", "process")
+
+# prctl() option from <linux/prctl.h>
+PR_SET_PDEATHSIG = 1
+
+JobCallback = Callable[[str, List[DetectionObject]], None]
+BatchCallback = Callable[[List[str]], None]
+FailureCallback = Callable[[str, str], None]
+
+
+def model_class() -> Callable[[DataStorage], SegmentationModelBase]:
+    """Return the SegmentationModel class of the model module without loading the model."""
+
+    try:
+        module = import_module("model")
+        return getattr(module, "SegmentationModel")
+    except ModuleNotFoundError as e:
+        if int(os.environ.get("USE_FALLBACK_MODEL", 0)):
+            logger.warning(
+                "No 'model' module found. Using fallback model 'DummySegmentationModel'"
+            )
+            return DummySegmentationModel
+        else:
+            raise e
+
+
+def load_model(storage: DataStorage) -> SegmentationModelBase:
+    return model_class()(storage)
+
+
+class WorkerReadiness:
+    """Readiness of the segmentation workers of the host, for GET /ready of every API worker.
+
+    A worker marks itself ready in the storage after its model is loaded and warmed up, or
+    failed if the warmup raised an error. The marks are cleared when an executor starts.
+    """
+
+    def __init__(self, storage: DataStorage):
+        self._path = storage.path / "ready-workers"
+
+    def _worker_path(self) -> Path:
+        return self._path / f"{os.getpid()}-{threading.get_ident()}"
+
+    def mark(self, error: str = ""):
+        """Mark the worker running in the current thread as ready, or as failed with `error`."""
+
+        self._path.mkdir(parents=True, exist_ok=True)
+        self._worker_path().write_text(error)
+
+    def _errors(self) -> List[str]:
+        """Return the error of every marked worker, empty for ready ones."""
+
+        errors = []
+        try:
+            paths = list(self._path.iterdir())
+        except FileNotFoundError:
+            return errors
+        for path in paths:
+            try:
+                errors.append(path.read_text())
+            except FileNotFoundError:
+                pass
+        return errors
+
+    def unmark(self):
+        try:
+            self._worker_path().unlink()
+        except FileNotFoundError:
+            pass
+
+    def unmark_process(self, pid: int):
+        """Remove the marks of the workers of a process which exited without unmarking."""
+
+        try:
+            paths = list(self._path.iterdir())
+        except FileNotFoundError:
+            return
+        for path in paths:
+            if path.name.startswith(f"{pid}-"):
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+
+    def clear(self):
+        shutil.rmtree(self._path, ignore_errors=True)
+
+    @property
+    def ready(self) -> bool:
+        return any(not error for error in self._errors())
+
+    @property
+    def reason(self) -> str:
+        errors = self._errors()
+        if any(not error for error in errors):
+            return ""
+        if errors:
+            return errors[0]
+        return "no segmentation worker has loaded the model yet"
+
+
+def run_exclusively(lock_path: Path, target: Callable[[], None]):
+    """Wait until no other process on the host holds the lock file, then run `target()`.
+
+    The lock is held while `target()` runs and released if the process exits. Without fcntl,
+    e.g. on Windows, `target()` is run at once, so the API must run in a single process there,
+    like the dev server.
+    """
+    with lock_path.open("a") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        target()
+
+
+def process_jobs(
+    model_wrapper: SegmentationModelBase, job_ids: List[str]
+) -> List[Union[List[DetectionObject], Exception]]:
+    """Process a batch of jobs, if it fails process the jobs one by one to find the failing ones.
+
+    Returns:
+        found objects or the raised exception for every job
+    """
+    try:
+        return model_wrapper.process_batch(job_ids)
+    except Exception as e:
+        if len(job_ids) == 1:
+            return [e]
+        logger.warning(f"Batch of {len(job_ids)} jobs failed, processing them one by one: {e}")
+
+    results: List[Union[List[DetectionObject], Exception]] = []
+    for job_id in job_ids:
+        try:
+            results += model_wrapper.process_batch([job_id])
+        except Exception as e:
+            results.append(e)
+    return results
+
+
+def _call(callback: Optional[Callable], *args):
+    if callback is not None:
+        try:
+            callback(*args)
+        except Exception as e:
+            logger.error(e, exc_info=True)
+
+
+def run_worker(
+    storage: DataStorage,
+    job_queue: JobQueue,
+    stopped: Callable[[], bool] = lambda: False,
+    on_done: Optional[JobCallback] = None,
+    profiler: Optional[Profiler] = None,
+    on_start: Optional[BatchCallback] = None,
+    on_failed: Optional[FailureCallback] = None,
+    model_wrapper: Optional[SegmentationModelBase] = None,
+):
+    """Load the model once and process jobs from the queue until `stopped()` returns True.
+
+    Up to `batch_size` of the model queued jobs are processed at once. `on_start(job_ids)` is
+    called before a batch is processed, `on_done(job_id, objects)` after the result of a job is
+    saved and `on_failed(job_id, error)` if the model raised an error for a job. The final state
+    of every job is saved to the storage. Job batches are sampled by `profiler` like requests.
+    A model loaded in advance can be passed as `model_wrapper`. The model is warmed up before
+    the worker marks itself ready, or failed if the warmup raises, see WorkerReadiness.
+    Results of a batch which finishes after `stopped()` returned True are not saved and its
+    jobs stay claimed, to be requeued.
+    """
+    logger.info("Starting worker")
+    if model_wrapper is None:
+        model_wrapper = load_model(storage)
+    readiness = WorkerReadiness(storage)
+    try:
+        warmup_model(model_wrapper)
+    except Exception as e:
+        # Jobs are still processed, but the worker is not reported ready
+        logger.error(f"Model {e}", exc_info=True)
+        readiness.mark(error=f"segmentation model {e}")
+    else:
+        readiness.mark()
+    logger.info(f"Worker started, batch size: {model_wrapper.batch_size}")
+
+    try:
+        while not stopped():
+            job_ids = job_queue.get_batch(model_wrapper.batch_size, timeout=1)
+            if not job_ids:
+                continue
+
+            logger.info(f"Processing tasks {', '.join(job_ids)}")
+            started = time.time()
+            enqueued_at = {job_id: job_queue.enqueued_at(job_id) for job_id in job_ids}
+            for created_at in enqueued_at.values():
+                if created_at is not None:
+                    JOB_WAIT_SECONDS.observe(started - created_at)
+            _call(on_start, job_ids)
+
+            trace, token = start_trace()
+            profile = None if profiler is None else profiler.start()
+            try:
+                with JOB_SECONDS.time():
+                    results = process_jobs(model_wrapper, job_ids)
+            finally:
+                elapsed = trace.elapsed()
+                end_trace(token)
+                if profiler is not None:
+                    profiler.finish(profile, elapsed, f"jobs {len(job_ids)}")
+                    if elapsed >= profiler.slow_seconds:
+                        logger.warning(
+                            f"Slow batch of {len(job_ids)} jobs: {elapsed * 1000:.1f} ms, {trace}"
+                        )
+
+            if stopped():
+                # A standby executor may already have requeued the jobs, don't overwrite its
+                # results or release its claims
+                logger.warning(f"Worker stopped, leaving tasks {', '.join(job_ids)} unsaved")
+                break
+
+            finished = time.time()
+            for job_id, result in zip(job_ids, results):
+                if isinstance(result, JobInputNotFound):
+                    # Deleted, a state saved now would bring the job back
+                    logger.warning(f"Task {job_id} was deleted")
+                    job_queue.task_done(job_id)
+                    continue
+
+                state = JobState(DONE, enqueued_at[job_id], started, finished)
+                if isinstance(result, Exception):
+                    logger.error(f"Task {job_id} failed", exc_info=result)
+                    JOB_FAILURES.inc()
+                    state.state = FAILED
+                    state.error = str(result) or type(result).__name__
+                try:
+                    storage.save_state(job_id, state)
+                except Exception as e:
+                    logger.error(e, exc_info=True)
+
+                job_queue.task_done(job_id)
+                if state.state == FAILED:
+                    _call(on_failed, job_id, state.error)
+                else:
+                    _call(on_done, job_id, result)
+            logger.info(f"Finished tasks {', '.join(job_ids)}")
+    finally:
+        readiness.unmark()
+
+
+def _exit_with_parent(parent_pid: int):
+    """Let the kernel kill this process when the thread which started it exits (Linux only).
+
+    Otherwise an orphaned worker process would finish its running jobs while the executor of
+    another API worker takes over and runs the same jobs again.
+    """
+    if sys.platform.startswith("linux"):
+        libc = ctypes.CDLL(None, use_errno=True)
+        if libc.prctl(PR_SET_PDEATHSIG, signal.SIGKILL) != 0:
+            logger.warning(f"prctl(PR_SET_PDEATHSIG) failed: {os.strerror(ctypes.get_errno())}")
+    # The parent may have exited before prctl()
+    if os.getppid() != parent_pid:
+        os._exit(1)
+
+
+def _run_worker_process(
+    storage_path: str, queue_path: str, parent_pid: int, events_path: Optional[Path]
+):
+    _exit_with_parent(parent_pid)
+    setup_metrics()
+    events = JobEvents(events_path)
+    # Exit together with the API worker that started the process. Where the kernel doesn't kill
+    # the process, the results of jobs finished after the parent exited are not saved
+    run_worker(
+        DataStorage(storage_path),
+        SpoolJobQueue(queue_path),
+        stopped=lambda: os.getppid() != parent_pid,
+        on_done=lambda job_id, objects: events.notify(),
+        profiler=profiler_from_config(),
+        on_start=lambda job_ids: events.notify(),
+        on_failed=lambda job_id, error: events.notify(),
+    )
+
+
+class SegmentationExecutor:
+    """Runs segmentation jobs from a shared spool queue in worker threads or processes.
+
+    Every API worker creates an executor, but only one of them per storage directory is active:
+    executors compete for a file lock and the others stay on standby until the active one exits.
+    This way a host runs exactly `workers` model instances, whatever the number of API workers.
+
+    Attributes:
+        workers: number of worker threads or processes, each loads its own model
+        mode: "thread" or "process"
+        on_start: called with the job ids of a batch before it is processed, only in the
+            thread mode
+        on_done: called with the job id and the found objects after a job is processed,
+            only in the thread mode
+        on_failed: called with the job id and the error message if a job failed, only in the
+            thread mode
+        model: a model loaded in advance, e.g. by the gunicorn master before it forked the API
+            workers, used by the first worker thread. The other threads and the worker
+            processes load their own models
+        events: notified by the worker processes when they start or finish jobs, only in the
+            process mode
+
+    A worker process which exits is restarted after `restart_delay` seconds, doubled after
+    every failure up to `max_restart_delay`. A process which ran for `stable_seconds` resets the
+    delay. After `max_failures` failures in a row the executor stops all its processes and
+    marks the host not ready, another API worker then takes over.
+    """
+
+    restart_delay = 1.0
+    max_restart_delay = 60.0
+    stable_seconds = 60.0
+    max_failures = 5
+
+    def __init__(
+        self,
+        storage: DataStorage,
+        job_queue: SpoolJobQueue,
+        workers: int = 1,
+        mode: str = "thread",
+        on_done: Optional[JobCallback] = None,
+        on_start: Optional[BatchCallback] = None,
+        on_failed: Optional[FailureCallback] = None,
+        model: Optional[SegmentationModelBase] = None,
+        events: Optional[JobEvents] = None,
+    ):
+        if mode not in EXECUTOR_MODES:
+            raise ValueError(f"Wrong executor mode: {mode}. Expected one of {EXECUTOR_MODES}")
+        if workers < 1:
+            raise ValueError(f"Wrong number of workers: {workers}")
+
+        self.workers = workers
+        self.mode = mode
+        self.on_done = on_done
+        self.on_start = on_start
+        self.on_failed = on_failed
+        self.model = model
+        self.events = events
+        self._storage = storage
+        self._job_queue = job_queue
+        self._lock_path = storage.path / "executor.lock"
+
+    def start(self):
+        thread = threading.Thread(
+            target=run_exclusively, args=(self._lock_path, self._run), name="executor", daemon=True
+        )
+        thread.start()
+
+    def _run(self):
+        # Workers of the previous executor are gone
+        WorkerReadiness(self._storage).clear()
+        requeued = self._job_queue.requeue_running()
+        if requeued:
+            logger.warning(f"Requeued {requeued} unfinished jobs")
+
+        logger.info(f"Starting {self.workers} segmentation worker {self.mode}(s)")
+        if self.mode == "thread":
+            self._run_threads()
+        else:
+            self._supervise_processes()
+
+    def _run_threads(self):
+        threads = [
+            threading.Thread(
+                target=run_worker,
+                args=(self._storage, self._job_queue),
+                kwargs={
+                    "on_done": self.on_done,
+                    "profiler": profiler_from_config(),
+                    "on_start": self.on_start,
+                    "on_failed": self.on_failed,
+                    "model_wrapper": self.model if i == 0 else None,
+                },
+                daemon=True,
+            )
+            for i in range(self.workers)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def _start_process(self) -> multiprocessing.Process:
+        events_path = None if self.events is None else self.events.path
+        # Forking a multi-threaded API worker is unsafe, so worker processes are spawned
+        process = multiprocessing.get_context("spawn").Process(
+            target=_run_worker_process,
+            args=(str(self._storage.path), str(self._job_queue.path), os.getpid(), events_path),
+            daemon=True,
+        )
+        process.start()
+        return process
+
+    def _supervise_processes(self):
+        readiness = WorkerReadiness(self._storage)
+        processes: List[Optional[multiprocessing.Process]] = [
+            self._start_process() for _ in range(self.workers)
+        ]
+        started = [time.monotonic()] * self.workers
+        failures = [0] * self.workers
+        restart_at = [0.0] * self.workers
+        while True:
+            now = time.monotonic()
+            for i, process in enumerate(processes):
+                if process is None and now >= restart_at[i]:
+                    processes[i] = self._start_process()
+                    started[i] = now
+
+            sentinels = [process.sentinel for process in processes if process is not None]
+            pending = [restart_at[i] for i, process in enumerate(processes) if process is None]
+            timeout = max(min(pending) - now, 0) if pending else None
+            if sentinels:
+                multiprocessing.connection.wait(sentinels, timeout)
+            else:
+                time.sleep(timeout)
+
+            now = time.monotonic()
+            for i, process in enumerate(processes):
+                if process is None or process.is_alive():
+                    continue
+                # A killed process can't remove its own mark
+                readiness.unmark_process(process.pid)
+                processes[i] = None
+                failures[i] = 1 if now - started[i] >= self.stable_seconds else failures[i] + 1
+                if failures[i] >= self.max_failures:
+                    error = (
+                        f"segmentation worker process failed {failures[i]} times in a row, "
+                        f"last exit code {process.exitcode}"
+                    )
+                    logger.error(f"{error}, stopping the executor")
+                    self._stop_processes(processes)
+                    readiness.mark(error)
+                    return
+
+                delay = min(self.restart_delay * 2 ** (failures[i] - 1), self.max_restart_delay)
+                restart_at[i] = now + delay
+                logger.error(
+                    f"Worker process {process.pid} exited with code {process.exitcode}, "
+                    f"restarting in {delay:g} s"
+                )
+
+    @staticmethod
+    def _stop_processes(processes: List[Optional[multiprocessing.Process]]):
+        for process in processes:
+            if process is not None:
+                process.kill()
+                process.join()
@@ -0,0 +1,426 @@
+import asyncio
+import errno
+import os
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Callable, Deque, Dict, List, Optional, Set, Tuple, TypeVar
+
+from telesto.instance_segmentation import QUEUED, RUNNING, JobState
+
+T = TypeVar("T")
+
+# Interval of the storage checks of waiters which are also notified by other processes, in
+# case a notification was lost
+RECHECK_INTERVAL = 2.0
+
+
+class QueueFull(Exception):
+    pass
+
+
+class JobQueue:
+    """FIFO queue of job ids.
+
+    `get()` blocks until a job is put into the queue, so a worker picks a job up as soon as
+    it is posted.
+
+    Attributes:
+        maxsize: maximum number of queued jobs, 0 means no limit
+    """
+
+    def __init__(self, maxsize: int = 0):
+        self.maxsize = maxsize
+        self._jobs: Deque[str] = deque()
+        self._running: Set[str] = set()
+        self._enqueued: Dict[str, float] = {}
+        self._started: Dict[str, float] = {}
+        self._not_empty = threading.Condition()
+
+    def __len__(self) -> int:
+        return len(self._jobs)
+
+    def full(self) -> bool:
+        return 0 < self.maxsize <= len(self)
+
+    def put(self, job_id: str):
+        """Add a job to the end of the queue, raise QueueFull if the queue is at capacity."""
+
+        with self._not_empty:
+            if self.full():
+                raise QueueFull(f"Job queue is full: {len(self._jobs)} jobs")
+            self._jobs.append(job_id)
+            self._enqueued[job_id] = time.time()
+            self._not_empty.notify()
+
+    def get(self, timeout: Optional[float] = None) -> Optional[str]:
+        """Remove and return the oldest job, wait for one if the queue is empty.
+
+        Returns:
+            job id or None if no job was put within `timeout` seconds
+        """
+        with self._not_empty:
+            if not self._not_empty.wait_for(lambda: self._jobs, timeout):
+                return None
+            job_id = self._jobs.popleft()
+            self._running.add(job_id)
+            self._started[job_id] = time.time()
+            return job_id
+
+    def get_batch(self, max_size: int, timeout: Optional[float] = None) -> List[str]:
+        """Wait for a job like get(), then take up to `max_size` - 1 more without waiting.
+
+        Returns:
+            list of job ids, empty if no job was put within `timeout` seconds
+        """
+        job_id = self.get(timeout)
+        if job_id is None:
+            return []
+
+        job_ids = [job_id]
+        while len(job_ids) < max_size:
+            job_id = self.get(timeout=0)
+            if job_id is None:
+                break
+            job_ids.append(job_id)
+        return job_ids
+
+    def task_done(self, job_id: str):
+        """Mark a job returned by get() as processed."""
+
+        self._running.discard(job_id)
+        self._enqueued.pop(job_id, None)
+        self._started.pop(job_id, None)
+
+    def remove(self, job_id: str) -> bool:
+        """Remove a job which was not returned by get() yet.
+
+        Returns:
+            False if the job is not in the queue
+        """
+        with self._not_empty:
+            try:
+                self._jobs.remove(job_id)
+                self._enqueued.pop(job_id, None)
+                return True
+            except ValueError:
+                return False
+
+    def is_running(self, job_id: str) -> bool:
+        """Check if a job was returned by get() but is not marked as processed yet."""
+
+        return job_id in self._running
+
+    def enqueued_at(self, job_id: str) -> Optional[float]:
+        """Return the time.time() when a job returned by get() was put into the queue.
+
+        Returns:
+            put time or None if the job is not running
+        """
+
+        return self._enqueued.get(job_id)
+
+    def find(self, job_id: str) -> Optional[JobState]:
+        """Return the state of a queued or running job with its position in the queue.
+
+        Returns:
+            job state or None if the job is neither queued nor running
+        """
+        with self._not_empty:
+            created_at = self._enqueued.get(job_id)
+            if job_id in self._running:
+                return JobState(RUNNING, created_at, started_at=self._started.get(job_id))
+            try:
+                return JobState(QUEUED, created_at, position=self._jobs.index(job_id))
+            except ValueError:
+                return None
+
+
+class SpoolJobQueue(JobQueue):
+    """FIFO queue of job ids kept in a spool directory and shared by all processes on a host.
+
+    Every queued job is an empty file named "<enqueue time>-<job id>" in the "queued"
+    subdirectory. A consumer claims a job by renaming its file into "running", which is atomic,
+    so each job is processed exactly once no matter which process put it.
+
+    Consumers in the same process are woken as soon as a job is put, jobs put by other
+    processes are picked up within `poll_interval` seconds.
+    """
+
+    # Consumers of the same directory share a condition, so that any local put wakes them
+    _conditions: Dict[Path, threading.Condition] = {}
+    _conditions_lock = threading.Lock()
+
+    def __init__(self, path: str, maxsize: int = 0, poll_interval: float = 0.05):
+        super().__init__(maxsize)
+        self.poll_interval = poll_interval
+
+        self._path = Path(path).resolve()
+        self._queued_path = self._path / "queued"
+        self._running_path = self._path / "running"
+        self._make_dirs()
+
+        with self._conditions_lock:
+            self._not_empty = self._conditions.setdefault(self._path, threading.Condition())
+        self._claimed: Dict[str, str] = {}
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    def _make_dirs(self):
+        self._queued_path.mkdir(parents=True, exist_ok=True)
+        self._running_path.mkdir(parents=True, exist_ok=True)
+
+    def _queued_names(self) -> List[str]:
+        try:
+            return os.listdir(self._queued_path)
+        except FileNotFoundError:
+            # The directory was removed, e.g. by DataStorage.clean()
+            self._make_dirs()
+            return []
+
+    def __len__(self) -> int:
+        return len(self._queued_names())
+
+    def put(self, job_id: str):
+        if self.full():
+            raise QueueFull(f"Job queue is full: {len(self)} jobs")
+
+        self._make_dirs()
+        (self._queued_path / f"{time.time_ns():020d}-{job_id}").touch(exist_ok=False)
+        with self._not_empty:
+            self._not_empty.notify()
+
+    def get(self, timeout: Optional[float] = None) -> Optional[str]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._not_empty:
+            while True:
+                job_id = self._claim()
+                if job_id is not None:
+                    return job_id
+
+                wait = self.poll_interval
+                if deadline is not None:
+                    wait = min(wait, deadline - time.monotonic())
+                    if wait <= 0:
+                        return None
+                self._not_empty.wait(wait)
+
+    @staticmethod
+    def _enqueue_time(name: str) -> float:
+        return int(name.split("-", 1)[0]) / 1e9
+
+    def enqueued_at(self, job_id: str) -> Optional[float]:
+        name = self._claimed.get(job_id)
+        return None if name is None else self._enqueue_time(name)
+
+    def find(self, job_id: str) -> Optional[JobState]:
+        # Queued jobs are checked first, so that a job claimed meanwhile is found running
+        suffix = f"-{job_id}"
+        for position, name in enumerate(sorted(self._queued_names())):
+            if name.endswith(suffix):
+                return JobState(QUEUED, self._enqueue_time(name), position=position)
+
+        for name in os.listdir(self._running_path):
+            if name.endswith(suffix):
+                try:
+                    started_at = (self._running_path / name).stat().st_mtime
+                except FileNotFoundError:
+                    return None
+                return JobState(RUNNING, self._enqueue_time(name), started_at=started_at)
+        return None
+
+    def task_done(self, job_id: str):
+        name = self._claimed.pop(job_id)
+        try:
+            (self._running_path / name).unlink()
+        except FileNotFoundError:
+            pass
+
+    def remove(self, job_id: str) -> bool:
+        for name in self._queued_names():
+            if name.endswith(f"-{job_id}"):
+                try:
+                    (self._queued_path / name).unlink()
+                    return True
+                except FileNotFoundError:
+                    # Claimed by a consumer
+                    return False
+        return False
+
+    def is_running(self, job_id: str) -> bool:
+        return any(name.endswith(f"-{job_id}") for name in os.listdir(self._running_path))
+
+    def _claim(self) -> Optional[str]:
+        for name in sorted(self._queued_names()):
+            try:
+                os.rename(self._queued_path / name, self._running_path / name)
+            except FileNotFoundError:
+                # Claimed by another consumer
+                continue
+            # The modification time of a running file is the job start time, see find()
+            os.utime(self._running_path / name)
+
+            job_id = name.split("-", 1)[1]
+            self._claimed[job_id] = name
+            return job_id
+
+    def requeue_running(self) -> int:
+        """Put jobs left in "running" by a stopped consumer back into the queue.
+
+        Must only be called while no other consumer is active.
+
+        Returns:
+            number of requeued jobs
+        """
+        names = os.listdir(self._running_path)
+        for name in names:
+            os.rename(self._running_path / name, self._queued_path / name)
+        with self._not_empty:
+            self._not_empty.notify_all()
+        return len(names)
+
+
+class JobEvents:
+    """Wakes up requests waiting for a job to change its state.
+
+    Workers call `notify()` when they start or finish jobs, which wakes the waiters at once.
+    Threads wait with `wait_for()`, coroutines with `wait_for_async()`.
+
+    With a `path`, the events are shared by all processes on the host: every process which
+    calls `listen()` creates a fifo in the directory, and `notify()` writes to the fifos of the
+    other processes. Waiters then check the storage only every RECHECK_INTERVAL seconds, in case
+    a notification was lost. Without a `path`, or where fifos aren't supported, changes made by
+    other processes are noticed within `poll_interval` seconds.
+    """
+
+    def __init__(self, path: Optional[str] = None, poll_interval: float = 0.1):
+        self.poll_interval = poll_interval
+        self._path = None if path is None else Path(path).resolve()
+        self._changed = threading.Condition()
+        self._version = 0
+        self._async_waiters: Set[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = set()
+        self._fifo_name: Optional[str] = None
+
+    @property
+    def path(self) -> Optional[Path]:
+        return self._path
+
+    def listen(self):
+        """Wake the waiters of this process when another process calls notify().
+
+        Does nothing without a `path` or where fifos aren't supported.
+        """
+        if self._path is None or not hasattr(os, "mkfifo") or self._fifo_name is not None:
+            return
+
+        self._path.mkdir(parents=True, exist_ok=True)
+        name = f"{os.getpid()}-{id(self)}"
+        # Other processes remove fifos without a reader, so it is renamed once it is opened
+        temp_path = self._path / f".{name}"
+        os.mkfifo(temp_path)
+        # Also opened for writing, so that reads block instead of ending when no writer is left
+        fd = os.open(temp_path, os.O_RDWR)
+        os.rename(temp_path, self._path / name)
+        self._fifo_name = name
+        thread = threading.Thread(
+            target=self._read_fifo, args=(fd,), name="job-events", daemon=True
+        )
+        thread.start()
+
+    def _read_fifo(self, fd: int):
+        while True:
+            # Notifications written meanwhile are read at once
+            os.read(fd, 4096)
+            self._wake()
+
+    def notify(self):
+        self._wake()
+        if self._path is not None and hasattr(os, "mkfifo"):
+            self._notify_processes()
+
+    def _wake(self):
+        with self._changed:
+            self._version += 1
+            self._changed.notify_all()
+            for loop, changed in self._async_waiters:
+                loop.call_soon_threadsafe(changed.set)
+
+    def _notify_processes(self):
+        try:
+            names = os.listdir(self._path)
+        except FileNotFoundError:
+            return
+        for name in names:
+            if name == self._fifo_name or name.startswith("."):
+                continue
+            try:
+                fd = os.open(self._path / name, os.O_WRONLY | os.O_NONBLOCK)
+            except OSError as e:
+                if e.errno == errno.ENXIO:
+                    # No reader, the process exited
+                    try:
+                        os.unlink(self._path / name)
+                    except FileNotFoundError:
+                        pass
+                continue
+            try:
+                os.write(fd, b"\0")
+            except BlockingIOError:
+                # The fifo is full, the reader will be woken anyway
+                pass
+            finally:
+                os.close(fd)
+
+    def _interval(self) -> float:
+        if self._fifo_name is not None:
+            return max(self.poll_interval, RECHECK_INTERVAL)
+        return self.poll_interval
+
+    def wait_for(self, predicate: Callable[[], T], timeout: float) -> T:
+        """Wait until `predicate()` returns a true value or `timeout` seconds pass.
+
+        Returns:
+            the last value returned by `predicate()`
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            version = self._version
+            # Evaluated without the lock, the predicate usually checks the storage
+            result = predicate()
+            remaining = deadline - time.monotonic()
+            if result or remaining <= 0:
+                return result
+
+            with self._changed:
+                if self._version == version:
+                    self._changed.wait(min(self._interval(), remaining))
+
+    async def wait_for_async(self, predicate: Callable[[], T], timeout: float) -> T:
+        """Like wait_for(), but waits on the running event loop instead of blocking a thread.
+
+        The predicate is evaluated on the event loop, so it must be cheap.
+        """
+        loop = asyncio.get_running_loop()
+        changed = asyncio.Event()
+        waiter = (loop, changed)
+        with self._changed:
+            self._async_waiters.add(waiter)
+        try:
+            deadline = loop.time() + timeout
+            while True:
+                changed.clear()
+                result = predicate()
+                remaining = deadline - loop.time()
+                if result or remaining <= 0:
+                    return result
+
+                try:
+                    await asyncio.wait_for(changed.wait(), min(self._interval(), remaining))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            with self._changed:
+                self._async_waiters.discard(waiter)
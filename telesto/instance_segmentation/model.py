@@ -1,9 +1,16 @@
 from __future__ import annotations
-from typing import List
+from typing import List, Optional, Tuple
 
 import numpy as np
 
-from telesto.instance_segmentation import DataStorage, DetectionObject
+from telesto.images import blank_image
+from telesto.instance_segmentation import DataStorage, DetectionObject, scale_objects
+from telesto.instance_segmentation.tiling import merge_tile_objects, shift_objects, tile_grid
+from telesto.metrics import BATCH_SIZE, stage
+
+
+class JobInputNotFound(Exception):
+    """Raised for a job whose input was deleted, e.g. by DELETE /jobs/<job_id>."""
 
 
 class SegmentationModelBase:
@@ -12,8 +19,29 @@ class SegmentationModelBase:
     Attributes:
         classes (list): contains the labels
         model: the object representing the model, to be loaded with _load_model()
+        batch_size (int): maximum number of queued jobs, or of tiles, passed to predict_batch()
+            at once
+        input_size (tuple): (width, height) the input images are resized to before predict(),
+            found objects are scaled back to the original image size.
+            None - images are passed at their original size
+        input_mode (str): PIL mode the input images are converted to, e.g. "RGB" or "L",
+            None - images are passed in their original mode
+        version (str): version of the model weights, change it when they are updated so that
+            results cached by content hash are not reused
+        tile_size (tuple): (width, height) of tiles large images are split into, predict() is
+            called for every tile and the objects found in the overlaps are merged.
+            None - images are passed whole
+        tile_overlap (int): minimal overlap of neighbouring tiles in pixels, it should exceed
+            the size of most objects, so that every object is whole in at least one tile
     """
 
+    batch_size: int = 1
+    input_size: Optional[Tuple[int, int]] = None
+    input_mode: Optional[str] = None
+    version: Optional[str] = None
+    tile_size: Optional[Tuple[int, int]] = None
+    tile_overlap: int = 0
+
     def __init__(self, classes: List[str], model_path: str, storage: DataStorage):
         self._storage = storage
         self.model = self._load_model(model_path=model_path)
@@ -35,10 +63,92 @@ class SegmentationModelBase:
         """
         raise NotImplemented
 
+    def predict_batch(self, inputs: List[np.ndarray]) -> List[List[DetectionObject]]:
+        """Segment a batch of input images, override it if the model vectorizes well.
+
+        Images in a batch can have different sizes. By default predict() is called for
+        every image.
+
+        Args:
+            inputs: list of input images, 3D arrays with 1 or 3 image channels
+
+        Returns:
+            list of found objects for every image
+        """
+        return [self.predict(input) for input in inputs]
+
+    def predict_tiled(self, input: np.ndarray) -> List[DetectionObject]:
+        """Segment input image tile by tile, see `tile_size`.
+
+        Tiles are views of the input, not copies, and are passed to predict_batch() in batches
+        of up to `batch_size`.
+        """
+        h, w = input.shape[:2]
+        tiles = tile_grid((w, h), self.tile_size, self.tile_overlap)
+        tile_objects = []
+        for start in range(0, len(tiles), self.batch_size):
+            batch = tiles[start:start + self.batch_size]
+            tile_objects += self.predict_batch([input[y1:y2, x1:x2] for x1, y1, x2, y2 in batch])
+        if len(tile_objects) != len(tiles):
+            raise ValueError(
+                f"Wrong number of results: {len(tile_objects)}, expected: {len(tiles)}"
+            )
+
+        tile_objects = [
+            shift_objects(objects, tile[:2]) for objects, tile in zip(tile_objects, tiles)
+        ]
+        return merge_tile_objects(tile_objects, tiles)
+
+    def warmup(self, size: Tuple[int, int] = (512, 512)):
+        """Segment a blank image, so that lazy initialization, memory allocation or JIT
+        compilation of the model don't slow down the first job.
+
+        Args:
+            size: (width, height) of the image if the model has no `input_size` or `tile_size`
+        """
+        input = blank_image(self.input_size or self.tile_size or size, self.input_mode)
+        if self.tile_size is None:
+            self.predict_batch([input])
+        else:
+            self.predict_tiled(input)
+
     def __call__(self, job_id: str):
-        image = self._storage.load(job_id, output=False)
-        objects = self.predict(np.asarray(image))
-        self._storage.save(job_id, objects, output=True)
+        self.process_batch([job_id])
+
+    def process_batch(self, job_ids: List[str]) -> List[List[DetectionObject]]:
+        with stage("decode"):
+            images = [
+                self._storage.load_input(job_id, size=self.input_size, mode=self.input_mode)
+                for job_id in job_ids
+            ]
+        missing = [job_id for job_id, image in zip(job_ids, images) if image is None]
+        if missing:
+            raise JobInputNotFound(f"No input found for jobs {', '.join(missing)}")
+        BATCH_SIZE.observe(len(images), "segmentation")
+        with stage("predict"):
+            if self.tile_size is None:
+                batch_objects = self.predict_batch(images)
+            else:
+                batch_objects = [self.predict_tiled(image) for image in images]
+        if len(batch_objects) != len(job_ids):
+            raise ValueError(
+                f"Wrong number of results: {len(batch_objects)}, expected: {len(job_ids)}"
+            )
+
+        if self.input_size is not None:
+            sizes = [self._storage.input_size(job_id) for job_id in job_ids]
+            missing = [job_id for job_id, size in zip(job_ids, sizes) if size is None]
+            if missing:
+                raise JobInputNotFound(f"No input found for jobs {', '.join(missing)}")
+            batch_objects = [
+                scale_objects(objects, self.input_size, size)
+                for size, objects in zip(sizes, batch_objects)
+            ]
+
+        with stage("save"):
+            for job_id, objects in zip(job_ids, batch_objects):
+                self._storage.save(job_id, objects, output=True)
+        return batch_objects
 
 
 class DummySegmentationModel(SegmentationModelBase):
@@ -0,0 +1,100 @@
+import threading
+import time
+from collections import Counter
+from typing import Callable, Optional
+
+from telesto.logger import logger
+from telesto.metrics import STORAGE_EVICTIONS
+from telesto.instance_segmentation import DataStorage
+from telesto.instance_segmentation.executor import run_exclusively
+
+
+class StorageSweeper:
+    """Periodically deletes finished jobs from the storage in a background thread.
+
+    A job expires `ttl` seconds after it finished, or after its result was last read if reads
+    are recorded (see DataStorage.touch()). When the storage is still
+    larger than `max_bytes`, the oldest finished jobs are deleted. Unfinished jobs are kept.
+    Like the executor, only one sweeper per storage directory is active.
+
+    Attributes:
+        ttl: job lifetime in seconds, 0 means no limit
+        max_bytes: maximum storage size, 0 means no limit
+        interval: time between sweeps in seconds
+        on_delete: called with the id of every deleted job
+        evictions: number of deleted jobs
+    """
+
+    def __init__(
+        self,
+        storage: DataStorage,
+        ttl: float = 0,
+        max_bytes: int = 0,
+        interval: float = 60,
+        on_delete: Optional[Callable[[str], None]] = None,
+    ):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.interval = interval
+        self.on_delete = on_delete
+        self.evictions = 0
+        self._storage = storage
+
+    def start(self):
+        if not (self.ttl or self.max_bytes):
+            return
+
+        thread = threading.Thread(
+            target=run_exclusively,
+            args=(self._storage.path / "sweeper.lock", self._run),
+            name="storage-sweeper",
+            daemon=True,
+        )
+        thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(e, exc_info=True)
+            time.sleep(self.interval)
+
+    def sweep(self) -> int:
+        """Delete expired jobs and the oldest ones above the size limit.
+
+        Returns:
+            number of deleted jobs
+        """
+        jobs = self._storage.usage()
+        total_bytes = sum(usage.nbytes for usage in jobs.values())
+        # Files hard-linked to several jobs are freed with their last link
+        links = Counter(inode for usage in jobs.values() for inode in usage.files)
+        finished = sorted(
+            (usage.mtime, gid) for gid, usage in jobs.items() if usage.finished
+        )
+
+        expire_before = time.time() - self.ttl
+        deleted = 0
+        for mtime, gid in finished:
+            expired = self.ttl and mtime < expire_before
+            over_quota = self.max_bytes and total_bytes > self.max_bytes
+            if not (expired or over_quota):
+                break
+
+            self._storage.delete(gid)
+            for inode, size in jobs[gid].files.items():
+                links[inode] -= 1
+                if not links[inode]:
+                    total_bytes -= size
+            deleted += 1
+            if self.on_delete is not None:
+                self.on_delete(gid)
+
+        if deleted:
+            self.evictions += deleted
+            STORAGE_EVICTIONS.inc(amount=deleted)
+            logger.info(f"Deleted {deleted} jobs from storage, {total_bytes} bytes left")
+            # Keys of deduplicated inputs pointing to the deleted jobs
+            self._storage.prune_index()
+        return deleted
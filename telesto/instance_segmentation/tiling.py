@@ -0,0 +1,137 @@
+import itertools
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from telesto.instance_segmentation import DetectionObject
+
+# (x1, y1, x2, y2) of an image region, x2 and y2 excluded
+Region = Tuple[int, int, int, int]
+
+
+def _tile_starts(length: int, tile: int, overlap: int) -> List[int]:
+    if length <= tile:
+        return [0]
+    # The last tile is moved back to end at the image border, so all tiles have the full size
+    return list(range(0, length - tile, tile - overlap)) + [length - tile]
+
+
+def tile_grid(
+    image_size: Tuple[int, int], tile_size: Tuple[int, int], overlap: int
+) -> List[Region]:
+    """Cover an image of (w, h) size with tiles of (w, h) `tile_size` overlapping by at least
+    `overlap` pixels, in row-major order.
+
+    Tiles are smaller than `tile_size` only along the sides shorter than a tile.
+    """
+    (w, h), (tile_w, tile_h) = image_size, tile_size
+    if not 0 <= overlap < min(tile_w, tile_h):
+        raise ValueError(f"Tile overlap must be from 0 to the tile size, got {overlap}")
+
+    return [
+        (x, y, min(x + tile_w, w), min(y + tile_h, h))
+        for y in _tile_starts(h, tile_h, overlap)
+        for x in _tile_starts(w, tile_w, overlap)
+    ]
+
+
+def shift_objects(objects: List[DetectionObject], offset: Tuple[int, int]) -> List[DetectionObject]:
+    """Move objects found in an image region by the (x, y) offset of the region."""
+
+    dx, dy = offset
+    if dx == 0 and dy == 0:
+        return objects
+    return [
+        DetectionObject._from_cropped_mask(obj.mask, obj.bbox.x1 + dx, obj.bbox.y1 + dy)
+        for obj in objects
+    ]
+
+
+def _bounds(obj: DetectionObject) -> Region:
+    return obj.bbox.x1, obj.bbox.y1, obj.bbox.x2 + 1, obj.bbox.y2 + 1
+
+
+def _intersection(a: Region, b: Region) -> Optional[Region]:
+    x1, y1, x2, y2 = max(a[0], b[0]), max(a[1], b[1]), min(a[2], b[2]), min(a[3], b[3])
+    return (x1, y1, x2, y2) if x1 < x2 and y1 < y2 else None
+
+
+def _crop(obj: DetectionObject, region: Region) -> np.ndarray:
+    x1, y1, x2, y2 = region
+    return obj.mask[y1 - obj.bbox.y1:y2 - obj.bbox.y1, x1 - obj.bbox.x1:x2 - obj.bbox.x1]
+
+
+def _window_areas(objects: Sequence[DetectionObject], window: Region) -> List[Tuple[int, int]]:
+    """Return (index, area inside the window) of objects reaching into the window."""
+
+    areas = []
+    for i, obj in enumerate(objects):
+        region = _intersection(_bounds(obj), window)
+        area = 0 if region is None else int(np.count_nonzero(_crop(obj, region)))
+        if area:
+            areas.append((i, area))
+    return areas
+
+
+def _join(objects: List[DetectionObject]) -> DetectionObject:
+    if len(objects) == 1:
+        return objects[0]
+
+    bounds = np.array([_bounds(obj) for obj in objects])
+    x1, y1 = bounds[:, :2].min(axis=0).tolist()
+    x2, y2 = bounds[:, 2:].max(axis=0).tolist()
+    mask = np.zeros((y2 - y1, x2 - x1), dtype=bool)
+    for obj in objects:
+        top, left = obj.bbox.y1 - y1, obj.bbox.x1 - x1
+        h, w = obj.mask.shape
+        mask[top:top + h, left:left + w] |= obj.mask
+    return DetectionObject._from_cropped_mask(mask, x1, y1)
+
+
+def merge_tile_objects(
+    tile_objects: Sequence[List[DetectionObject]],
+    tiles: Sequence[Region],
+    iou_threshold: float = 0.5,
+) -> List[DetectionObject]:
+    """Merge objects found in overlapping tiles into one list without duplicates.
+
+    Objects of two tiles are the same object if their masks match where both tiles see the
+    image: the IoU of the masks inside the intersection of the tiles is at least
+    `iou_threshold`. The masks of the same object are joined, so an object cut by the border
+    of one tile is restored from the other one.
+
+    Args:
+        tile_objects: objects found in every tile, in image coordinates, see shift_objects()
+        tiles: regions of the tiles, see tile_grid()
+    """
+    objects = [obj for objs in tile_objects for obj in objs]
+    starts = np.cumsum([0] + [len(objs) for objs in tile_objects]).tolist()
+    parents = list(range(len(objects)))
+
+    def find(i: int) -> int:
+        while parents[i] != i:
+            parents[i] = parents[parents[i]]
+            i = parents[i]
+        return i
+
+    for a, b in itertools.combinations(range(len(tiles)), 2):
+        window = _intersection(tiles[a], tiles[b])
+        if window is None:
+            continue
+
+        first, second = objects[starts[a]:starts[a + 1]], objects[starts[b]:starts[b + 1]]
+        second_areas = _window_areas(second, window)
+        for i, area_i in _window_areas(first, window):
+            for j, area_j in second_areas:
+                region = _intersection(_bounds(first[i]), _bounds(second[j]))
+                region = region and _intersection(region, window)
+                if region is None:
+                    continue
+                shared = int(np.count_nonzero(_crop(first[i], region) & _crop(second[j], region)))
+                if shared / (area_i + area_j - shared) >= iou_threshold:
+                    parents[find(starts[a] + i)] = find(starts[b] + j)
+
+    groups = {}
+    for i, obj in enumerate(objects):
+        groups.setdefault(find(i), []).append(obj)
+    return [_join(group) for group in groups.values()]
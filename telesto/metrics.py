@@ -0,0 +1,363 @@
+import atexit
+import bisect
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import falcon
+
+from telesto.config import config
+from telesto.logger import logger
+from telesto.profiling import record_stage
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+Labels = Tuple[str, ...]
+
+
+class Metric:
+    type_ = ""
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        labelnames: Sequence[str] = (),
+        registry: Optional["MetricsRegistry"] = None,
+    ):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Labels, object] = {}
+        self._lock = threading.Lock()
+        (registry or REGISTRY).register(self)
+
+    def reset(self):
+        # Also called in a forked child, where the lock could have been held by another thread
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def snapshot(self) -> list:
+        with self._lock:
+            return [[list(labels), value] for labels, value in self._values.items()]
+
+
+class Counter(Metric):
+    """Monotonic counter, `inc()` takes label values in the order of `labelnames`."""
+
+    type_ = "counter"
+
+    def inc(self, *labels: str, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    @staticmethod
+    def merge(total, value):
+        return value if total is None else total + value
+
+
+class Histogram(Metric):
+    """Histogram of observed values with cumulative buckets like in Prometheus.
+
+    Values are stored as [count per bucket..., count above the last bucket, sum].
+    """
+
+    type_ = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+        registry: Optional["MetricsRegistry"] = None,
+    ):
+        super().__init__(name, description, labelnames, registry)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels: str):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(labels)
+            if counts is None:
+                counts = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[i] += 1
+            counts[-1] += value
+
+    def time(self, *labels: str) -> "_Timer":
+        """Observe the duration of a `with` block."""
+
+        return _Timer(self, labels)
+
+    def snapshot(self) -> list:
+        with self._lock:
+            return [[list(labels), list(counts)] for labels, counts in self._values.items()]
+
+    @staticmethod
+    def merge(total, value):
+        return list(value) if total is None else [a + b for a, b in zip(total, value)]
+
+
+class _Timer:
+    # A plain class is cheaper than a @contextmanager generator
+    __slots__ = ("_histogram", "_labels", "_start")
+
+    def __init__(self, histogram: Histogram, labels: Labels):
+        self._histogram = histogram
+        self._labels = labels
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        self._histogram.observe(time.perf_counter() - self._start, *self._labels)
+
+
+class _StageTimer(_Timer):
+    __slots__ = ()
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self._start
+        self._histogram.observe(elapsed, *self._labels)
+        record_stage(self._labels[0], elapsed)
+
+
+class MetricsRegistry:
+    """Collects the metrics of all API and worker processes on a host.
+
+    Every process keeps its own values in memory and writes them to a file in a directory
+    shared by the processes, at most every `flush_interval` seconds. A scrape merges the files,
+    so counters of exited processes are kept. Gauges are computed by the scraping process.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._gauges: Dict[str, Tuple[str, Callable[[], float]]] = {}
+        self._path: Optional[Path] = None
+        self._file_path: Optional[Path] = None
+        self._flush_interval = 1.0
+        self._flush_lock = threading.Lock()
+
+    def register(self, metric: Metric):
+        self._metrics[metric.name] = metric
+
+    def add_gauge(self, name: str, description: str, func: Callable[[], float]):
+        """Report `func()` as a gauge on every scrape, e.g. the size of a shared resource."""
+
+        self._gauges[name] = (description, func)
+
+    def start(self, path: str, flush_interval: float = 1.0):
+        """Start writing the metrics of this process to the directory `path`."""
+
+        if self._path is not None:
+            return
+
+        self._path = Path(path)
+        self._path.mkdir(parents=True, exist_ok=True)
+        self._flush_interval = flush_interval
+        self._start_process()
+        if hasattr(os, "register_at_fork"):
+            # Not available on Windows, where processes are not forked
+            os.register_at_fork(after_in_child=self._after_fork)
+        atexit.register(self.flush)
+
+    def _start_process(self):
+        # The start time makes file names unique if a pid is reused
+        self._file_path = self._path / f"{os.getpid()}-{time.time_ns()}.json"
+        thread = threading.Thread(target=self._run, name="metrics-flusher", daemon=True)
+        thread.start()
+
+    def _after_fork(self):
+        # Values inherited from the parent are already reported by the parent
+        for metric in self._metrics.values():
+            metric.reset()
+        self._flush_lock = threading.Lock()
+        self._start_process()
+
+    def _run(self):
+        while True:
+            time.sleep(self._flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(e, exc_info=True)
+
+    def flush(self):
+        if self._file_path is None:
+            return
+
+        doc = {name: metric.snapshot() for name, metric in self._metrics.items()}
+        with self._flush_lock:
+            tmp_path = self._file_path.with_name(f".{self._file_path.name}.tmp")
+            tmp_path.write_text(json.dumps(doc))
+            tmp_path.replace(self._file_path)
+
+    def _collect(self) -> Dict[str, Dict[Labels, object]]:
+        """Merge the values of all processes."""
+
+        if self._path is None:
+            docs = [{name: metric.snapshot() for name, metric in self._metrics.items()}]
+        else:
+            self.flush()
+            docs = []
+            for file_path in self._path.glob("*.json"):
+                try:
+                    docs.append(json.loads(file_path.read_text()))
+                except (FileNotFoundError, ValueError):
+                    continue
+
+        merged: Dict[str, Dict[Labels, object]] = {name: {} for name in self._metrics}
+        for doc in docs:
+            for name, values in doc.items():
+                metric = self._metrics.get(name)
+                if metric is None:
+                    continue
+                for labels, value in values:
+                    labels = tuple(labels)
+                    merged[name][labels] = metric.merge(merged[name].get(labels), value)
+        return merged
+
+    def render(self) -> bytes:
+        """Return all metrics in the Prometheus text format."""
+
+        lines: List[str] = []
+        for name, values in self._collect().items():
+            metric = self._metrics[name]
+            lines += [f"# HELP {name} {metric.description}", f"# TYPE {name} {metric.type_}"]
+            for labels, value in sorted(values.items()):
+                label_pairs = list(zip(metric.labelnames, labels))
+                if isinstance(metric, Histogram):
+                    cumulative = 0
+                    for bound, count in zip(metric.buckets + ("+Inf",), value[:-1]):
+                        cumulative += count
+                        bucket_labels = _format_labels(label_pairs + [("le", str(bound))])
+                        lines.append(f"{name}_bucket{bucket_labels} {cumulative}")
+                    lines.append(f"{name}_sum{_format_labels(label_pairs)} {value[-1]}")
+                    lines.append(f"{name}_count{_format_labels(label_pairs)} {cumulative}")
+                else:
+                    lines.append(f"{name}{_format_labels(label_pairs)} {value}")
+
+        for name, (description, func) in self._gauges.items():
+            try:
+                value = func()
+            except Exception as e:
+                logger.error(e, exc_info=True)
+                continue
+            lines += [f"# HELP {name} {description}", f"# TYPE {name} gauge", f"{name} {value}"]
+        return ("\n".join(lines) + "\n").encode()
+
+
+def _format_labels(label_pairs: List[Tuple[str, str]]) -> str:
+    if not label_pairs:
+        return ""
+    escaped = (
+        (name, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in label_pairs
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+REGISTRY = MetricsRegistry()
+
+REQUESTS = Counter(
+    "telesto_requests_total", "Number of handled requests", ("method", "route", "status")
+)
+REQUEST_SECONDS = Histogram(
+    "telesto_request_duration_seconds", "Request handling time", ("method", "route")
+)
+STAGE_SECONDS = Histogram(
+    "telesto_stage_duration_seconds",
+    "Time spent in a processing stage, e.g. decode, predict or serialize",
+    ("stage",),
+)
+BATCH_SIZE = Histogram(
+    "telesto_batch_size", "Number of images per model call", ("model",), BATCH_SIZE_BUCKETS
+)
+JOB_WAIT_SECONDS = Histogram(
+    "telesto_job_wait_seconds", "Time a segmentation job waited in the queue"
+)
+JOB_SECONDS = Histogram(
+    "telesto_job_processing_seconds", "Time a segmentation job was processed, per batch"
+)
+DEDUP_HITS = Counter(
+    "telesto_dedup_hits_total",
+    "Number of images whose result was reused from an earlier identical upload",
+    ("model",),
+)
+JOB_FAILURES = Counter(
+    "telesto_job_failures_total", "Number of segmentation jobs the model failed to process"
+)
+STORAGE_EVICTIONS = Counter(
+    "telesto_storage_evictions_total", "Number of jobs deleted by the storage sweeper"
+)
+
+
+def metrics_dir() -> Path:
+    return Path(config.get("metrics", "dir", fallback="./data/metrics"))
+
+
+def setup_metrics() -> bool:
+    """Start writing the metrics of this process if they are enabled in the config.
+
+    Returns:
+        False if metrics are disabled
+    """
+    if not config.getboolean("metrics", "enabled", fallback=True):
+        return False
+
+    REGISTRY.start(
+        str(metrics_dir()), flush_interval=config.getfloat("metrics", "flush_interval", fallback=1)
+    )
+    return True
+
+
+def clear_metrics_dir():
+    """Remove the metrics of previous server runs, must be called before the API starts."""
+
+    shutil.rmtree(metrics_dir(), ignore_errors=True)
+
+
+def stage(name: str) -> _StageTimer:
+    """Measure the time spent in a processing stage: `with stage("decode"): ...`
+
+    The time is also added to the trace of the current request, see telesto.profiling.
+    """
+    return _StageTimer(STAGE_SECONDS, (name,))
+
+
+class MetricsMiddleware:
+    """Counts requests and measures their latency per route."""
+
+    def process_request(self, req: falcon.Request, resp: falcon.Response):
+        req.context.metrics_start = time.perf_counter()
+
+    def process_response(
+        self, req: falcon.Request, resp: falcon.Response, resource, req_succeeded: bool
+    ):
+        start = getattr(req.context, "metrics_start", None)
+        if start is None:
+            return
+
+        # Unmatched paths share one label value to keep the number of series bounded
+        route = req.uri_template or "unmatched"
+        REQUEST_SECONDS.observe(time.perf_counter() - start, req.method, route)
+        REQUESTS.inc(req.method, route, str(resp.status)[:3])
+
+    async def process_request_async(self, req, resp):
+        self.process_request(req, resp)
+
+    async def process_response_async(self, req, resp, resource, req_succeeded: bool):
+        self.process_response(req, resp, resource, req_succeeded)
+
+
+class MetricsResource:
+    def on_get(self, req: falcon.Request, resp: falcon.Response):
+        resp.content_type = CONTENT_TYPE
+        resp.data = REGISTRY.render()
@@ -1,9 +1,28 @@
+import importlib
 from enum import Enum
 
-from telesto.classification.model import ClassificationModelBase, RandomClassificationModel
-from telesto.instance_segmentation.model import SegmentationModelBase, DummySegmentationModel
+# Model base classes are imported on first access, so that importing telesto.app loads only
+# the modules (and NumPy, PIL) of the configured model type
+_LAZY_ATTRIBUTES = {
+    "ClassificationModelBase": "telesto.classification.model",
+    "RandomClassificationModel": "telesto.classification.model",
+    "SegmentationModelBase": "telesto.instance_segmentation.model",
+    "DummySegmentationModel": "telesto.instance_segmentation.model",
+}
 
 
 class ModelType(str, Enum):
     CLASSIFICATION = "CLASSIFICATION"
     INSTANCE_SEGMENTATION = "INSTANCE_SEGMENTATION"
+
+
+def __getattr__(name: str):
+    if name in _LAZY_ATTRIBUTES:
+        value = getattr(importlib.import_module(_LAZY_ATTRIBUTES[name]), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_LAZY_ATTRIBUTES))
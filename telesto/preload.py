@@ -0,0 +1,44 @@
+"""Support for creating the app in the gunicorn master before the workers are forked
+(`PRELOAD=1 ./start-api.sh`, i.e. `gunicorn --preload`).
+
+The model is then loaded once and its memory is shared by the workers as long as none of
+them writes to it. Threads don't survive a fork, so background threads of the app are started
+in every worker after it is forked.
+"""
+import gc
+import os
+from typing import Callable
+
+
+def preload_enabled() -> bool:
+    """Whether the app is created by the gunicorn master and forked into the workers."""
+
+    return bool(int(os.environ.get("PRELOAD", 0)))
+
+
+def start_in_workers(start: Callable[[], None]):
+    """Call `start()` now or, if the app is preloaded, in every worker forked from this process."""
+
+    if not preload_enabled():
+        start()
+        return
+
+    master_pid = os.getpid()
+
+    def start_in_child():
+        # Processes forked by a worker later on don't start their own copy
+        if os.getppid() == master_pid:
+            start()
+
+    os.register_at_fork(after_in_child=start_in_child)
+
+
+def freeze():
+    """Prepare the preloaded app for forking the workers.
+
+    Objects created so far are moved to a generation the garbage collector ignores, so that
+    collections in the workers don't write to the memory pages shared with the master.
+    """
+    if preload_enabled():
+        gc.collect()
+        gc.freeze()
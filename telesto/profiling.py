@@ -0,0 +1,136 @@
+import cProfile
+import os
+import random
+import re
+import threading
+import time
+from contextvars import ContextVar, Token
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from telesto.config import config
+from telesto.logger import logger
+
+_current_trace: ContextVar[Optional["Trace"]] = ContextVar("telesto_trace", default=None)
+
+
+class Trace:
+    """Stage timings of one request or job batch, see telesto.metrics.stage()."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.stages: List[Tuple[str, float]] = []
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.start
+
+    def server_timing(self, total: float) -> str:
+        """Format the timings as a Server-Timing header value, durations in milliseconds."""
+
+        metrics = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in self.stages]
+        return ", ".join(metrics + [f"total;dur={total * 1000:.2f}"])
+
+    def __str__(self) -> str:
+        if not self.stages:
+            return "no stages"
+        return ", ".join(f"{name} {seconds * 1000:.1f} ms" for name, seconds in self.stages)
+
+
+def start_trace() -> Tuple[Trace, Token]:
+    """Collect stage timings of the current thread or task until end_trace() is called."""
+
+    trace = Trace()
+    return trace, _current_trace.set(trace)
+
+
+def end_trace(token: Token):
+    _current_trace.reset(token)
+
+
+def record_stage(name: str, seconds: float):
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.stages.append((name, seconds))
+
+
+class Profiler:
+    """Profiles a random sample of requests or job batches with cProfile.
+
+    Profiles of sampled calls which took at least `slow_seconds` are written to `path` as
+    .prof files, to be read with pstats or snakeviz. Only the newest `max_profiles` are kept.
+
+    Attributes:
+        sample_rate: fraction of calls to profile, from 0 to 1
+        slow_seconds: minimal duration of a call whose profile is saved
+        max_profiles: maximum number of saved profiles
+    """
+
+    def __init__(
+        self, path: str, sample_rate: float, slow_seconds: float, max_profiles: int = 100
+    ):
+        self.sample_rate = sample_rate
+        self.slow_seconds = slow_seconds
+        self.max_profiles = max_profiles
+        self._path = Path(path)
+        self._path.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    def start(self) -> Optional[cProfile.Profile]:
+        """Start profiling the current thread if it is sampled.
+
+        Returns:
+            the running profile to pass to finish() or None
+        """
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return None
+
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler is already active
+            return None
+        return profile
+
+    def finish(self, profile: Optional[cProfile.Profile], elapsed: float, name: str):
+        """Stop the profile and save it if the call was slow."""
+
+        if profile is None:
+            return
+
+        profile.disable()
+        if elapsed < self.slow_seconds:
+            return
+
+        label = re.sub(r"[^A-Za-z0-9]+", "_", name).strip("_")
+        file_name = f"{time.time_ns()}-{os.getpid()}-{label}-{elapsed * 1000:.0f}ms.prof"
+        profile.dump_stats(str(self._path / file_name))
+        logger.info(f"Saved profile {file_name}")
+        self._rotate()
+
+    def _rotate(self):
+        with self._lock:
+            profiles = sorted(self._path.glob("*.prof"))
+            for path in profiles[:max(0, len(profiles) - self.max_profiles)]:
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+
+
+def profiler_from_config() -> Optional[Profiler]:
+    """Create a profiler from the [profiling] config section, None if profiling is disabled."""
+
+    if not config.getboolean("profiling", "enabled", fallback=False):
+        return None
+
+    return Profiler(
+        config.get("profiling", "dir", fallback="./data/profiles"),
+        sample_rate=config.getfloat("profiling", "sample_rate", fallback=0),
+        slow_seconds=config.getfloat("profiling", "slow_ms", fallback=1000) / 1000,
+        max_profiles=config.getint("profiling", "max_profiles", fallback=100),
+    )
@@ -0,0 +1,87 @@
+import json
+import os
+from functools import lru_cache
+from typing import Any, Callable, Dict, Optional
+
+from telesto.config import config
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+
+def _dumps_json(obj: Any) -> bytes:
+    return json.dumps(obj, ensure_ascii=False).encode()
+
+
+def _dumps_ujson(obj: Any) -> bytes:
+    return ujson.dumps(obj, ensure_ascii=False, escape_forward_slashes=False).encode()
+
+
+def _dumps_orjson(obj: Any) -> bytes:
+    return orjson.dumps(obj)
+
+
+def available_serializers() -> Dict[str, Callable[[Any], bytes]]:
+    """Return the installed JSON serializers, the fastest first."""
+
+    serializers = {}
+    if orjson is not None:
+        serializers["orjson"] = _dumps_orjson
+    if ujson is not None:
+        serializers["ujson"] = _dumps_ujson
+    serializers["json"] = _dumps_json
+    return serializers
+
+
+def get_serializer(name: str = "auto") -> Callable[[Any], bytes]:
+    """Return a function encoding an object to UTF-8 JSON bytes.
+
+    Args:
+        name: "orjson", "ujson" or "json", "auto" - the fastest installed one
+    """
+    serializers = available_serializers()
+    if name == "auto":
+        return next(iter(serializers.values()))
+    if name not in serializers:
+        raise ValueError(f"JSON serializer '{name}' is not available: {list(serializers)}")
+    return serializers[name]
+
+
+@lru_cache(maxsize=None)
+def configured_serializer() -> Callable[[Any], bytes]:
+    """Return the serializer selected by `[common] json_serializer`, read on first use."""
+
+    return get_serializer(config.get("common", "json_serializer", fallback="auto"))
+
+
+def dumps(obj: Any) -> bytes:
+    """Encode an object to UTF-8 JSON bytes with the configured serializer."""
+
+    return configured_serializer()(obj)
+
+
+class PreEncoded:
+    """Response body which is encoded on first use and then served as is.
+
+    The body is encoded again in a new process, so documents with process-specific values
+    (e.g. the pid) stay correct in forked API workers.
+    """
+
+    def __init__(self, make_doc: Callable[[], Any]):
+        self._make_doc = make_doc
+        self._body: Optional[bytes] = None
+        self._pid: Optional[int] = None
+
+    def __call__(self) -> bytes:
+        pid = os.getpid()
+        if self._pid != pid:
+            self._body = dumps(self._make_doc())
+            self._pid = pid
+        return self._body
@@ -0,0 +1,167 @@
+import io
+import re
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+CHUNK_SIZE = 64 * 1024
+
+IMAGE_CONTENT_TYPES = ("image/png", "image/jpeg")
+
+_NAME_RE = re.compile(r'(?:^|;)\s*name="([^"]*)"')
+
+
+def parse_content_type(value: Optional[str]) -> Tuple[str, Dict[str, str]]:
+    """Split a Content-Type header into the lower case media type and its parameters."""
+
+    if not value:
+        return "", {}
+
+    media_type, *params = value.split(";")
+    param_dict = {}
+    for param in params:
+        key, _, param_value = param.strip().partition("=")
+        param_dict[key.lower()] = param_value.strip('"')
+    return media_type.strip().lower(), param_dict
+
+
+class MultipartReader:
+    """Streaming multipart/form-data parser.
+
+    The body is read in chunks of CHUNK_SIZE bytes and the content of every part is written
+    straight into a file-like object, so the whole body is never kept in memory at once.
+    """
+
+    def __init__(self, stream: BinaryIO, boundary: str):
+        if not boundary:
+            raise ValueError("Multipart boundary is missing")
+
+        self._stream = stream
+        self._delimiter = b"\r\n--" + boundary.encode("latin-1")
+        # The body starts with the delimiter without the leading line break
+        self._buffer = bytearray(b"\r\n")
+        self._eof = False
+
+    def _fill(self) -> bool:
+        if self._eof:
+            return False
+
+        chunk = self._stream.read(CHUNK_SIZE)
+        if not chunk:
+            self._eof = True
+            return False
+        self._buffer += chunk
+        return True
+
+    def _read_until(self, separator: bytes, sink: Optional[BinaryIO] = None) -> bytes:
+        """Consume the buffer up to and including `separator`.
+
+        Returns:
+            the consumed data without the separator, or b"" if it was written to `sink`
+        """
+        collected = bytearray()
+        while True:
+            index = self._buffer.find(separator)
+            if index >= 0:
+                data, self._buffer = self._buffer[:index], self._buffer[index + len(separator):]
+                break
+
+            # Keep the tail which could be the beginning of a separator
+            keep = len(separator) - 1
+            if len(self._buffer) > keep:
+                data = self._buffer[:len(self._buffer) - keep]
+                del self._buffer[:len(data)]
+                if sink is not None:
+                    sink.write(data)
+                else:
+                    collected += data
+            if not self._fill():
+                raise ValueError("Unexpected end of multipart body")
+
+        if sink is not None:
+            sink.write(data)
+            return b""
+        collected += data
+        return bytes(collected)
+
+    def _read_bytes(self, n: int) -> bytes:
+        while len(self._buffer) < n:
+            if not self._fill():
+                raise ValueError("Unexpected end of multipart body")
+        data, self._buffer = bytes(self._buffer[:n]), self._buffer[n:]
+        return data
+
+    def __iter__(self) -> Iterator[Tuple[Dict[str, str], "PartReader"]]:
+        """Iterate over (headers, part) pairs, the content of a part must be read before the
+        next iteration, otherwise it is skipped."""
+
+        self._read_until(self._delimiter)
+        while True:
+            if self._read_bytes(2) == b"--":
+                return
+
+            headers = {}
+            for line in self._read_until(b"\r\n\r\n").decode("latin-1").split("\r\n"):
+                name, _, value = line.partition(":")
+                if name.strip():
+                    headers[name.strip().lower()] = value.strip()
+
+            part = PartReader(self)
+            yield headers, part
+            if not part.consumed:
+                part.read_into(_NullSink())
+
+
+class PartReader:
+    def __init__(self, reader: MultipartReader):
+        self._reader = reader
+        self.consumed = False
+
+    def read_into(self, sink: BinaryIO):
+        self._reader._read_until(self._reader._delimiter, sink)
+        self.consumed = True
+
+
+class _NullSink:
+    def write(self, data: bytes):
+        pass
+
+
+def read_image_uploads(
+    content_type: Optional[str], stream: BinaryIO, field: str
+) -> Optional[List[io.BytesIO]]:
+    """Read images sent as a raw image body or as multipart/form-data.
+
+    Args:
+        content_type: value of the Content-Type header
+        stream: request body
+        field: name of the form field(s) containing images, other fields are skipped
+
+    Returns:
+        list of file-like objects with image bytes, or None if the body is neither a raw image
+        nor a multipart form, e.g. JSON
+    """
+    media_type, params = parse_content_type(content_type)
+
+    if media_type in IMAGE_CONTENT_TYPES:
+        fp = io.BytesIO()
+        while True:
+            chunk = stream.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            fp.write(chunk)
+        fp.seek(0)
+        return [fp]
+
+    if media_type == "multipart/form-data":
+        images = []
+        for headers, part in MultipartReader(stream, params.get("boundary", "")):
+            match = _NAME_RE.search(headers.get("content-disposition", ""))
+            if match is not None and match.group(1) == field:
+                fp = io.BytesIO()
+                part.read_into(fp)
+                fp.seek(0)
+                images.append(fp)
+        if not images:
+            raise ValueError(f"No '{field}' field found in the multipart body")
+        return images
+
+    return None
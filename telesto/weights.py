@@ -0,0 +1,76 @@
+"""Model weights stored as NumPy arrays in memory-mapped files.
+
+Pages of a memory-mapped file come from the page cache and are shared by all processes which
+map the file, while weights read into memory are copied by every API worker, executor thread
+and worker process which loads the model.
+"""
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Callable, Dict, Mapping, Union
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows
+    fcntl = None
+
+INDEX_NAME = "index.json"
+
+PathLike = Union[str, Path]
+
+
+def save_arrays(path: PathLike, arrays: Mapping[str, np.ndarray]):
+    """Save named arrays to the directory `path` as .npy files, replacing its content."""
+
+    path = Path(path)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    tmp_path.mkdir(parents=True)
+
+    # Array names can be any strings, e.g. "layer1/weight", so files are numbered
+    names = list(arrays)
+    for i, name in enumerate(names):
+        np.save(tmp_path / f"{i}.npy", np.asarray(arrays[name]), allow_pickle=False)
+    (tmp_path / INDEX_NAME).write_text(json.dumps(names))
+
+    shutil.rmtree(path, ignore_errors=True)
+    tmp_path.rename(path)
+
+
+def load_arrays(path: PathLike, mmap: bool = True) -> Dict[str, np.ndarray]:
+    """Load arrays saved with save_arrays(), memory-mapped read-only by default."""
+
+    path = Path(path)
+    names = json.loads((path / INDEX_NAME).read_text())
+    mmap_mode = "r" if mmap else None
+    return {
+        name: np.load(path / f"{i}.npy", mmap_mode=mmap_mode, allow_pickle=False)
+        for i, name in enumerate(names)
+    }
+
+
+def shared_arrays(
+    path: PathLike, build: Callable[[], Mapping[str, np.ndarray]]
+) -> Dict[str, np.ndarray]:
+    """Memory-map the arrays saved in `path`, create them with `build()` if they don't exist.
+
+    Only one process on the host builds the arrays, the others wait for it and map the saved
+    files. For example, in _load_model() of a model:
+
+        self.weights = shared_arrays("./data/weights/v2", lambda: read_checkpoint(model_path))
+
+    The arrays are read-only, use a new path when the weights change. Without fcntl, e.g. on
+    Windows, the build is not locked, so it is only safe in a single process.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.with_name(f"{path.name}.lock").open("a") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        if not (path / INDEX_NAME).exists():
+            save_arrays(path, build())
+    return load_arrays(path)
@@ -0,0 +1,128 @@
+import io
+import json
+import os
+import sys
+import threading
+import time
+import types
+
+import falcon
+import numpy as np
+import PIL.Image
+from falcon import testing
+
+from telesto.app import get_app
+from telesto.classification.app import postprocess
+from telesto.classification.model import RandomClassificationModel
+from telesto.config import config
+from telesto.models import ModelType
+
+os.environ["USE_FALLBACK_MODEL"] = "1"
+
+
+def test_postprocess():
+    pred_array = np.array([[0.123456, 0.876544], [0.9, 0.1]], dtype=np.float32)
+
+    doc = postprocess(pred_array, ["cat", "dog"])
+
+    assert doc == {
+        "predictions": [
+            {"probs": {"cat": 0.12346, "dog": 0.87654}, "prediction": "dog"},
+            {"probs": {"cat": 0.9, "dog": 0.1}, "prediction": "cat"},
+        ]
+    }
+
+
+def wait_until_ready(client: testing.TestClient, timeout: float = 10):
+    deadline = time.monotonic() + timeout
+    while client.simulate_get("/ready").status != falcon.HTTP_OK:
+        assert time.monotonic() < deadline, "The model did not get ready"
+        time.sleep(0.01)
+
+
+def test_dedup_cache():
+    config["common"]["model_type"] = ModelType.CLASSIFICATION.value
+    config["common"]["api_key"] = ""
+    config["classification"]["dedup_cache_entries"] = "8"
+    try:
+        client = testing.TestClient(get_app())
+        wait_until_ready(client)
+    finally:
+        config["classification"]["dedup_cache_entries"] = "0"
+
+    images = []
+    for value in [0, 255]:
+        fp = io.BytesIO()
+        PIL.Image.new("RGB", (4, 4), (value, 0, 0)).save(fp, format="PNG")
+        images.append(fp.getvalue())
+
+    def post(image: bytes) -> dict:
+        resp = client.simulate_post("/", body=image, headers={"content-type": "image/png"})
+        assert resp.status == falcon.HTTP_OK, resp.text
+        return json.loads(resp.content)["predictions"][0]
+
+    # The fallback model returns random probabilities, equal ones come from the cache
+    first = post(images[0])
+    assert post(images[0]) == first
+    assert post(images[1]) != first
+
+
+def test_readiness(monkeypatch):
+    loading = threading.Event()
+
+    class SlowModel(RandomClassificationModel):
+        def _load_model(self, model_path: str):
+            loading.wait(10)
+
+    module = types.ModuleType("model")
+    module.ClassificationModel = SlowModel
+    monkeypatch.setitem(sys.modules, "model", module)
+    config["common"]["model_type"] = ModelType.CLASSIFICATION.value
+    config["common"]["api_key"] = ""
+    client = testing.TestClient(get_app())
+
+    assert client.simulate_get("/live").status == falcon.HTTP_OK
+    resp = client.simulate_get("/ready")
+    assert resp.status == falcon.HTTP_503
+    assert resp.json["reason"] == "loading model"
+    resp = client.simulate_post("/", body=b"", headers={"content-type": "image/png"})
+    assert resp.status == falcon.HTTP_503
+
+    loading.set()
+    wait_until_ready(client)
+
+
+def test_warmup_stacked_input(monkeypatch):
+    inputs = []
+
+    class StackedModel(RandomClassificationModel):
+        input_mode = "L"
+
+        def predict(self, input_list):
+            # Fails on a list of images
+            inputs.append(input_list.shape)
+            return super().predict(input_list)
+
+    class BrokenModel(RandomClassificationModel):
+        def predict(self, input_list):
+            raise ValueError("Broken model")
+
+    module = types.ModuleType("model")
+    monkeypatch.setitem(sys.modules, "model", module)
+    monkeypatch.setitem(config["classification"], "stack_images", "true")
+    config["common"]["model_type"] = ModelType.CLASSIFICATION.value
+    config["common"]["api_key"] = ""
+
+    module.ClassificationModel = StackedModel
+    wait_until_ready(testing.TestClient(get_app()))
+    assert inputs == [(1, 512, 512)]
+
+    module.ClassificationModel = BrokenModel
+    client = testing.TestClient(get_app())
+    deadline = time.monotonic() + 10
+    while not client.simulate_get("/ready").json["reason"].startswith("model failed"):
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    resp = client.simulate_get("/ready")
+    assert resp.status == falcon.HTTP_503
+    assert resp.json["reason"] == "model failed to load: warmup failed: Broken model"
@@ -0,0 +1,105 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+import numpy as np
+import pytest
+
+from telesto.classification.batching import MicroBatcher
+from telesto.classification.model import ClassificationModelBase
+
+
+class ClassificationModelTest(ClassificationModelBase):
+    def __init__(self):
+        super().__init__(classes=["value", "rest"], model_path="")
+        self.batch_sizes = []
+        self.inputs = []
+
+    def _load_model(self, model_path: str):
+        pass
+
+    def predict(self, input_list: List[np.ndarray]) -> np.ndarray:
+        self.batch_sizes.append(len(input_list))
+        self.inputs.append(input_list)
+        values = np.array([array.mean() for array in input_list])
+        return np.stack([values, 1 - values], axis=1)
+
+
+class FailingModelTest(ClassificationModelTest):
+    def predict(self, input_list: List[np.ndarray]) -> np.ndarray:
+        raise RuntimeError("Model error")
+
+
+class BadInputModelTest(ClassificationModelTest):
+    def __init__(self):
+        super().__init__()
+        self.calls = []
+
+    def predict(self, input_list: List[np.ndarray]) -> np.ndarray:
+        self.calls.append(len(input_list))
+        if any(np.isnan(array).any() for array in input_list):
+            raise ValueError("Bad input")
+        return super().predict(input_list)
+
+
+def make_inputs(values: List[float]) -> List[np.ndarray]:
+    return [np.full((2, 2, 3), value) for value in values]
+
+
+def test_micro_batcher_returns_own_rows():
+    model = ClassificationModelTest()
+    batcher = MicroBatcher(model, max_batch_size=8, max_wait=0.05)
+
+    requests = [[i / 100, i / 100 + 0.005] for i in range(20)]
+    with ThreadPoolExecutor(max_workers=20) as executor:
+        results = list(executor.map(lambda values: batcher(make_inputs(values)), requests))
+
+    for values, pred_array in zip(requests, results):
+        assert np.allclose(pred_array[:, 0], values)
+    assert sum(model.batch_sizes) == 40
+    assert max(model.batch_sizes) <= 8
+    assert len(model.batch_sizes) < len(requests)
+
+
+def test_micro_batcher_wrong_number_of_images():
+    batcher = MicroBatcher(ClassificationModelTest())
+
+    with pytest.raises(ValueError):
+        batcher([])
+    with pytest.raises(ValueError):
+        batcher(make_inputs([0.5] * 33))
+
+
+def test_micro_batcher_propagates_errors():
+    batcher = MicroBatcher(FailingModelTest(), max_wait=0)
+
+    with pytest.raises(RuntimeError):
+        batcher(make_inputs([0.5]))
+
+
+def test_micro_batcher_keeps_stacked_inputs():
+    model = ClassificationModelTest()
+    batcher = MicroBatcher(model, max_batch_size=8, max_wait=0.05)
+
+    requests = [np.full((2, 4, 4, 3), value) for value in [0.25, 0.75]]
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        results = list(executor.map(batcher, requests))
+
+    for inputs, pred_array in zip(requests, results):
+        assert np.allclose(pred_array[:, 0], inputs.mean(axis=(1, 2, 3)))
+    assert all(isinstance(inputs, np.ndarray) for inputs in model.inputs)
+
+
+def test_micro_batcher_isolates_failing_requests():
+    model = BadInputModelTest()
+    batcher = MicroBatcher(model, max_batch_size=8, max_wait=0.1)
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        bad = executor.submit(batcher, make_inputs([np.nan]))
+        good = executor.submit(batcher, make_inputs([0.25, 0.75]))
+
+        assert np.allclose(good.result()[:, 0], [0.25, 0.75])
+        with pytest.raises(ValueError):
+            bad.result()
+    # The merged batch failed, then each request was called on its own
+    assert model.calls[0] == 3
+    assert sorted(model.calls[1:]) == [1, 2]
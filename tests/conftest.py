@@ -0,0 +1,9 @@
+import pytest
+
+from telesto.config import config
+
+
+@pytest.fixture(scope="session", autouse=True)
+def metrics_dir(tmp_path_factory):
+    # Keep the metrics files of the test processes out of the working tree
+    config["metrics"]["dir"] = str(tmp_path_factory.mktemp("metrics"))
@@ -1,7 +1,9 @@
 import os
+import asyncio
 import base64
 import io
 import json
+import pickle
 import time
 
 import falcon
@@ -13,7 +15,14 @@ import PIL.Image
 from telesto.app import get_app
 from telesto.config import config
 from telesto.models import ModelType
-from telesto.instance_segmentation import DataStorage, DetectionObject, segmentation_object_asdict
+from telesto.instance_segmentation import (
+    DataStorage,
+    DetectionObject,
+    JobState,
+    segmentation_object_asdict,
+)
+from telesto.instance_segmentation.app import SegmentationJobEvents, max_wait_seconds
+from telesto.instance_segmentation.jobs import JobEvents, JobQueue
 
 os.environ["USE_FALLBACK_MODEL"] = "1"
 
@@ -60,6 +69,50 @@ def test_image_storage_not_found(storage: DataStorage):
     assert restored_image is None
 
 
+def test_image_storage_save_encoded(storage: DataStorage):
+    image = make_test_image(rgb=True)
+    fp = io.BytesIO()
+    image.save(fp, format="PNG")
+
+    gid = "encoded"
+    storage.save_encoded(gid, fp.getvalue())
+
+    assert storage.input_size(gid) == image.size
+    assert np.all(storage.load(gid, output=False) == np.asarray(image))
+
+
+def test_objects_storage_save_load(storage: DataStorage):
+    objects = [
+        DetectionObject(coords=[(0, 0), (1, 1), (2, 1)]),
+        DetectionObject(coords=[(5, 7)]),
+    ]
+
+    gid = "abc"
+    storage.save(gid, objects, output=True)
+    restored_objects = storage.load(gid, output=True)
+
+    assert restored_objects == objects
+
+
+def test_storage_legacy_pickle(storage: DataStorage):
+    image = make_test_image()
+    objects = [DetectionObject(coords=[(0, 0), (1, 1)])]
+
+    gid = "legacy"
+    for obj, type_ in [(image, "input"), (objects, "output")]:
+        with (storage.path / f"{gid}-{type_}.pickle").open("wb") as f:
+            pickle.dump(obj, f)
+
+    assert np.all(storage.load(gid, output=False) == np.asarray(image))
+    assert storage.load(gid, output=True) == objects
+
+    assert storage.migrate_legacy() == 2
+    assert not list(storage.path.glob("*.pickle"))
+    assert np.all(storage.load(gid, output=False) == np.asarray(image))
+    assert storage.load(gid, output=True) == objects
+    assert storage.input_size(gid) == image.size
+
+
 def test_root_get(client: testing.TestClient):
     resp = client.simulate_get("/")
 
@@ -93,6 +146,43 @@ def test_segm_get(client: testing.TestClient, storage: DataStorage):
     assert resp_doc["objects"][0] == segmentation_object_asdict(test_segm_object, test_image.size)
 
 
+def wait_for_job(client: testing.TestClient, job_id: str, timeout: float = 5):
+    deadline = time.monotonic() + timeout
+    resp = client.simulate_get(f"/jobs/{job_id}")
+    while resp.status == falcon.HTTP_ACCEPTED and time.monotonic() < deadline:
+        time.sleep(0.01)
+        resp = client.simulate_get(f"/jobs/{job_id}")
+    return resp
+
+
+def test_segm_ready(client: testing.TestClient):
+    assert client.simulate_get("/live").status == falcon.HTTP_OK
+
+    # Ready once the executor of one of the API workers has loaded and warmed up its model
+    deadline = time.monotonic() + 5
+    resp = client.simulate_get("/ready")
+    while resp.status == falcon.HTTP_503 and time.monotonic() < deadline:
+        time.sleep(0.01)
+        resp = client.simulate_get("/ready")
+    assert resp.status == falcon.HTTP_OK
+    assert resp.json["status"] == "ready"
+
+
+def test_segm_get_not_found(client: testing.TestClient):
+    resp = client.simulate_get("/jobs/xyz")
+
+    assert resp.status == falcon.HTTP_404
+
+
+def test_jobs_get(client: testing.TestClient):
+    resp = client.simulate_get("/jobs")
+
+    assert resp.status == falcon.HTTP_OK
+
+    resp_doc = json.loads(resp.content)
+    assert resp_doc["queued"] == 0
+
+
 def test_segm_post_get(client: testing.TestClient):
     image = make_test_image(rgb=True)
     fp = io.BytesIO()
@@ -109,16 +199,217 @@ def test_segm_post_get(client: testing.TestClient):
     resp_doc = json.loads(resp.content)
     assert resp_doc["job_id"], resp_doc
 
-    resp = client.simulate_get(f"/jobs/{resp_doc['job_id']}")
-    assert resp.status == falcon.HTTP_404, resp.text
+    resp = wait_for_job(client, resp_doc["job_id"])
+    assert resp.status == falcon.HTTP_200, resp.text
 
-    time.sleep(1)
+    resp_doc = json.loads(resp.content)
+    assert "objects" in resp_doc, resp_doc
+
+
+def test_segm_post_raw_and_multipart(client: testing.TestClient):
+    fp = io.BytesIO()
+    make_test_image(rgb=True).save(fp, format="PNG")
+    boundary = "xyzBOUNDARYzyx"
+    multipart_body = (
+        f"--{boundary}\r\n"
+        'Content-Disposition: form-data; name="image"; filename="image.png"\r\n'
+        "Content-Type: image/png\r\n\r\n"
+    ).encode() + fp.getvalue() + f"\r\n--{boundary}--\r\n".encode()
+
+    for content_type, body in [
+        ("image/png", fp.getvalue()),
+        (f"multipart/form-data; boundary={boundary}", multipart_body),
+    ]:
+        resp = client.simulate_post("/jobs/", body=body, headers={"content-type": content_type})
+        assert resp.status == falcon.HTTP_CREATED, resp.text
+
+        resp = wait_for_job(client, json.loads(resp.content)["job_id"])
+        assert resp.status == falcon.HTTP_200, resp.text
+
+
+def post_test_job(client: testing.TestClient) -> str:
+    fp = io.BytesIO()
+    make_test_image(rgb=True).save(fp, format="PNG")
+    resp = client.simulate_post("/jobs/", body=fp.getvalue(), headers={"content-type": "image/png"})
+    assert resp.status == falcon.HTTP_CREATED, resp.text
+    return json.loads(resp.content)["job_id"]
 
-    resp = client.simulate_get(f"/jobs/{resp_doc['job_id']}")
+
+def test_segm_get_wait(client: testing.TestClient):
+    job_id = post_test_job(client)
+
+    resp = client.simulate_get(f"/jobs/{job_id}", params={"wait": "5"})
     assert resp.status == falcon.HTTP_200, resp.text
+    assert "objects" in json.loads(resp.content)
+
+    start = time.monotonic()
+    resp = client.simulate_get("/jobs/unknown", params={"wait": "5"})
+    assert resp.status == falcon.HTTP_404
+    assert time.monotonic() - start < 1
+
+
+def test_segm_events(client: testing.TestClient):
+    job_id = post_test_job(client)
 
+    resp = client.simulate_get(f"/jobs/{job_id}/events", params={"wait": "5"})
+
+    assert resp.status == falcon.HTTP_200
+    assert resp.headers["content-type"] == "text/event-stream"
+    event, data = resp.text.strip().split("\n\n")[-1].splitlines()
+    assert event == "event: done"
+    doc = json.loads(data[len("data: "):])
+    assert doc["job_id"] == job_id
+    assert doc["state"] == "done"
+    assert doc["duration"] >= 0
+    assert client.simulate_get("/jobs/unknown/events").status == falcon.HTTP_404
+
+
+class WaitRequest:
+    def __init__(self, wait: float):
+        self._wait = wait
+
+    def get_param_as_float(self, name: str, min_value: float = None) -> float:
+        return self._wait
+
+
+def test_segm_events_async(storage: DataStorage):
+    job_queue = JobQueue()
+    events = JobEvents(poll_interval=10)
+    resource = SegmentationJobEvents(storage, job_queue, events)
+    job_queue.put("streamed")
+
+    async def offload(func, *args):
+        return func(*args)
+
+    async def stream():
+        resp = falcon.Response()
+        await resource.on_get_async(WaitRequest(5), resp, offload, "streamed")
+        chunks = []
+        async for chunk in resp.stream:
+            chunks.append(chunk)
+            if len(chunks) == 1:
+                # Deleted while the stream waits on the event loop
+                job_queue.remove("streamed")
+                events.notify()
+        return chunks
+
+    chunks = asyncio.run(stream())
+
+    assert [chunk.split(b"\n")[0] for chunk in chunks] == [b"event: queued", b"event: deleted"]
+
+
+def test_max_wait_below_worker_timeout(monkeypatch):
+    monkeypatch.setitem(config["segmentation"], "max_wait", "60")
+    assert max_wait_seconds() == 60
+
+    monkeypatch.setenv("WORKER_TIMEOUT", "5")
+    assert max_wait_seconds() == 2.5
+
+
+def test_segm_events_default_wait(storage: DataStorage):
+    job_queue = JobQueue()
+    resource = SegmentationJobEvents(
+        storage, job_queue, JobEvents(), max_wait=25, default_wait=0.05
+    )
+    job_queue.put("long")
+
+    resp = falcon.Response()
+    resource.on_get(WaitRequest(None), resp, "long")
+    start = time.monotonic()
+    chunks = list(resp.stream)
+
+    # Ends while the job is still queued, the client reconnects
+    assert [chunk.split(b"\n")[0] for chunk in chunks] == [b"event: queued"]
+    assert time.monotonic() - start < 1
+
+
+def test_segm_get_failed(client: testing.TestClient, storage: DataStorage):
+    job_id = "failed"
+    storage.save(job_id, make_test_image(rgb=True), output=False)
+    storage.save_state(job_id, JobState("failed", 1.0, 2.0, 2.5, error="Bad image"))
+
+    resp = client.simulate_get(f"/jobs/{job_id}", params={"wait": "5"})
+
+    assert resp.status == falcon.HTTP_422
     resp_doc = json.loads(resp.content)
-    assert "objects" in resp_doc, resp_doc
+    assert resp_doc["state"] == "failed"
+    assert resp_doc["error"] == "Bad image"
+    assert resp_doc["duration"] == 0.5
+
+    assert client.simulate_delete(f"/jobs/{job_id}").status == falcon.HTTP_NO_CONTENT
+    assert client.simulate_get(f"/jobs/{job_id}").status == falcon.HTTP_404
+
+
+def test_segm_post_dedup(storage: DataStorage):
+    config["segmentation"]["dedup"] = "true"
+    config["segmentation"]["dedup_persist"] = "true"
+    try:
+        client = testing.TestClient(get_app())
+    finally:
+        config["segmentation"]["dedup"] = "false"
+        config["segmentation"]["dedup_persist"] = "false"
+
+    first_id = post_test_job(client)
+    first_resp = client.simulate_get(f"/jobs/{first_id}", params={"wait": "5"})
+    assert first_resp.status == falcon.HTTP_200
+
+    second_id = post_test_job(client)
+    assert second_id != first_id
+    # Done without waiting for the worker
+    second_resp = client.simulate_get(f"/jobs/{second_id}")
+    assert second_resp.status == falcon.HTTP_200
+    assert second_resp.content == first_resp.content
+
+    # Deleting one copy keeps the other
+    assert client.simulate_delete(f"/jobs/{first_id}").status == falcon.HTTP_NO_CONTENT
+    assert client.simulate_get(f"/jobs/{second_id}").status == falcon.HTTP_200
+    assert storage.prune_index() == 1
+
+
+def test_segm_get_cached(client: testing.TestClient, storage: DataStorage):
+    job_id = "cached"
+    storage.save(job_id, make_test_image(rgb=True), output=False)
+    storage.save(job_id, [DetectionObject(coords=[(0, 0)])], output=True)
+
+    first_resp = client.simulate_get(f"/jobs/{job_id}")
+    second_resp = client.simulate_get(f"/jobs/{job_id}")
+
+    assert second_resp.status == falcon.HTTP_OK
+    assert second_resp.content == first_resp.content
+
+    resp_doc = json.loads(client.simulate_get("/jobs").content)
+    assert resp_doc["result_cache"]["hits"] == 1
+
+
+def test_segm_delete(client: testing.TestClient, storage: DataStorage):
+    job_id = "deleted"
+    storage.save(job_id, make_test_image(rgb=True), output=False)
+    storage.save(job_id, [DetectionObject(coords=[(0, 0)])], output=True)
+    assert client.simulate_get(f"/jobs/{job_id}").status == falcon.HTTP_OK
+
+    resp = client.simulate_delete(f"/jobs/{job_id}")
+    assert resp.status == falcon.HTTP_NO_CONTENT
+
+    assert client.simulate_get(f"/jobs/{job_id}").status == falcon.HTTP_404
+    assert client.simulate_delete(f"/jobs/{job_id}").status == falcon.HTTP_404
+
+
+def test_segm_get_input_deleted(client: testing.TestClient, storage: DataStorage):
+    # The input is deleted after the output was loaded
+    job_id = "input-deleted"
+    storage.save(job_id, [DetectionObject(coords=[(0, 0)])], output=True)
+
+    assert client.simulate_get(f"/jobs/{job_id}").status == falcon.HTTP_404
+
+
+def test_segm_post_wrong_mode(client: testing.TestClient):
+    fp = io.BytesIO()
+    make_test_image(rgb=False).save(fp, format="PNG")
+    req_doc = {"image": base64.b64encode(fp.getvalue()).decode()}
+
+    resp = client.simulate_post("/jobs/", body=json.dumps(req_doc))
+
+    assert resp.status == falcon.HTTP_400, resp.text
 
 
 def test_api_key_auth_error():
@@ -0,0 +1,67 @@
+import pickle
+
+import numpy as np
+import pytest
+
+from telesto.instance_segmentation import BBox, DetectionObject, rle_encode
+
+
+def test_detection_object_coords():
+    obj = DetectionObject(coords=[(2, 1), (1, 1), (3, 2)])
+
+    assert obj.bbox == BBox(1, 1, 3, 2)
+    assert obj.mask.tolist() == [[True, True, False], [False, False, True]]
+    assert obj.coords == [(1, 1), (2, 1), (3, 2)]
+    assert obj.area == 3
+
+
+def test_detection_object_empty():
+    with pytest.raises(ValueError):
+        DetectionObject(coords=[])
+    with pytest.raises(ValueError):
+        DetectionObject.from_mask(np.zeros((3, 3)))
+
+
+def test_detection_object_from_mask():
+    mask = np.zeros((4, 5), dtype=np.uint8)
+    mask[1, 2] = mask[2, 3] = 1
+
+    obj = DetectionObject.from_mask(mask, offset=(10, 20))
+
+    assert obj == DetectionObject(coords=[(12, 21), (13, 22)])
+
+
+def test_detection_object_from_label_image():
+    labels = np.array([
+        [0, 1, 1, 0],
+        [0, 0, 3, 3],
+        [2, 0, 0, 3],
+    ])
+
+    objects = DetectionObject.from_label_image(labels)
+
+    assert objects == [
+        DetectionObject(coords=[(1, 0), (2, 0)]),
+        DetectionObject(coords=[(0, 2)]),
+        DetectionObject(coords=[(2, 1), (3, 1), (3, 2)]),
+    ]
+
+
+def test_detection_object_from_rle():
+    size = (4, 3)
+    obj = DetectionObject(coords=[(3, 0), (0, 1), (1, 1), (2, 2)])
+
+    assert DetectionObject.from_rle(rle_encode(obj.coords, size), size) == obj
+
+
+def test_detection_object_pickle():
+    obj = DetectionObject(coords=[(0, 0), (1, 1)])
+
+    assert pickle.loads(pickle.dumps(obj)) == obj
+
+
+def test_detection_object_legacy_state():
+    obj = DetectionObject.__new__(DetectionObject)
+    obj.__setstate__({"coords": [(0, 0), (1, 1)], "bbox": BBox(0, 0, 1, 1)})
+
+    assert obj == DetectionObject(coords=[(0, 0), (1, 1)])
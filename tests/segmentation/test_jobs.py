@@ -0,0 +1,189 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+
+import pytest
+
+from telesto.instance_segmentation import jobs
+from telesto.instance_segmentation.jobs import JobEvents, JobQueue, QueueFull, SpoolJobQueue
+
+
+def test_job_queue_fifo():
+    job_queue = JobQueue()
+    for job_id in ["a", "b", "c"]:
+        job_queue.put(job_id)
+
+    assert len(job_queue) == 3
+    assert [job_queue.get() for _ in range(3)] == ["a", "b", "c"]
+    assert len(job_queue) == 0
+
+
+def test_job_queue_full():
+    job_queue = JobQueue(maxsize=2)
+    job_queue.put("a")
+    job_queue.put("b")
+
+    assert job_queue.full()
+    with pytest.raises(QueueFull):
+        job_queue.put("c")
+
+
+def test_job_queue_get_timeout():
+    job_queue = JobQueue()
+
+    assert job_queue.get(timeout=0.01) is None
+
+
+def test_job_queue_get_wakes_on_put():
+    job_queue = JobQueue()
+    result = []
+    thread = threading.Thread(target=lambda: result.append(job_queue.get(timeout=5)))
+    thread.start()
+
+    start = time.monotonic()
+    job_queue.put("a")
+    thread.join()
+
+    assert result == ["a"]
+    assert time.monotonic() - start < 1
+
+
+def test_spool_job_queue_shared(tmp_path):
+    producer = SpoolJobQueue(tmp_path)
+    consumer = SpoolJobQueue(tmp_path)
+    for job_id in ["a", "b"]:
+        producer.put(job_id)
+
+    assert len(consumer) == 2
+    assert consumer.get(timeout=1) == "a"
+    assert producer.get(timeout=1) == "b"
+    assert consumer.get(timeout=0.01) is None
+
+
+def test_spool_job_queue_requeue_running(tmp_path):
+    job_queue = SpoolJobQueue(tmp_path)
+    job_queue.put("a")
+    job_queue.put("b")
+    assert job_queue.get(timeout=1) == "a"
+
+    restarted_queue = SpoolJobQueue(tmp_path)
+
+    assert restarted_queue.requeue_running() == 1
+    assert restarted_queue.get(timeout=1) == "a"
+    restarted_queue.task_done("a")
+    assert restarted_queue.requeue_running() == 0
+
+
+def test_job_queue_get_batch():
+    job_queue = JobQueue()
+    for job_id in ["a", "b", "c"]:
+        job_queue.put(job_id)
+
+    assert job_queue.get_batch(2) == ["a", "b"]
+    assert job_queue.get_batch(2) == ["c"]
+    assert job_queue.get_batch(2, timeout=0.01) == []
+
+
+@pytest.mark.parametrize("spool", [False, True])
+def test_job_queue_find(tmp_path, spool: bool):
+    job_queue = SpoolJobQueue(tmp_path) if spool else JobQueue()
+    for job_id in ["a", "b", "c"]:
+        job_queue.put(job_id)
+
+    assert job_queue.get() == "a"
+
+    running = job_queue.find("a")
+    assert running.state == "running"
+    assert running.started_at >= running.created_at
+    queued = job_queue.find("c")
+    assert (queued.state, queued.position) == ("queued", 1)
+    assert job_queue.find("x") is None
+
+
+def test_job_events_wait_wakes_on_notify():
+    events = JobEvents(poll_interval=10)
+    done = []
+    result = []
+    thread = threading.Thread(
+        target=lambda: result.append(events.wait_for(lambda: bool(done), timeout=5))
+    )
+    thread.start()
+
+    start = time.monotonic()
+    done.append(True)
+    events.notify()
+    thread.join()
+
+    assert result == [True]
+    assert time.monotonic() - start < 1
+
+
+def test_job_events_wait_timeout():
+    events = JobEvents(poll_interval=0.01)
+
+    assert events.wait_for(lambda: None, timeout=0.05) is None
+
+
+def test_job_events_wait_async_wakes_on_notify():
+    events = JobEvents(poll_interval=10)
+    done = []
+
+    def finish():
+        time.sleep(0.05)
+        done.append(True)
+        events.notify()
+
+    async def wait():
+        threading.Thread(target=finish).start()
+        return await events.wait_for_async(lambda: bool(done), timeout=5)
+
+    start = time.monotonic()
+    assert asyncio.run(wait()) is True
+    assert time.monotonic() - start < 1
+    assert not events._async_waiters
+
+
+def test_job_events_wait_async_timeout():
+    events = JobEvents(poll_interval=0.01)
+
+    assert asyncio.run(events.wait_for_async(lambda: None, timeout=0.05)) is None
+
+
+def finish_job(done_path: str, events_path: str):
+    with open(done_path, "w"):
+        pass
+    JobEvents(events_path).notify()
+
+
+def test_job_events_wake_other_processes(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, "RECHECK_INTERVAL", 60)
+    events = JobEvents(tmp_path / "events", poll_interval=10)
+    events.listen()
+    done_path = tmp_path / "done"
+    process = multiprocessing.get_context("spawn").Process(
+        target=finish_job, args=(str(done_path), str(events.path))
+    )
+    started = []
+
+    # The job is finished after the first check
+    def finished() -> bool:
+        if not started:
+            process.start()
+            started.append(time.monotonic())
+        return done_path.exists()
+
+    assert events.wait_for(finished, timeout=10) is True
+    # Woken by the other process, not by the storage check after RECHECK_INTERVAL
+    assert time.monotonic() - started[0] < 30
+    process.join()
+
+
+def test_job_events_remove_fifos_without_reader(tmp_path):
+    events = JobEvents(tmp_path)
+    os.mkfifo(tmp_path / "123-456")
+
+    events.notify()
+
+    assert os.listdir(tmp_path) == []
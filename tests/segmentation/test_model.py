@@ -1,11 +1,24 @@
+import multiprocessing
+import sys
+import threading
+import time
+import types
 from typing import List
 
 import PIL.Image
 import numpy as np
 import pytest
 
-from telesto.instance_segmentation import DataStorage, DetectionObject
-from telesto.instance_segmentation.model import SegmentationModelBase
+from telesto.instance_segmentation import BBox, DataStorage, DetectionObject, executor
+from telesto.instance_segmentation.executor import (
+    SegmentationExecutor,
+    WorkerReadiness,
+    process_jobs,
+    run_exclusively,
+    run_worker,
+)
+from telesto.instance_segmentation.jobs import JobQueue, SpoolJobQueue
+from telesto.instance_segmentation.model import JobInputNotFound, SegmentationModelBase
 
 
 @pytest.fixture(scope="session")
@@ -41,3 +54,284 @@ def test_segmentation_model_base_call(storage: DataStorage):
 
     objects = storage.load(job_id, output=True)
     assert objects == [test_object]
+
+
+class BatchSegmentationModelTest(SegmentationModelTest):
+    batch_size = 4
+
+    def __init__(self, storage: DataStorage):
+        super().__init__(storage)
+        self.batches = []
+
+    def predict_batch(self, inputs: List[np.ndarray]) -> List[List[DetectionObject]]:
+        self.batches.append(len(inputs))
+        return [[DetectionObject(coords=[(0, int(input[0, 0]))])] for input in inputs]
+
+
+def test_segmentation_model_base_process_batch(storage: DataStorage):
+    model = BatchSegmentationModelTest(storage)
+
+    job_ids = ["b1", "b2", "b3"]
+    for i, job_id in enumerate(job_ids):
+        image = PIL.Image.fromarray(np.full((3, 2), i, dtype=np.uint8))
+        storage.save(job_id, image, output=False)
+
+    model.process_batch(job_ids)
+
+    assert model.batches == [3]
+    for i, job_id in enumerate(job_ids):
+        assert storage.load(job_id, output=True) == [DetectionObject(coords=[(0, i)])]
+
+
+class ScaledSegmentationModelTest(SegmentationModelTest):
+    input_size = (4, 2)
+    input_mode = "L"
+
+    def __init__(self, storage: DataStorage):
+        super().__init__(storage)
+        self.inputs = []
+
+    def predict(self, input: np.ndarray) -> List[DetectionObject]:
+        self.inputs.append(input)
+        return [DetectionObject(coords=[(1, 0), (2, 0)])]
+
+
+def test_segmentation_model_base_input_size(storage: DataStorage):
+    model = ScaledSegmentationModelTest(storage)
+
+    job_id = "scaled"
+    image = PIL.Image.fromarray(np.zeros((4, 8, 3), dtype=np.uint8))
+    storage.save(job_id, image, output=False)
+
+    model(job_id)
+
+    assert model.inputs[0].shape == (2, 4)
+    objects = storage.load(job_id, output=True)
+    assert objects[0].bbox == BBox(2, 0, 5, 1)
+    assert objects[0].area == 8
+
+
+def test_segmentation_model_base_input_deleted(storage: DataStorage, monkeypatch):
+    model = ScaledSegmentationModelTest(storage)
+    job_id = "scaled-deleted"
+    storage.save(job_id, PIL.Image.fromarray(np.zeros((4, 8, 3), dtype=np.uint8)), output=False)
+    # Deleted while the model was running
+    monkeypatch.setattr(storage, "input_size", lambda job_id: None)
+
+    with pytest.raises(JobInputNotFound):
+        model.process_batch([job_id])
+    assert storage.load(job_id, output=True) is None
+
+
+class TiledSegmentationModelTest(SegmentationModelTest):
+    tile_size = (4, 4)
+    tile_overlap = 2
+    batch_size = 2
+
+    def __init__(self, storage: DataStorage):
+        super().__init__(storage)
+        self.inputs = []
+
+    def predict(self, input: np.ndarray) -> List[DetectionObject]:
+        self.inputs.append(input)
+        return DetectionObject.from_label_image(input)
+
+
+def test_segmentation_model_base_tiles(storage: DataStorage):
+    model = TiledSegmentationModelTest(storage)
+
+    job_id = "tiled"
+    labels = np.zeros((6, 8), dtype=np.uint8)
+    labels[1:4, 2:6] = 1
+    labels[5, 7] = 2
+    storage.save(job_id, PIL.Image.fromarray(labels), output=False)
+
+    model(job_id)
+
+    assert len(model.inputs) == 6
+    assert all(input.shape == (4, 4) and input.base is not None for input in model.inputs)
+    objects = storage.load(job_id, output=True)
+    assert objects == DetectionObject.from_label_image(labels)
+
+
+def test_segmentation_model_base_warmup(storage: DataStorage):
+    model = ScaledSegmentationModelTest(storage)
+
+    model.warmup()
+
+    assert model.inputs[0].shape == (2, 4)
+
+
+class FailingSegmentationModelTest(BatchSegmentationModelTest):
+    def predict_batch(self, inputs: List[np.ndarray]) -> List[List[DetectionObject]]:
+        if any(input[0, 0] == 255 for input in inputs):
+            raise ValueError("Bad image")
+        return super().predict_batch(inputs)
+
+
+def save_failing_jobs(storage: DataStorage, job_ids: List[str]):
+    for job_id in job_ids:
+        value = 255 if job_id.startswith("bad") else 1
+        storage.save(job_id, PIL.Image.fromarray(np.full((3, 2), value, dtype=np.uint8)), False)
+
+
+def test_process_jobs_isolates_failures(storage: DataStorage):
+    model = FailingSegmentationModelTest(storage)
+    job_ids = ["good1", "bad1", "good2"]
+    save_failing_jobs(storage, job_ids)
+
+    results = process_jobs(model, job_ids)
+
+    assert model.batches == [1, 1]
+    assert results[0] == results[2] == [DetectionObject(coords=[(0, 1)])]
+    assert isinstance(results[1], ValueError)
+
+
+def test_run_worker_reports_failures(storage: DataStorage, monkeypatch):
+    module = types.ModuleType("model")
+    module.SegmentationModel = FailingSegmentationModelTest
+    monkeypatch.setitem(sys.modules, "model", module)
+
+    job_queue = JobQueue()
+    job_ids = ["bad2", "good3"]
+    save_failing_jobs(storage, job_ids)
+    for job_id in job_ids:
+        job_queue.put(job_id)
+
+    finished = []
+    stop = threading.Event()
+    thread = threading.Thread(
+        target=run_worker,
+        args=(storage, job_queue),
+        kwargs={
+            "stopped": stop.is_set,
+            "on_done": lambda job_id, objects: finished.append(job_id),
+            "on_failed": lambda job_id, error: finished.append(job_id),
+        },
+    )
+    thread.start()
+    while len(finished) < 2 and thread.is_alive():
+        thread.join(0.01)
+    stop.set()
+    thread.join()
+
+    # The worker survives the failed job and processes the next one
+    assert finished == job_ids
+    failed = storage.load_state("bad2")
+    assert failed.state == "failed"
+    assert failed.error == "Bad image"
+    done = storage.load_state("good3")
+    assert done.state == "done"
+    assert done.duration >= 0
+
+
+class StoppingSegmentationModelTest(SegmentationModelTest):
+    def __init__(self, storage: DataStorage, stop: threading.Event):
+        super().__init__(storage)
+        self.stop = stop
+
+    def process_batch(self, job_ids: List[str]) -> List[List[DetectionObject]]:
+        # The parent of a worker process exits while the batch runs
+        self.stop.set()
+        return super().process_batch(job_ids)
+
+
+def test_run_worker_stopped_during_batch(storage: DataStorage, tmp_path):
+    job_queue = SpoolJobQueue(tmp_path)
+    save_failing_jobs(storage, ["orphaned"])
+    job_queue.put("orphaned")
+
+    stop = threading.Event()
+    run_worker(
+        storage,
+        job_queue,
+        stopped=stop.is_set,
+        model_wrapper=StoppingSegmentationModelTest(storage, stop),
+    )
+
+    # Left to the executor which takes over
+    assert storage.load_state("orphaned") is None
+    assert job_queue.is_running("orphaned")
+
+
+def test_run_worker_skips_deleted_jobs(storage: DataStorage):
+    job_queue = JobQueue()
+    save_failing_jobs(storage, ["good4"])
+    job_queue.put("deleted1")
+    job_queue.put("good4")
+
+    finished = []
+    stop = threading.Event()
+    run_worker(
+        storage,
+        job_queue,
+        stopped=stop.is_set,
+        on_done=lambda job_id, objects: finished.append(job_id) or stop.set(),
+        model_wrapper=BatchSegmentationModelTest(storage),
+    )
+
+    assert finished == ["good4"]
+    assert storage.load_state("deleted1") is None
+    assert not job_queue.is_running("deleted1")
+
+
+class BrokenSegmentationModelTest(SegmentationModelTest):
+    def predict(self, input: np.ndarray) -> List[DetectionObject]:
+        raise ValueError("Broken model")
+
+
+def test_run_worker_warmup_failure(tmp_path):
+    storage = DataStorage(tmp_path)
+    readiness = WorkerReadiness(storage)
+    reported = []
+
+    def stopped() -> bool:
+        reported.append((readiness.ready, readiness.reason))
+        return True
+
+    run_worker(
+        storage, JobQueue(), stopped=stopped, model_wrapper=BrokenSegmentationModelTest(storage)
+    )
+
+    assert reported == [(False, "segmentation model warmup failed: Broken model")]
+
+
+def test_executor_stops_restarting_failing_processes(tmp_path):
+    storage = DataStorage(tmp_path / "storage")
+    executor = SegmentationExecutor(storage, SpoolJobQueue(tmp_path / "queue"), mode="process")
+    executor.restart_delay = 0.1
+    executor.max_failures = 3
+    started = []
+
+    def start_process() -> multiprocessing.Process:
+        process = multiprocessing.get_context("spawn").Process(target=sys.exit, args=(3,))
+        process.start()
+        # Left by a worker which was killed after it got ready
+        (storage.path / "ready-workers").mkdir(parents=True, exist_ok=True)
+        (storage.path / "ready-workers" / f"{process.pid}-1").write_text("")
+        started.append(time.monotonic())
+        return process
+
+    executor._start_process = start_process
+    executor._supervise_processes()
+
+    assert len(started) == 3
+    # Restarted after 0.1 s, then after 0.2 s
+    assert started[1] - started[0] >= 0.1
+    assert started[2] - started[1] >= 0.2
+    readiness = WorkerReadiness(storage)
+    assert not readiness.ready
+    assert readiness.reason == (
+        "segmentation worker process failed 3 times in a row, last exit code 3"
+    )
+
+
+@pytest.mark.parametrize("has_fcntl", [True, False])
+def test_run_exclusively(tmp_path, monkeypatch, has_fcntl: bool):
+    if not has_fcntl:
+        monkeypatch.setattr(executor, "fcntl", None)
+    runs = []
+
+    run_exclusively(tmp_path / "executor.lock", lambda: runs.append(1))
+
+    assert runs == [1]
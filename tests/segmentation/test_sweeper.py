@@ -0,0 +1,93 @@
+import os
+import time
+
+import pytest
+
+from telesto.instance_segmentation import DONE, DataStorage, DetectionObject, JobState
+from telesto.instance_segmentation.sweeper import StorageSweeper
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return DataStorage(tmp_path)
+
+
+def save_job(storage: DataStorage, gid: str, age: float, finished: bool = True):
+    storage.save_encoded(gid, b"0" * 100)
+    if finished:
+        storage.save(gid, [DetectionObject(coords=[(0, 0)])], output=True)
+
+    mtime = time.time() - age
+    for path in storage.path.glob(f"{gid}-*"):
+        os.utime(path, (mtime, mtime))
+
+
+def test_sweeper_ttl(storage: DataStorage):
+    save_job(storage, "old", age=100)
+    save_job(storage, "new", age=10)
+    save_job(storage, "unfinished", age=100, finished=False)
+    deleted = []
+
+    sweeper = StorageSweeper(storage, ttl=50, on_delete=deleted.append)
+
+    assert sweeper.sweep() == 1
+    assert deleted == ["old"]
+    assert set(storage.usage()) == {"new", "unfinished"}
+
+
+def test_sweeper_max_bytes(storage: DataStorage):
+    for i, gid in enumerate(["a", "b", "c"]):
+        save_job(storage, gid, age=100 - i)
+    job_bytes = storage.usage()["a"].nbytes
+
+    sweeper = StorageSweeper(storage, max_bytes=2 * job_bytes)
+
+    assert sweeper.sweep() == 1
+    assert set(storage.usage()) == {"b", "c"}
+    assert sweeper.evictions == 1
+
+
+def test_sweeper_touched_job_is_kept(storage: DataStorage):
+    save_job(storage, "read", age=100)
+    storage.touch("read")
+
+    sweeper = StorageSweeper(storage, ttl=50)
+
+    assert sweeper.sweep() == 0
+
+
+
+def save_linked_job(storage: DataStorage, source: str, gid: str, age: float):
+    storage.copy_job(source, gid)
+    storage.save_state(gid, JobState(DONE))
+    mtime = time.time() - age
+    os.utime(storage.path / f"{gid}-state.json", (mtime, mtime))
+
+
+def test_sweeper_max_bytes_linked_jobs(storage: DataStorage):
+    save_job(storage, "source", age=100)
+    job_bytes = storage.usage()["source"].nbytes
+    save_linked_job(storage, "source", "copy", age=90)
+    save_job(storage, "other", age=10)
+
+    # The files linked to the copy are counted once
+    assert StorageSweeper(storage, max_bytes=2 * job_bytes + 500).sweep() == 0
+
+    # Deleting the source doesn't free its files, they are freed with the copy
+    deleted = []
+    sweeper = StorageSweeper(storage, max_bytes=2 * job_bytes, on_delete=deleted.append)
+    assert sweeper.sweep() == 2
+    assert deleted == ["source", "copy"]
+
+
+def test_sweeper_touched_linked_job(storage: DataStorage):
+    save_job(storage, "source", age=100)
+    save_linked_job(storage, "source", "copy", age=90)
+
+    storage.touch("copy")
+    deleted = []
+    sweeper = StorageSweeper(storage, ttl=50, on_delete=deleted.append)
+
+    # Reading the copy doesn't extend the lifetime of the source
+    assert sweeper.sweep() == 1
+    assert deleted == ["source"]
@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+from telesto.instance_segmentation import DetectionObject
+from telesto.instance_segmentation.tiling import merge_tile_objects, shift_objects, tile_grid
+
+
+def test_tile_grid():
+    tiles = tile_grid((10, 5), tile_size=(6, 6), overlap=2)
+
+    assert tiles == [(0, 0, 6, 5), (4, 0, 10, 5)]
+
+
+def test_tile_grid_invalid_overlap():
+    with pytest.raises(ValueError):
+        tile_grid((10, 10), tile_size=(4, 4), overlap=4)
+
+
+def test_merge_tile_objects():
+    labels = np.zeros((4, 10), dtype=np.uint8)
+    labels[1:3, 3:7] = 1  # crosses the border of the first tile
+    labels[0, 5] = 2  # inside the overlap
+    labels[3, 0] = 3
+    tiles = tile_grid((10, 4), tile_size=(6, 4), overlap=2)
+
+    tile_objects = [
+        shift_objects(DetectionObject.from_label_image(labels[y1:y2, x1:x2]), (x1, y1))
+        for x1, y1, x2, y2 in tiles
+    ]
+    objects = merge_tile_objects(tile_objects, tiles)
+
+    def position(obj: DetectionObject):
+        return obj.bbox.y1, obj.bbox.x1
+
+    expected = DetectionObject.from_label_image(labels)
+    assert sorted(objects, key=position) == sorted(expected, key=position)
@@ -1,4 +1,6 @@
-from telesto.instance_segmentation import rle_encode
+import numpy as np
+
+from telesto.instance_segmentation import DetectionObject, rle_encode, rle_encode_objects
 
 
 def test_rle_encode_1_3_lines():
@@ -54,3 +56,39 @@ def test_rle_encode_two_pixels():
     rle_str = rle_encode(coords, size)
 
     assert rle_str == "0 1 8 1"
+
+
+def rle_encode_reference(coords, image_size):
+    w, h = image_size
+    image = np.zeros(h * w + 2)
+    for x, y in coords:
+        image[1 + y * w + x] = 1
+
+    starts = ((image[:-1] == 0) & (image[1:] == 1)).nonzero()[0]
+    ends = ((image[:-1] == 1) & (image[1:] == 0)).nonzero()[0]
+    return " ".join(f"{st} {l}" for st, l in zip(starts, ends - starts))
+
+
+def test_rle_encode_row_wrap():
+    size = (3, 3)
+    # XY pairs, the run continues from the end of row 0 to the start of row 1
+    coords = [(2, 0), (0, 1), (1, 1)]
+
+    rle_str = rle_encode(coords, size)
+
+    assert rle_str == "2 3"
+
+
+def test_rle_encode_objects_matches_reference():
+    rng = np.random.RandomState(0)
+    size = (17, 11)
+    objects = []
+    for _ in range(20):
+        mask = rng.rand(size[1], size[0]) > 0.7
+        ys, xs = mask.nonzero()
+        objects.append(DetectionObject(coords=list(zip(xs.tolist(), ys.tolist()))))
+
+    rle_strs = rle_encode_objects(objects, size)
+
+    assert rle_strs == [rle_encode_reference(obj.coords, size) for obj in objects]
+    assert rle_strs == [rle_encode(obj.coords, size) for obj in objects]
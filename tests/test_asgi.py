@@ -0,0 +1,154 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+
+from telesto.asgi import AsyncResource, ConcurrencyLimit
+from telesto.config import config
+from telesto.metrics import stage
+from telesto.models import ModelType
+from telesto.profiling import end_trace, start_trace
+
+os.environ["USE_FALLBACK_MODEL"] = "1"
+
+
+class Stream:
+    def __init__(self, body: bytes):
+        self._body = body
+
+    async def read(self) -> bytes:
+        return self._body
+
+
+def make_request(body: bytes = b"") -> SimpleNamespace:
+    return SimpleNamespace(stream=Stream(body), content_type="application/json")
+
+
+def make_response() -> SimpleNamespace:
+    return SimpleNamespace(data=None, stream=None)
+
+
+class Resource:
+    async_inline = ("on_get",)
+    async_limited = ("on_post",)
+
+    def __init__(self):
+        self.threads = {}
+        self.running = 0
+        self.max_running = 0
+        self._lock = threading.Lock()
+
+    def on_get(self, req, resp):
+        self.threads["get"] = threading.get_ident()
+
+    def on_post(self, req, resp):
+        with self._lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        with stage("predict"):
+            time.sleep(0.02)
+        resp.data = req.bounded_stream.read()
+        with self._lock:
+            self.running -= 1
+
+    def on_patch(self, req, resp):
+        resp.stream = iter([b"a", b"b"])
+
+    def on_delete(self, req, resp, job_id):
+        resp.data = job_id.encode()
+        self.threads["delete"] = threading.get_ident()
+
+
+def test_async_resource():
+    resource = Resource()
+    executor = ThreadPoolExecutor(max_workers=8)
+    async_resource = AsyncResource(resource, executor, ConcurrencyLimit(2))
+
+    async def serve():
+        trace, token = start_trace()
+        resps = [make_response() for _ in range(6)]
+        await asyncio.gather(
+            *(async_resource.on_post(make_request(b"%d" % i), resp) for i, resp in enumerate(resps))
+        )
+        end_trace(token)
+
+        delete_resp = make_response()
+        await async_resource.on_delete(make_request(), delete_resp, job_id="abc")
+        await async_resource.on_get(make_request(), make_response())
+
+        stream_resp = make_response()
+        await async_resource.on_patch(make_request(), stream_resp)
+        chunks = [chunk async for chunk in stream_resp.stream]
+        return trace, resps, delete_resp, chunks
+
+    trace, resps, delete_resp, chunks = asyncio.run(serve())
+    executor.shutdown()
+
+    assert [resp.data for resp in resps] == [b"%d" % i for i in range(6)]
+    assert resource.max_running == 2
+    # Stages recorded in the executor threads are added to the trace of the request
+    assert [name for name, _ in trace.stages] == ["predict"] * 6
+
+    assert delete_resp.data == b"abc"
+    # Sync iterators are served as async ones
+    assert chunks == [b"a", b"b"]
+    assert resource.threads["get"] == threading.get_ident()
+    assert resource.threads["delete"] != threading.get_ident()
+
+
+class WaitingResource:
+    def __init__(self):
+        self.released = None
+
+    def on_get(self, req, resp):
+        raise AssertionError("The async variant is served")
+
+    async def on_get_async(self, req, resp, offload):
+        await self.released.wait()
+        resp.data = await offload(threading.get_ident)
+
+    def on_delete(self, req, resp):
+        resp.data = b"deleted"
+
+
+def test_async_resource_waits_on_event_loop():
+    resource = WaitingResource()
+    executor = ThreadPoolExecutor(max_workers=1)
+    async_resource = AsyncResource(resource, executor, ConcurrencyLimit(0))
+
+    async def serve():
+        resource.released = asyncio.Event()
+        waiting = [make_response() for _ in range(2)]
+        waits = asyncio.gather(*(async_resource.on_get(make_request(), r) for r in waiting))
+
+        # The waiting requests don't hold the only pool thread
+        delete_resp = make_response()
+        await asyncio.wait_for(async_resource.on_delete(make_request(), delete_resp), 1)
+        resource.released.set()
+        await waits
+        return waiting, delete_resp
+
+    waiting, delete_resp = asyncio.run(serve())
+    executor.shutdown()
+
+    assert delete_resp.data == b"deleted"
+    assert all(resp.data != threading.get_ident() for resp in waiting)
+
+
+def test_asgi_app():
+    testing = pytest.importorskip("falcon.testing")
+    pytest.importorskip("falcon.asgi")
+    from telesto.asgi import get_asgi_app
+
+    config["common"]["model_type"] = ModelType.CLASSIFICATION.value
+    config["common"]["api_key"] = ""
+
+    client = testing.TestClient(get_asgi_app())
+    resp = client.simulate_get("/")
+
+    assert resp.status_code == 200
+    assert resp.json["status"] == "ok"
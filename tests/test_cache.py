@@ -0,0 +1,58 @@
+from telesto.cache import LRUCache, content_key, model_identity
+
+
+def test_lru_cache_get_put():
+    cache = LRUCache()
+    cache.put("a", b"123")
+
+    assert cache.get("a") == b"123"
+    assert cache.get("b") is None
+    assert cache.stats() == {"entries": 1, "bytes": 3, "hits": 1, "misses": 1}
+
+
+def test_lru_cache_max_entries():
+    cache = LRUCache(max_entries=2)
+    cache.put("a", b"1")
+    cache.put("b", b"2")
+    cache.get("a")
+    cache.put("c", b"3")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == b"1"
+    assert cache.get("c") == b"3"
+
+
+def test_lru_cache_max_bytes():
+    cache = LRUCache(max_bytes=5)
+    cache.put("a", b"123")
+    cache.put("b", b"45")
+    cache.put("c", b"6")
+
+    assert cache.get("a") is None
+    assert cache.nbytes == 3
+
+    cache.put("d", b"123456")
+    assert cache.get("d") is None
+    assert len(cache) == 2
+
+
+def test_lru_cache_pop():
+    cache = LRUCache()
+    cache.put("a", b"123")
+
+    assert cache.pop("a") == b"123"
+    assert cache.pop("a") is None
+    assert cache.nbytes == 0
+
+
+def test_content_key():
+    class Model:
+        version = "2"
+
+    model_id = model_identity(Model)
+    assert model_id.endswith("Model:2")
+
+    key = content_key(b"image", model_id)
+    assert key == content_key(memoryview(b"image"), model_id)
+    assert key != content_key(b"image2", model_id)
+    assert key != content_key(b"image", "other")
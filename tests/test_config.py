@@ -0,0 +1,50 @@
+import configparser
+import subprocess
+import sys
+
+import pytest
+
+from telesto.config import LazyConfigParser
+
+
+def test_lazy_config(tmp_path, monkeypatch):
+    (tmp_path / "default.ini").write_text("[common]\nname = default\nworkers = 2\n")
+    (tmp_path / "live.ini").write_text("[common]\nname = live\n")
+    parser = LazyConfigParser(["default.ini", "live.ini", "missing.ini"])
+
+    # The files are read from the working directory on first use
+    monkeypatch.chdir(tmp_path)
+    assert parser.sections() == ["common"]
+    assert parser.get("common", "name") == "live"
+    assert parser.getint("common", "workers") == 2
+    assert parser["common"]["workers"] == "2"
+
+    (tmp_path / "live.ini").write_text("[common]\nname = changed\n")
+    assert parser.get("common", "name") == "live"
+
+
+def test_lazy_imports():
+    code = (
+        "import sys, telesto.app\n"
+        "from telesto.config import config\n"
+        "print(config._loaded, sorted(name for name in sys.modules if name in "
+        "{'numpy', 'PIL', 'telesto.classification', 'telesto.instance_segmentation'}))"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    ).stdout
+
+    assert output.strip() == "False []"
+
+
+def test_lazy_config_error(tmp_path, monkeypatch):
+    (tmp_path / "default.ini").write_text("[common\nname = default\n")
+    parser = LazyConfigParser(["default.ini"])
+    monkeypatch.chdir(tmp_path)
+
+    for _ in range(2):
+        with pytest.raises(configparser.Error):
+            parser.get("common", "name", fallback="fallback")
+
+    (tmp_path / "default.ini").write_text("[common]\nname = default\n")
+    assert parser.get("common", "name", fallback="fallback") == "default"
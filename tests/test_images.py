@@ -0,0 +1,92 @@
+import io
+from typing import List
+
+import numpy as np
+import PIL.Image
+import pytest
+
+from telesto.images import ImageDecoder, prepare_image
+
+
+def make_image_files(shapes: List[tuple], format: str = "PNG") -> List[io.BytesIO]:
+    rng = np.random.RandomState(0)
+    files = []
+    for shape in shapes:
+        fp = io.BytesIO()
+        PIL.Image.fromarray(rng.randint(0, 256, size=shape, dtype=np.uint8)).save(fp, format)
+        fp.seek(0)
+        files.append(fp)
+    return files
+
+
+def decode_reference(files: List[io.BytesIO]) -> List[np.ndarray]:
+    arrays = [np.array(PIL.Image.open(fp)) for fp in files]
+    for fp in files:
+        fp.seek(0)
+    return arrays
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_decode_list(workers: int):
+    files = make_image_files([(4, 6, 3), (5, 5), (8, 2, 3)])
+    expected = decode_reference(files)
+
+    arrays = ImageDecoder(workers=workers, stack=True)(files)
+
+    assert isinstance(arrays, list)
+    assert all(np.array_equal(a, b) for a, b in zip(arrays, expected))
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_decode_stacked(workers: int):
+    files = make_image_files([(4, 6, 3)] * 5)
+    expected = decode_reference(files)
+
+    batch = ImageDecoder(workers=workers, stack=True)(files)
+
+    assert isinstance(batch, np.ndarray) and batch.shape == (5, 4, 6, 3)
+    assert np.array_equal(batch, np.stack(expected))
+
+
+def test_decode_invalid_image():
+    with pytest.raises(OSError):
+        ImageDecoder(workers=2)([io.BytesIO(b"abc"), io.BytesIO(b"def")])
+
+
+def test_prepare_image_jpeg_draft():
+    fp = make_image_files([(1600, 2400, 3)], format="JPEG")[0]
+
+    image = PIL.Image.open(fp)
+    prepared = prepare_image(image, size=(224, 224), mode="L")
+
+    assert prepared.size == (224, 224) and prepared.mode == "L"
+    # Decoded at 1/4 scale, the largest one which keeps the image larger than the requested size
+    assert image.size == (600, 400)
+
+
+def test_prepare_image_png():
+    fp = make_image_files([(40, 60)])[0]
+
+    prepared = prepare_image(PIL.Image.open(fp), size=(15, 10), mode="RGB")
+
+    assert prepared.size == (15, 10) and prepared.mode == "RGB"
+
+
+@pytest.mark.parametrize("mode", [None, "L"])
+def test_prepare_image_16_bit(mode: str):
+    fp = io.BytesIO()
+    PIL.Image.fromarray(np.full((40, 60), 1000, dtype=np.uint16)).save(fp, "PNG")
+    fp.seek(0)
+
+    prepared = prepare_image(PIL.Image.open(fp), size=(15, 10), mode=mode)
+
+    assert prepared.size == (15, 10) and prepared.mode == (mode or "I;16")
+    assert np.array(prepared).max() == (1000 if mode is None else 255)
+
+
+def test_decode_stacked_with_size():
+    files = make_image_files([(4, 6, 3), (10, 8), (7, 7, 3)])
+
+    batch = ImageDecoder(stack=True, size=(5, 3), mode="RGB")(files)
+
+    assert isinstance(batch, np.ndarray) and batch.shape == (3, 3, 5, 3)
@@ -0,0 +1,66 @@
+import multiprocessing
+import os
+from pathlib import Path
+
+import falcon
+from falcon import testing
+
+from telesto.app import get_app
+from telesto.config import config
+from telesto.metrics import Counter, Histogram, MetricsRegistry
+from telesto.models import ModelType
+
+os.environ["USE_FALLBACK_MODEL"] = "1"
+
+
+def test_render():
+    registry = MetricsRegistry()
+    counter = Counter("requests_total", "Requests", ("route",), registry=registry)
+    histogram = Histogram("latency_seconds", "Latency", buckets=(0.1, 1), registry=registry)
+
+    counter.inc('/a"b')
+    counter.inc('/a"b', amount=2)
+    for value in [0.05, 0.5, 5]:
+        histogram.observe(value)
+    registry.add_gauge("queue_depth", "Queued jobs", lambda: 3)
+
+    lines = registry.render().decode().splitlines()
+
+    assert 'requests_total{route="/a\\"b"} 3' in lines
+    assert 'latency_seconds_bucket{le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{le="1"} 2' in lines
+    assert 'latency_seconds_bucket{le="+Inf"} 3' in lines
+    assert "latency_seconds_sum 5.55" in lines
+    assert "latency_seconds_count 3" in lines
+    assert "queue_depth 3" in lines
+
+
+def test_merge_processes(tmp_path: Path):
+    registry = MetricsRegistry()
+    counter = Counter("jobs_total", "Jobs", registry=registry)
+    registry.start(str(tmp_path))
+    counter.inc()
+
+    def child():
+        # Starts from zero, the parent value is not counted twice
+        counter.inc(amount=2)
+        registry.flush()
+
+    process = multiprocessing.get_context("fork").Process(target=child)
+    process.start()
+    process.join()
+
+    assert "jobs_total 3" in registry.render().decode().splitlines()
+
+
+def test_metrics_endpoint():
+    config["common"]["model_type"] = ModelType.CLASSIFICATION.value
+    config["common"]["api_key"] = ""
+
+    client = testing.TestClient(get_app())
+    client.simulate_get("/")
+    resp = client.simulate_get("/metrics")
+
+    assert resp.status == falcon.HTTP_OK
+    assert resp.headers["content-type"].startswith("text/plain")
+    assert 'telesto_requests_total{method="GET",route="/",status="200"}' in resp.text
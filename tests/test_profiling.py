@@ -0,0 +1,66 @@
+import os
+import time
+from pathlib import Path
+
+from falcon import testing
+
+from telesto.app import get_app
+from telesto.config import config
+from telesto.metrics import stage
+from telesto.models import ModelType
+from telesto.profiling import Profiler, end_trace, start_trace
+
+os.environ["USE_FALLBACK_MODEL"] = "1"
+
+
+def test_trace_stages():
+    trace, token = start_trace()
+    with stage("decode"):
+        pass
+    with stage("predict"):
+        pass
+    end_trace(token)
+
+    # Stages outside of a trace are not recorded
+    with stage("serialize"):
+        pass
+
+    assert [name for name, _ in trace.stages] == ["decode", "predict"]
+    header = trace.server_timing(0.0125)
+    assert header.startswith("decode;dur=")
+    assert header.endswith("total;dur=12.50")
+
+
+def test_profiler_saves_slow_calls(tmp_path: Path):
+    profiler = Profiler(str(tmp_path), sample_rate=1, slow_seconds=0.01, max_profiles=2)
+
+    profiler.finish(profiler.start(), 0.001, "GET /")
+    assert list(tmp_path.glob("*.prof")) == []
+
+    for _ in range(3):
+        profile = profiler.start()
+        time.sleep(0.001)
+        profiler.finish(profile, 0.02, "POST /jobs")
+
+    profiles = list(tmp_path.glob("*.prof"))
+    assert len(profiles) == 2
+    assert all("POST_jobs-20ms" in path.name for path in profiles)
+
+
+def test_server_timing_header(tmp_path: Path):
+    config["common"]["model_type"] = ModelType.CLASSIFICATION.value
+    config["common"]["api_key"] = ""
+    config["profiling"] = {
+        "enabled": "true",
+        "dir": str(tmp_path),
+        "sample_rate": "1",
+        "slow_ms": "0",
+    }
+    try:
+        client = testing.TestClient(get_app())
+    finally:
+        config["profiling"]["enabled"] = "false"
+    resp = client.simulate_get("/")
+
+    assert "total;dur=" in resp.headers["server-timing"]
+    assert len(list(tmp_path.glob("*-GET-*.prof"))) == 1
@@ -0,0 +1,29 @@
+import json
+
+import pytest
+
+from telesto.serialization import PreEncoded, available_serializers, get_serializer
+
+
+@pytest.mark.parametrize("name", list(available_serializers()))
+def test_serializers_roundtrip(name: str):
+    doc = {"objects": [{"x": 1, "mask": "0 5 10 2"}], "prob": 0.12345, "name": "Kätzchen/1"}
+
+    body = get_serializer(name)(doc)
+
+    assert isinstance(body, bytes)
+    assert json.loads(body) == doc
+
+
+def test_serializer_not_available():
+    with pytest.raises(ValueError):
+        get_serializer("unknown")
+
+
+def test_pre_encoded():
+    calls = []
+    body = PreEncoded(lambda: calls.append(1) or {"status": "ok"})
+
+    assert json.loads(body()) == {"status": "ok"}
+    assert body() is body()
+    assert len(calls) == 1
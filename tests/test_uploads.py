@@ -0,0 +1,67 @@
+import io
+
+import pytest
+
+from telesto import uploads
+from telesto.uploads import parse_content_type, read_image_uploads
+
+
+def make_multipart(fields, boundary="xyzBOUNDARYzyx"):
+    body = b""
+    for name, content in fields:
+        body += (
+            f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="{name}"; filename="{name}.png"\r\n'
+            "Content-Type: image/png\r\n\r\n"
+        ).encode() + content + b"\r\n"
+    body += f"--{boundary}--\r\n".encode()
+    return f"multipart/form-data; boundary={boundary}", body
+
+
+def test_parse_content_type():
+    media_type, params = parse_content_type('Multipart/Form-Data; boundary="abc"')
+
+    assert media_type == "multipart/form-data"
+    assert params == {"boundary": "abc"}
+
+
+def test_read_multipart(monkeypatch):
+    # Small chunks make the delimiter cross chunk borders
+    monkeypatch.setattr(uploads, "CHUNK_SIZE", 7)
+    contents = [b"first\r\n--xyz", b"", bytes(range(256)) * 10]
+    content_type, body = make_multipart(
+        [
+            ("images", contents[0]),
+            ("other", b"skipped"),
+            ("images", contents[1]),
+            ("images", contents[2]),
+        ]
+    )
+
+    images = read_image_uploads(content_type, io.BytesIO(body), "images")
+
+    assert [fp.read() for fp in images] == contents
+
+
+def test_read_multipart_no_field():
+    content_type, body = make_multipart([("other", b"abc")])
+
+    with pytest.raises(ValueError):
+        read_image_uploads(content_type, io.BytesIO(body), "images")
+
+
+def test_read_multipart_truncated():
+    content_type, body = make_multipart([("images", b"abc")])
+
+    with pytest.raises(ValueError):
+        read_image_uploads(content_type, io.BytesIO(body[:-30]), "images")
+
+
+def test_read_raw_image():
+    images = read_image_uploads("image/png", io.BytesIO(b"abc"), "images")
+
+    assert [fp.read() for fp in images] == [b"abc"]
+
+
+def test_read_json():
+    assert read_image_uploads("application/json", io.BytesIO(b"{}"), "images") is None
@@ -0,0 +1,39 @@
+import numpy as np
+
+from telesto import weights
+from telesto.weights import load_arrays, save_arrays, shared_arrays
+
+
+def test_save_load_arrays(tmp_path):
+    arrays = {"layer1/weight": np.arange(6, dtype=np.float32).reshape(2, 3), "bias": np.ones(3)}
+    save_arrays(tmp_path / "weights", arrays)
+
+    loaded = load_arrays(tmp_path / "weights")
+
+    assert list(loaded) == ["layer1/weight", "bias"]
+    assert isinstance(loaded["bias"], np.memmap)
+    assert not loaded["bias"].flags.writeable
+    for name, array in arrays.items():
+        np.testing.assert_array_equal(loaded[name], array)
+
+
+def test_shared_arrays_built_once(tmp_path):
+    builds = []
+
+    def build():
+        builds.append(1)
+        return {"w": np.arange(4)}
+
+    first = shared_arrays(tmp_path / "weights", build)
+    second = shared_arrays(tmp_path / "weights", build)
+
+    assert len(builds) == 1
+    np.testing.assert_array_equal(first["w"], second["w"])
+
+
+def test_shared_arrays_without_fcntl(tmp_path, monkeypatch):
+    monkeypatch.setattr(weights, "fcntl", None)
+
+    loaded = shared_arrays(tmp_path / "weights", lambda: {"w": np.arange(4)})
+
+    np.testing.assert_array_equal(loaded["w"], np.arange(4))